@@ -1,100 +1,724 @@
+import math
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Avg
-from .models import App, Review
-from .serializers import AppSerializer, ReviewSerializer
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, Prefetch, Sum, Value, When, Window, prefetch_related_objects
+from django.db.models.functions import Abs, Cast, Coalesce, Floor, NullIf, RowNumber
+from .filters import DATE_FILTERS, INT_RANGE_FILTERS, filter_apps, filter_reviews, get_ordering, order_apps, parse_float_param, parse_int_param
+from .ingest import normalize_sentiment
+from .models import App, CategoryStat, Genre, GenreStat, Review
+from .serializers import AppSerializer, GenreSerializer, ReviewSerializer
+from .stats import SENTIMENT_COUNT_FIELDS, UNKNOWN_CATEGORY
+from . import bulk, leaderboards, search, suggest, versioning
+from .caching import CachedResponseMixin, app_etag, etag_matches, not_modified, page_etag
+from .export import CSVRenderer, NDJSONRenderer, stream_export
 
 #API endpoints of the application 
 
+# number of reviews nested per app in list responses (?include=reviews), and the upper bound of ?reviews_limit=
+REVIEWS_PER_APP = 5
+MAX_REVIEWS_PER_APP = 50
+
+# largest value of a 64-bit primary key: bigger ids overflow the database driver
+MAX_ID = 2 ** 63 - 1
+INVALID_IDS = f'Every id must be an integer from 1 to {MAX_ID}.'
+
+
+def parse_id(value):
+    """int(value), raising ValueError when it cannot be a stored id."""
+    value = int(value)
+    if not 1 <= value <= MAX_ID:
+        raise ValueError(f'id {value} is out of range')
+    return value
+
+
+def requested_app_fields(params):
+    """
+    Field names to serialize for apps in list responses.
+    ?fields=id,name,rating selects a sparse fieldset. Nested reviews are left
+    out unless asked for with ?include=reviews (or by naming them in ?fields=).
+    """
+    fields = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    if not fields:
+        fields = [name for name in dict.fromkeys(AppSerializer.Meta.fields) if name != 'reviews']
+    include = {name.strip() for name in params.get('include', '').split(',')}
+    if 'reviews' in include and 'reviews' not in fields:
+        fields.append('reviews')
+    return fields
+
+
+def top_reviews_prefetch(fields, params):
+    """
+    Prefetch lookups loading at most ?reviews_limit= reviews per app, the most
+    polar first (then the most recent), in one query using a window function.
+    Empty when the reviews are not part of the requested fields.
+    """
+    if 'reviews' not in fields:
+        return []
+    limit = parse_int_param(params, 'reviews_limit') or REVIEWS_PER_APP
+    limit = max(1, min(limit, MAX_REVIEWS_PER_APP))
+    reviews = Review.objects.annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('app_id'),
+            order_by=[Abs('sentiment_polarity').desc(nulls_last=True), F('id').desc()],
+        )
+    ).filter(position__lte=limit).order_by('app_id', 'position')
+    return [Prefetch('reviews_set', queryset=reviews)]
+
+
+# query parameters of /api/apps/category_stats/ that narrow the apps taken into account
+CATEGORY_STATS_FILTERS = ('type', 'content_rating', 'min_installs')
+
+
+def category_stats_rows(params):
+    """
+    Rows of {category_key, count, avg_rating} per category, for the apps selected by
+    the category_stats query parameters. Also used by the async view (async_api.py).
+    """
+    if not any(params.get(name) for name in CATEGORY_STATS_FILTERS):
+        # unfiltered figures are read from the pre-aggregated CategoryStat table
+        return (
+            CategoryStat.objects.filter(count__gt=0).order_by('category')
+            .values(
+                'count',
+                category_key=F('category'),
+                avg_rating=Case(When(rated_count__gt=0, then=F('rating_sum') / F('rated_count'))),
+            )
+        )
+
+    qs = App.objects.all()
+    if params.get('type'):
+        qs = qs.filter(type__iexact=params['type'])
+    if params.get('content_rating'):
+        qs = qs.filter(content_rating__iexact=params['content_rating'])
+    min_installs = parse_int_param(params, 'min_installs')
+    if min_installs is not None:
+        qs = qs.filter(installs_min__gte=min_installs)
+
+    # one GROUP BY query. Missing and empty categories are grouped under 'Unknown'
+    return (
+        qs.annotate(category_key=Coalesce(NullIf('category', Value('')), Value(UNKNOWN_CATEGORY)))
+        .values('category_key')
+        .annotate(count=Count('id'), avg_rating=Avg('rating'))
+        .order_by('category_key')
+    )
+
+
 """ Returns the list of all apps. The list is limitied to 5o items per API call."""
 class AppListCreateAPIView(generics.ListCreateAPIView):
 
     queryset = App.objects.all().order_by('id') 
     serializer_class = AppSerializer
 
+    def get_queryset(self):
+        # optional filters and ordering, e.g. ?genre=Arcade&installs_min__gte=1000&ordering=-rating (see filters.py)
+        params = self.request.query_params
+        return order_apps(filter_apps(super().get_queryset(), params), params)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        # the page's ETag only needs the ids, row versions and pagination links, so a 304
+        # skips the reviews and serialization
+        etag = page_etag(request, page, self.paginator.get_page_metadata())
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified(etag)
+        fields = requested_app_fields(request.query_params)
+        prefetch_related_objects(page, *top_reviews_prefetch(fields, request.query_params))
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response['ETag'] = etag
+        return response
+
+    def get_keyset(self):
+        # sort key used by the keyset paginator, e.g. '-rating' pages on (rating, id)
+        return get_ordering(self.request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        # sparse fieldsets only apply to listings. POST responses show the whole app
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', requested_app_fields(self.request.query_params))
+        return super().get_serializer(*args, **kwargs)
+
 """ endpoint ot handle all GET, POST, DELETE requests for the App Objects"""
 class AppDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = App.objects.all()
+    # a single app is returned with all of its reviews
+    queryset = App.objects.prefetch_related('reviews_set')
     serializer_class = AppSerializer
 
+    def current_version(self, lock=False):
+        queryset = App.objects.filter(pk=self.kwargs['pk'])
+        if lock:
+            queryset = queryset.select_for_update()
+        return queryset.values_list('version', flat=True).first()
+
+    def retrieve(self, request, *args, **kwargs):
+        # If-None-Match is answered from a primary key lookup of the row version
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            version = self.current_version()
+            if version is not None and etag_matches(if_none_match, app_etag(self.kwargs['pk'], version)):
+                return not_modified(app_etag(self.kwargs['pk'], version))
+        response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = app_etag(response.data['id'], response.data['version'])
+        return response
+
+    def check_if_match(self, request):
+        """Optimistic concurrency: refuse writes sent with an If-Match that is not the current version."""
+        if_match = request.headers.get('If-Match')
+        if not if_match:
+            return None
+        version = self.current_version(lock=True)
+        if version is None:
+            return None  # the generic view answers 404
+        if not etag_matches(if_match, app_etag(self.kwargs['pk'], version), weak=False):
+            return Response(
+                {'detail': 'The app was modified since it was read. Fetch it again and retry.'},
+                status=status.HTTP_412_PRECONDITION_FAILED,
+                headers={'ETag': app_etag(self.kwargs['pk'], version)},
+            )
+        return None
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            failed = self.check_if_match(request)
+            if failed:
+                return failed
+            response = super().update(request, *args, **kwargs)
+        response['ETag'] = app_etag(response.data['id'], response.data['version'])
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            failed = self.check_if_match(request)
+            if failed:
+                return failed
+            return super().destroy(request, *args, **kwargs)
+
 
 """
-Returns the AVG rating per genre.
+Returns many apps by id in one call: POST {"ids": [1, 2, 3]} or GET ?ids=1,2,3.
+Results follow the requested order, with null in place of unknown ids (also listed under not_found).
 """
-class AvgRatingByGenreAPIView(APIView):
+class AppBatchGetAPIView(APIView):
+
     def get(self, request):
-        # Aggregate average ratings per genre. Handles multigenre strings.
-        data = {}
-        for app in App.objects.exclude(rating__isnull=True):
-            if not app.genres:
+        raw = [part.strip() for part in request.query_params.get('ids', '').split(',') if part.strip()]
+        return self.batch_get(request, raw)
+
+    def post(self, request):
+        raw = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(raw, list):
+            raise ValidationError({'ids': 'Expected a list of app ids.'})
+        return self.batch_get(request, raw)
+
+    def parse_ids(self, raw):
+        try:
+            ids = list(dict.fromkeys(parse_id(value) for value in raw))
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': INVALID_IDS})
+        if not ids:
+            raise ValidationError({'ids': 'At least one id is required.'})
+        if len(ids) > settings.BATCH_GET_MAX_IDS:
+            raise ValidationError({'ids': f'At most {settings.BATCH_GET_MAX_IDS} ids per request.'})
+        return ids
+
+    def batch_get(self, request, raw):
+        ids = self.parse_ids(raw)
+        # like the detail view every field is returned, unless ?fields= selects some
+        fields = [name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()]
+        fields = fields or list(dict.fromkeys(AppSerializer.Meta.fields))
+        # one id__in query for the apps and, when they are returned, one for their reviews
+        queryset = App.objects.filter(id__in=ids)
+        if 'reviews' in fields:
+            queryset = queryset.prefetch_related('reviews_set')
+        apps = queryset.in_bulk()
+        found = [apps[app_id] for app_id in ids if app_id in apps]
+        data = iter(AppSerializer(found, many=True, fields=fields).data)
+        results = [next(data) if app_id in apps else None for app_id in ids]
+        not_found = [app_id for app_id in ids if app_id not in apps]
+        return Response({'results': results, 'not_found': not_found})
+
+
+# error of the bulk review items repeating the text of another review of their app
+DUPLICATE_REVIEW = 'The app already has a review with this text.'
+
+
+"""
+Base of the bulk write endpoints. POST takes a list of up to BULK_MAX_ITEMS objects,
+DELETE takes {"ids": [...]}. Add ?dry_run=true to validate and get the statuses without writing.
+"""
+class BulkAPIView(APIView):
+
+    def get_items(self, request):
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'items': 'Expected a non-empty list of objects.'})
+        if len(items) > settings.BULK_MAX_ITEMS:
+            raise ValidationError({'items': f'At most {settings.BULK_MAX_ITEMS} objects per request.'})
+        return items
+
+    def get_ids(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({'ids': 'Expected a non-empty list of ids.'})
+        if len(ids) > settings.BULK_MAX_ITEMS:
+            raise ValidationError({'ids': f'At most {settings.BULK_MAX_ITEMS} ids per request.'})
+        try:
+            return list(dict.fromkeys(parse_id(value) for value in ids))
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': INVALID_IDS})
+
+    def is_dry_run(self, request):
+        return request.query_params.get('dry_run') in ('1', 'true')
+
+    def validate_each(self, serializer, items):
+        """
+        Validate items with the child of a many=True serializer, in one pass.
+        Returns a (validated data, errors) pair per item, so valid items can be
+        written while the invalid ones are reported.
+        """
+        checked = []
+        for item in items:
+            try:
+                checked.append((serializer.child.run_validation(item), None))
+            except ValidationError as exc:
+                checked.append((None, exc.detail))
+        return checked
+
+    def summary(self, request, results):
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'dry_run': self.is_dry_run(request), 'counts': counts, 'results': results})
+
+    def delete_response(self, request, ids, delete):
+        found = delete(ids, dry_run=self.is_dry_run(request))
+        results = [{'id': pk, 'status': 'deleted' if pk in found else 'not_found'} for pk in ids]
+        return self.summary(request, results)
+
+
+"""
+Bulk upsert (POST, apps matched by name) and delete (DELETE) of apps.
+"""
+class AppBulkAPIView(BulkAPIView):
+
+    def post(self, request):
+        items = self.get_items(request)
+        checked = self.validate_each(AppSerializer(data=items, many=True), items)
+
+        results = [{'index': index, 'status': 'invalid', 'errors': errors} for index, (_, errors) in enumerate(checked)]
+        valid = []
+        names = set()
+        for index, (fields, errors) in enumerate(checked):
+            if errors is not None:
                 continue
-            parts = [p.strip() for p in app.genres.replace(';', ',').split(',')]
-            for g in parts:
-                if not g:
-                    continue
-                data.setdefault(g, []).append(app.rating)
-        result = {g: sum(vals) / len(vals) for g, vals in data.items()}
+            if fields['name'] in names:
+                results[index]['errors'] = {'name': ['Duplicate name in this request.']}
+                continue
+            names.add(fields['name'])
+            valid.append((index, fields))
+
+        if valid:
+            outcome = bulk.upsert_apps([fields for _, fields in valid], dry_run=self.is_dry_run(request))
+            for (index, _), (state, app_id) in zip(valid, outcome):
+                results[index] = {'index': index, 'status': state, 'id': app_id}
+        return self.summary(request, results)
+
+    def delete(self, request):
+        return self.delete_response(request, self.get_ids(request), bulk.delete_apps)
+
+
+"""
+Bulk create and update (POST, objects carrying an "id" are updated) and delete (DELETE) of reviews.
+"""
+class ReviewBulkAPIView(BulkAPIView):
+
+    def post(self, request):
+        items = self.get_items(request)
+        # the apps referenced by the items are looked up once instead of once per item
+        app_ids = set()
+        for item in items:
+            try:
+                app_ids.add(parse_id(item['app']))
+            except (TypeError, ValueError, KeyError):
+                pass  # reported by the validation below
+        context = {'preloaded': App.objects.only('id', 'name').in_bulk(app_ids)}
+
+        updates = [index for index, item in enumerate(items) if isinstance(item, dict) and 'id' in item]
+        creates = sorted(set(range(len(items))) - set(updates))
+        checked = dict(zip(creates, self.validate_each(
+            ReviewSerializer(data=[items[index] for index in creates], many=True, context=context),
+            [items[index] for index in creates],
+        )))
+        # updates only change the fields they send
+        checked.update(zip(updates, self.validate_each(
+            ReviewSerializer(data=[items[index] for index in updates], many=True, partial=True, context=context),
+            [items[index] for index in updates],
+        )))
+
+        results = [{'index': index, 'status': 'invalid', 'errors': checked[index][1]} for index in range(len(items))]
+        new = [index for index in creates if checked[index][1] is None]
+        changed = {}
+        for index in updates:
+            if checked[index][1] is not None:
+                continue
+            try:
+                review_id = parse_id(items[index]['id'])
+            except (TypeError, ValueError):
+                results[index]['errors'] = {'id': [f'Must be an integer from 1 to {MAX_ID}.']}
+                continue
+            if review_id in changed:
+                results[index]['errors'] = {'id': ['Duplicate id in this request.']}
+                continue
+            changed[review_id] = index
+
+        # an app has at most one review per text (Review.content_hash)
+        new_duplicates, changed_duplicates = bulk.duplicate_reviews(
+            [checked[index][0] for index in new],
+            {review_id: checked[index][0] for review_id, index in changed.items()},
+        )
+        for position in sorted(new_duplicates, reverse=True):
+            results[new.pop(position)]['errors'] = {'translated_review': [DUPLICATE_REVIEW]}
+        for review_id in changed_duplicates:
+            results[changed.pop(review_id)]['errors'] = {'translated_review': [DUPLICATE_REVIEW]}
+
+        if new or changed:
+            created_ids, found = bulk.write_reviews(
+                [checked[index][0] for index in new],
+                {review_id: checked[index][0] for review_id, index in changed.items()},
+                dry_run=self.is_dry_run(request),
+            )
+            for index, review_id in zip(new, created_ids):
+                results[index] = {'index': index, 'status': 'created', 'id': review_id}
+            for review_id, index in changed.items():
+                state = 'updated' if review_id in found else 'not_found'
+                results[index] = {'index': index, 'status': state, 'id': review_id}
+        return self.summary(request, results)
+
+    def delete(self, request):
+        return self.delete_response(request, self.get_ids(request), bulk.delete_reviews)
+
+
+"""
+Base of the export endpoints: streams every matching row as NDJSON (default) or CSV (?format=csv).
+Subclasses set filename and columns and define get_queryset(), returning the rows to export.
+"""
+class ExportAPIView(APIView):
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    # name of the downloaded file, without extension
+    filename = None
+    # columns exported by default, and the ones ?fields= may pick from
+    columns = ()
+
+    def get_columns(self, params):
+        fields = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+        unknown = [name for name in fields if name not in self.columns]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(self.columns)}."})
+        return fields or list(self.columns)
+
+    def get(self, request):
+        columns = self.get_columns(request.query_params)
+        return stream_export(request, self.get_queryset(), columns, request.accepted_renderer.format, self.filename)
+
+
+"""
+Exports the whole catalogue in one streamed response, with the filters and ordering of /api/apps/.
+"""
+class AppExportAPIView(ExportAPIView):
+    filename = 'apps'
+    # the scalar fields of the app representation (nested reviews are exported by /api/reviews/export/)
+    columns = tuple(name for name in dict.fromkeys(AppSerializer.Meta.fields) if name != 'reviews')
+
+    def get_queryset(self):
+        params = self.request.query_params
+        return order_apps(filter_apps(App.objects.all(), params), params)
+
+
+"""
+Exports every review in one streamed response, filtered like /api/reviews/ (?app=, ?sentiment=).
+"""
+class ReviewExportAPIView(ExportAPIView):
+    filename = 'reviews'
+    columns = ('id', 'app_id', 'app_name', 'translated_review', 'sentiment', 'sentiment_polarity')
+
+    def get_queryset(self):
+        return filter_reviews(Review.objects.all(), self.request.query_params).order_by('id')
+
+
+"""
+Returns the AVG rating per genre.
+"""
+class AvgRatingByGenreAPIView(CachedResponseMixin, APIView):
+    def get(self, request):
+        # Served from the pre-aggregated GenreStat table (multigenre strings are split at load time).
+        stats = GenreStat.objects.filter(rated_count__gt=0).order_by('genre')
+        result = {stat.genre: stat.avg_rating for stat in stats}
         return Response(result)
 
 """ 
 Return all apps whose name match the search key term. 
 """
 class SearchByNameAPIView(APIView):
+    # page size (?limit=) of the search results
+    default_limit = 20
+    max_limit = 100
+
     def get(self, request):
-        # Simple case-insensitive substring search on the app name.
+        # Full-text search on the app name, genres and category (see search.py),
+        # with prefix matching and the best matches first.
         query = request.query_params.get('q', '')
 
         # if no query parameter is passed, then return a bad request.
         if not query:
             return Response({'detail': 'Query parameter q is required'}, status=status.HTTP_400_BAD_REQUEST)
-        qs = App.objects.filter(name__icontains=query).order_by('name')
-        serializer = AppSerializer(qs, many=True)
-        return Response(serializer.data)
+        limit = max(1, min(parse_int_param(request.query_params, 'limit') or self.default_limit, self.max_limit))
+        offset = max(0, parse_int_param(request.query_params, 'offset') or 0)
+
+        # one extra id tells whether there is a next page
+        ids = search.search_app_ids(query, limit + 1, offset)
+        fields = requested_app_fields(request.query_params)
+        qs = App.objects.filter(id__in=ids[:limit]).prefetch_related(*top_reviews_prefetch(fields, request.query_params))
+        apps = qs.in_bulk()
+        ranked = [apps[app_id] for app_id in ids[:limit] if app_id in apps]
+        serializer = AppSerializer(ranked, many=True, fields=fields)
 
+        next_link = None
+        if len(ids) > limit:
+            url = request.build_absolute_uri()
+            next_link = replace_query_param(replace_query_param(url, 'offset', offset + limit), 'limit', limit)
+        return Response({'next': next_link, 'results': serializer.data})
+
+
+
+"""
+Returns app name suggestions for a typed prefix (?q=), best rated first (or ?rank=installs).
+Served from an in-process index of names (see suggest.py), without touching the database.
+"""
+class SuggestAPIView(APIView):
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        if not query.strip():
+            return Response({'detail': 'Query parameter q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        rank = request.query_params.get('rank', 'rating')
+        if rank not in suggest.RANKS:
+            return Response({'detail': f"rank must be one of {', '.join(suggest.RANKS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = parse_int_param(request.query_params, 'limit') or 10
+        return Response(suggest.get_index().suggest(query, limit, rank))
+
+
+"""
+Returns the top ?k= apps by weighted rating (the rating shrunk towards the mean by the number of ratings),
+overall or for one ?category= or ?genre=. Read from the precomputed leaderboards (see leaderboards.py).
+"""
+class LeaderboardAPIView(CachedResponseMixin, APIView):
+    cache_generations = (versioning.APPS, versioning.REVIEWS)
+
+    def get(self, request):
+        params = request.query_params
+        category, genre = params.get('category'), params.get('genre')
+        if category and genre:
+            raise ValidationError({'detail': 'Pass either category or genre, not both.'})
+        if category:
+            board = leaderboards.category_board(category)
+        elif genre:
+            board = leaderboards.genre_board(genre)
+        else:
+            board = leaderboards.OVERALL
+        k = max(1, min(parse_int_param(params, 'k') or leaderboards.DEFAULT_K, leaderboards.MAX_K))
+
+        entries = leaderboards.top(board, k)
+        fields = requested_app_fields(params)
+        apps = [entry.app for entry in entries]
+        prefetch_related_objects(apps, *top_reviews_prefetch(fields, params))
+        data = AppSerializer(apps, many=True, fields=fields).data
+        results = [
+            {'rank': rank, 'weighted_rating': round(entry.score, 4), **app}
+            for rank, (entry, app) in enumerate(zip(entries, data), start=1)
+        ]
+        return Response({'board': board, 'results': results})
 
 
 """
 Returns the number of apps and average rating per catergory
 """
-class CategoryStatsAPIView(APIView):
+class CategoryStatsAPIView(CachedResponseMixin, APIView):
     def get(self, request):
         # Produce a small summary for each category: number of apps and average rating.
-        categories = {} # Dictionary to hold stats for each category
-
-        for app in App.objects.all():
-            cat = app.category or 'Unknown'
-            # if a new category is not found add it to the categories object and initialise
-            if cat not in categories:
-                categories[cat] = {'count': 0, 'total_rating': 0, 'rated_count': 0}
-            categories[cat]['count'] += 1 # increment the count of that category.
-            if app.rating is not None:
-                categories[cat]['total_rating'] += app.rating
-                categories[cat]['rated_count'] += 1
-
-        result = {} # dictionary to hold reformatted and final stats
-        for cat, stats in categories.items():
-            # calculate the avergae rating for each category
-            avg_rating = stats['total_rating'] / stats['rated_count'] if stats['rated_count'] > 0 else None
-            result[cat] = {'count': stats['count'], 'avg_rating': avg_rating}
+        result = {row['category_key']: {'count': row['count'], 'avg_rating': row['avg_rating']} for row in category_stats_rows(request.query_params)}
         return Response(result)
 
 
+"""
+Returns every genre with its number of apps and average rating, aggregated over the App <-> Genre join table.
+"""
+class GenreListAPIView(CachedResponseMixin, generics.ListAPIView):
+    serializer_class = GenreSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return Genre.objects.annotate(
+            app_count=Count('apps'), avg_rating=Avg('apps__rating'),
+        ).order_by('name')
+
+
+"""
+Returns all reviews, optionally filtered with ?app=<id> and ?sentiment=. Pages are keyed on the review id.
+"""
+class ReviewListAPIView(generics.ListAPIView):
+    queryset = Review.objects.all()
+    serializer_class = ReviewSerializer
+
+    def get_queryset(self):
+        return filter_reviews(super().get_queryset(), self.request.query_params).order_by('id')
+
+
 """
 Returns all the applications reviews that match the sentiment specified by the user: Positive, neutral or negative
 """
-class ReviewsBySentimentAPIView(APIView):
+class ReviewsBySentimentAPIView(CachedResponseMixin, APIView):
+    cache_generations = (versioning.REVIEWS,)
+
     def get(self, request):
         # Return reviews with a matching sentiment label. the param is case-insensitive
         sentiment = request.query_params.get('sentiment')
         if not sentiment:
             return Response({'detail': 'sentiment parameter required'}, status=status.HTTP_400_BAD_REQUEST)
-        qs = Review.objects.filter(sentiment__iexact=sentiment).order_by('-sentiment_polarity')[:50] # return only the top 50
+        # one range of the (sentiment_key, sentiment_polarity) index
+        qs = Review.objects.filter(sentiment_key=normalize_sentiment(sentiment)).order_by('-sentiment_polarity')[:50] # return only the top 50
         serializer = ReviewSerializer(qs, many=True)
         return Response(serializer.data)
 
-class TopRatedAPIView(APIView):
+def review_stats_apps(params):
+    """
+    Apps whose reviews the /api/reviews/stats/ endpoints cover: all of them, or
+    those selected by ?app=<id>, ?category= and the app filters (?genre=, ...).
+    """
+    apps = filter_apps(App.objects.all(), params)
+    app_id = parse_int_param(params, 'app')
+    if app_id is not None:
+        apps = apps.filter(id=app_id)
+    if params.get('category'):
+        apps = apps.filter(category=params['category'])
+    return apps
+
+
+def is_scoped(params):
+    """True when the review stats are asked for some of the apps only."""
+    return any(params.get(name) for name in ('app', 'category', 'genre', *INT_RANGE_FILTERS, *DATE_FILTERS))
+
+
+def sentiment_totals(row):
+    """Counts and positive ratio from a row of summed App review summaries."""
+    labelled = sum(row[label] or 0 for label in SENTIMENT_COUNT_FIELDS)
+    result = {'reviews': row['total'] or 0}
+    result.update({label: row[label] or 0 for label in SENTIMENT_COUNT_FIELDS})
+    result['unlabelled'] = result['reviews'] - labelled
+    result['positive_ratio'] = round(result['positive'] / labelled, 4) if labelled else None
+    return result
+
+
+# sums of the per-app review summaries (see stats.py): all reviews, then by sentiment label
+SENTIMENT_SUMS = {
+    'total': Sum('review_count'),
+    **{label: Sum(field) for label, field in SENTIMENT_COUNT_FIELDS.items()},
+}
+
+
+"""
+Returns the number of reviews per sentiment and their average polarity, for all
+apps or the ones selected with ?app=, ?category=, ?genre= (and the other app filters).
+Summed from the per-app review summaries, without reading the reviews.
+"""
+class ReviewStatsAPIView(CachedResponseMixin, APIView):
+    cache_generations = (versioning.APPS, versioning.REVIEWS)
+
+    def get(self, request):
+        row = review_stats_apps(request.query_params).aggregate(
+            **SENTIMENT_SUMS, polarity_sum=Sum('polarity_sum'), polarity_count=Sum('polarity_count'),
+        )
+        result = sentiment_totals(row)
+        result['avg_polarity'] = row['polarity_sum'] / row['polarity_count'] if row['polarity_count'] else None
+        return Response(result)
+
+
+# added to bin positions to absorb floating point error on bin edges
+BIN_EPSILON = 1e-9
+
+
+"""
+Returns the histogram of sentiment_polarity (-1 to 1) in bins of ?bin= width (0.1 by default),
+for the reviews selected like /api/reviews/stats/, optionally of one ?sentiment=.
+"""
+class ReviewPolarityHistogramAPIView(CachedResponseMixin, APIView):
+    cache_generations = (versioning.APPS, versioning.REVIEWS)
+    default_width = 0.1
+    # at most 200 bins
+    min_width = 0.01
+    max_width = 2.0
+
+    def get(self, request):
+        params = request.query_params
+        width = parse_float_param(params, 'bin')
+        width = self.default_width if width is None else width
+        if not self.min_width <= width <= self.max_width:
+            raise ValidationError({'bin': f'Must be between {self.min_width} and {self.max_width}.'})
+        count = math.ceil(round(2 / width, 6))
+
+        reviews = filter_reviews(Review.objects.filter(sentiment_polarity__isnull=False), params)
+        if is_scoped(params):
+            reviews = reviews.filter(app__in=review_stats_apps(params).values('id'))
+        # one GROUP BY on the bin number, the floor of the shifted value (an integer cast
+        # alone rounds on some databases, e.g. PostgreSQL). BIN_EPSILON keeps e.g. 0.5 / 0.1
+        # out of the bin below.
+        position = (F('sentiment_polarity') + 1.0) / Value(width, output_field=FloatField()) + BIN_EPSILON
+        grouped = (
+            reviews.annotate(bin=Cast(Floor(position), IntegerField()))
+            .values('bin')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        counts = [0] * count
+        for row in grouped:
+            # polarity 1.0 (and any value out of range) goes to the edge bins
+            counts[min(max(row['bin'], 0), count - 1)] += row['count']
+        bins = [
+            {'from': round(-1 + i * width, 6), 'to': round(min(-1 + (i + 1) * width, 1.0), 6), 'count': n}
+            for i, n in enumerate(counts)
+        ]
+        return Response({'bin': width, 'reviews': sum(counts), 'bins': bins})
+
+
+"""
+Returns the number of reviews per sentiment and the share of positive reviews among the labelled ones,
+per app category. Summed from the per-app review summaries, in one GROUP BY over the apps.
+"""
+class ReviewCategoryStatsAPIView(CachedResponseMixin, APIView):
+    cache_generations = (versioning.APPS, versioning.REVIEWS)
+
     def get(self, request):
-        apps = App.objects.exclude(rating__isnull=True).order_by('-rating')[:50]
-        serializer = AppSerializer(apps, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        grouped = (
+            review_stats_apps(request.query_params)
+            .annotate(category_key=Coalesce(NullIf('category', Value('')), Value(UNKNOWN_CATEGORY)))
+            .values('category_key')
+            .annotate(**SENTIMENT_SUMS)
+            .filter(total__gt=0)
+            .order_by('category_key')
+        )
+        return Response({row['category_key']: sentiment_totals(row) for row in grouped})
+
+
+class TopRatedAPIView(CachedResponseMixin, APIView):
+    cache_generations = (versioning.APPS, versioning.REVIEWS)
+
+    def get(self, request):
+        # the first 50 apps of the overall leaderboard (see leaderboards.py)
+        fields = requested_app_fields(request.query_params)
+        apps = [entry.app for entry in leaderboards.top(leaderboards.OVERALL, 50)]
+        prefetch_related_objects(apps, *top_reviews_prefetch(fields, request.query_params))
+        serializer = AppSerializer(apps, many=True, fields=fields)
+        return Response(serializer.data)
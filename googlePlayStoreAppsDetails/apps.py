@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GoogleplaystoreappsdetailsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'googlePlayStoreAppsDetails'
+
+    def ready(self):
+        # connect the signal handlers that maintain the denormalised tables
+        from . import signals  # noqa: F401
@@ -0,0 +1,134 @@
+# Async versions of the read-only API endpoints, mounted under /api/async/.
+#
+# DRF's APIView is synchronous: under ASGI each request to it is handed to a
+# thread, and under gunicorn's sync workers it holds a whole worker. These
+# views are plain Django async views reading with the async ORM (aget,
+# aiterator, ...), so one ASGI worker serves many slow requests at once.
+# They answer with the same JSON as their synchronous counterparts in api.py,
+# reuse the same query builders and serializers (on already loaded rows, so
+# serializing never touches the database) and the same response cache.
+#
+# Only JSON is rendered: the browsable API and the format negotiation stay
+# with the synchronous endpoints.
+
+import time
+from asgiref.sync import sync_to_async
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+from .api import SearchByNameAPIView, category_stats_rows, requested_app_fields, top_reviews_prefetch
+from .caching import AsyncCachedResponseMixin, app_etag, etag_matches, not_modified
+from .filters import parse_int_param
+from .ingest import normalize_sentiment
+from .models import App, Review
+from .serializers import AppSerializer, ReviewSerializer
+from . import leaderboards, search, versioning
+
+# rows fetched per database round trip by aiterator()
+CHUNK_SIZE = 500
+
+
+class AsyncJSONView(View):
+    """Base class of the async views: JSON responses, DRF validation errors answered with 400."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ValidationError as exc:
+            return self.render(request, exc.detail, status=400)
+        except Http404:
+            return self.render(request, {'detail': 'No App matches the given query.'}, status=404)
+
+    def render(self, request, data, status=200):
+        """Encode data like DRF's JSONRenderer, counting the time as rendering in the request's profile."""
+        started = time.perf_counter()
+        content = JSONRenderer().render(data)
+        profile = getattr(request, '_perf_profile', None)
+        if profile is not None:
+            profile.render_seconds += time.perf_counter() - started
+        return HttpResponse(content, status=status, content_type='application/json')
+
+
+async def load(queryset):
+    """The rows of queryset as a list, read with the async ORM."""
+    return [row async for row in queryset.aiterator(chunk_size=CHUNK_SIZE)]
+
+
+""" Async /api/apps/<pk>/: one app with all of its reviews. """
+class AppDetailAsyncView(AsyncJSONView):
+    async def get(self, request, pk):
+        # If-None-Match is answered from a primary key lookup of the row version
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            version = await App.objects.filter(pk=pk).values_list('version', flat=True).afirst()
+            if version is not None and etag_matches(if_none_match, app_etag(pk, version)):
+                return not_modified(app_etag(pk, version))
+        try:
+            app = await App.objects.prefetch_related('reviews_set').aget(pk=pk)
+        except App.DoesNotExist:
+            raise Http404
+        response = self.render(request, AppSerializer(app).data)
+        response['ETag'] = app_etag(app.pk, app.version)
+        return response
+
+
+""" Async /api/apps/search_by_name/: full-text search with ?q=, ?limit= and ?offset=. """
+class SearchByNameAsyncView(AsyncJSONView):
+    default_limit = SearchByNameAPIView.default_limit
+    max_limit = SearchByNameAPIView.max_limit
+
+    async def get(self, request):
+        query = request.GET.get('q', '')
+        if not query:
+            return self.render(request, {'detail': 'Query parameter q is required'}, status=400)
+        limit = max(1, min(parse_int_param(request.GET, 'limit') or self.default_limit, self.max_limit))
+        offset = max(0, parse_int_param(request.GET, 'offset') or 0)
+
+        # the FTS query is raw SQL: run it on the ORM's thread
+        ids = await sync_to_async(search.search_app_ids)(query, limit + 1, offset)
+        fields = requested_app_fields(request.GET)
+        qs = App.objects.filter(id__in=ids[:limit]).prefetch_related(*top_reviews_prefetch(fields, request.GET))
+        apps = {app.id: app for app in await load(qs)}
+        ranked = [apps[app_id] for app_id in ids[:limit] if app_id in apps]
+
+        next_link = None
+        if len(ids) > limit:
+            url = request.build_absolute_uri()
+            next_link = replace_query_param(replace_query_param(url, 'offset', offset + limit), 'limit', limit)
+        return self.render(request, {'next': next_link, 'results': AppSerializer(ranked, many=True, fields=fields).data})
+
+
+""" Async /api/apps/category_stats/: number of apps and average rating per category. """
+class CategoryStatsAsyncView(AsyncCachedResponseMixin, AsyncJSONView):
+    async def get(self, request):
+        rows = await load(category_stats_rows(request.GET))
+        result = {row['category_key']: {'count': row['count'], 'avg_rating': row['avg_rating']} for row in rows}
+        return self.render(request, result)
+
+
+""" Async /api/reviews/by_sentiment/: the 50 most polar reviews with a ?sentiment= label. """
+class ReviewsBySentimentAsyncView(AsyncCachedResponseMixin, AsyncJSONView):
+    cache_generations = (versioning.REVIEWS,)
+
+    async def get(self, request):
+        sentiment = request.GET.get('sentiment')
+        if not sentiment:
+            return self.render(request, {'detail': 'sentiment parameter required'}, status=400)
+        qs = Review.objects.filter(sentiment_key=normalize_sentiment(sentiment)).order_by('-sentiment_polarity')[:50]
+        return self.render(request, ReviewSerializer(await load(qs), many=True).data)
+
+
+""" Async /top-rated/: the first 50 apps of the overall leaderboard. """
+class TopRatedAsyncView(AsyncCachedResponseMixin, AsyncJSONView):
+    cache_generations = (versioning.APPS, versioning.REVIEWS)
+
+    async def get(self, request):
+        fields = requested_app_fields(request.GET)
+        entries = await load(leaderboards.top_queryset(leaderboards.OVERALL, 50))
+        apps = [entry.app for entry in entries]
+        # nested reviews (?include=reviews) are prefetched for the loaded apps on the ORM's thread
+        await sync_to_async(prefetch_related_objects)(apps, *top_reviews_prefetch(fields, request.GET))
+        return self.render(request, AppSerializer(apps, many=True, fields=fields).data)
@@ -0,0 +1,355 @@
+# Synthetic-data benchmarks for the API endpoints and the load commands.
+# Run them with `python manage.py benchmark`, which builds a throwaway test
+# database per catalogue size, fills it through the load commands from
+# generated CSV files and records the number of SQL queries, the wall time
+# and the peak Python memory of each scenario.
+#
+# Review counts follow a Zipf distribution, as in the real data: a few apps
+# have most of the reviews, which is what exposes unbounded nested reviews.
+# Text comes from pools of Faker words and sentences. Building each object
+# with factory_boy was too slow for the 1M-app catalogue.
+
+import asyncio
+import csv
+import io
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import ThreadSensitiveContext
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver, reverse
+from faker import Faker
+from rest_framework.test import APIClient
+from .models import App
+
+CATEGORIES = [
+    'ART_AND_DESIGN', 'BUSINESS', 'COMMUNICATION', 'EDUCATION', 'FAMILY', 'FINANCE',
+    'GAME', 'HEALTH_AND_FITNESS', 'PHOTOGRAPHY', 'PRODUCTIVITY', 'SOCIAL', 'TOOLS',
+]
+GENRES = ['Action', 'Arcade', 'Art & Design', 'Casual', 'Education', 'Entertainment', 'Puzzle', 'Tools']
+INSTALLS = ['100+', '1,000+', '10,000+', '100,000+', '1,000,000+', '10,000,000+']
+CONTENT_RATINGS = ['Everyone', 'Teen', 'Mature 17+', 'Everyone 10+']
+# share of each sentiment label in the real review file
+SENTIMENTS = [('Positive', 0.64), ('Negative', 0.22), ('Neutral', 0.14)]
+
+# mean number of Review rows per app, and the exponent of their Zipf distribution
+REVIEWS_PER_APP = 2
+ZIPF_EXPONENT = 1.1
+# size of the Faker pools the names and review texts are drawn from
+WORD_POOL = 5000
+SENTENCE_POOL = 2000
+
+PLAYSTORE_HEADER = [
+    'App', 'Category', 'Rating', 'Reviews', 'Size', 'Installs', 'Type', 'Price',
+    'Content Rating', 'Genres', 'Last Updated', 'Current Ver', 'Android Ver',
+]
+REVIEWS_HEADER = ['App', 'Translated_Review', 'Sentiment', 'Sentiment_Polarity', 'Sentiment_Subjectivity']
+
+
+def zipf_counts(size, total, rng, exponent=ZIPF_EXPONENT):
+    """Split total into size counts following a Zipf law, in random app order."""
+    weights = [1 / rank ** exponent for rank in range(1, size + 1)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    rng.shuffle(counts)
+    return counts
+
+
+def write_catalogue_csv(apps_file, reviews_file, size, seed=0, reviews_per_app=REVIEWS_PER_APP):
+    """
+    Write size synthetic apps in the googleplaystore.csv format to apps_file, and
+    their reviews (size * reviews_per_app in total, Zipf-distributed) to reviews_file.
+    Returns the number of reviews written.
+    """
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    words = [fake.word().title() for _ in range(WORD_POOL)]
+    sentences = [fake.sentence(nb_words=12) for _ in range(SENTENCE_POOL)]
+    labels, shares = zip(*SENTIMENTS)
+
+    apps = csv.writer(apps_file)
+    reviews = csv.writer(reviews_file)
+    apps.writerow(PLAYSTORE_HEADER)
+    reviews.writerow(REVIEWS_HEADER)
+    written = 0
+    for i, count in enumerate(zipf_counts(size, size * reviews_per_app, rng)):
+        name = f'{rng.choice(words)} {rng.choice(words)} {i}'
+        apps.writerow([
+            name,
+            rng.choice(CATEGORIES),
+            round(rng.uniform(1, 5), 1) if rng.random() > 0.15 else 'NaN',
+            count * 40 + rng.randint(0, 50),
+            f'{rng.randint(1, 100)}M',
+            rng.choice(INSTALLS),
+            'Paid' if rng.random() < 0.07 else 'Free',
+            '$1.99' if rng.random() < 0.07 else '0',
+            rng.choice(CONTENT_RATINGS),
+            ';'.join(rng.sample(GENRES, rng.randint(1, 2))),
+            f'{rng.randint(1, 28)}-Jan-18',
+            '1.0',
+            '4.0 and up',
+        ])
+        for j in range(count):
+            label = rng.choices(labels, shares)[0]
+            polarity = {'Positive': rng.uniform(0.01, 1), 'Negative': rng.uniform(-1, -0.01), 'Neutral': 0.0}[label]
+            # numbered so the loader's duplicate detection keeps every review
+            reviews.writerow([name, f'{rng.choice(sentences)} #{j}', label, round(polarity, 3), round(rng.random(), 3)])
+        written += count
+    return written
+
+
+def measure(func, repeat=5):
+    """
+    Run func repeat times and return its query count, timings in milliseconds
+    and the peak Python memory of one extra traced run (tracemalloc slows the code down).
+    """
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'queries': len(captured),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(sorted(timings)[max(0, round(0.95 * len(timings)) - 1)], 3),
+        'min_ms': round(min(timings), 3),
+        'peak_kb': peak_memory_kb(func),
+    }
+
+
+def peak_memory_kb(func):
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def measure_load(func):
+    """
+    Query count, time and peak memory of a load command. The memory is traced
+    in a first run that is rolled back, the time taken from a second, untraced run.
+    """
+    with transaction.atomic():
+        peak = peak_memory_kb(func)
+        transaction.set_rollback(True)
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        func()
+        elapsed = round((time.perf_counter() - started) * 1000, 3)
+    return {'queries': len(captured), 'median_ms': elapsed, 'p95_ms': elapsed, 'min_ms': elapsed, 'peak_kb': peak}
+
+
+def bench_loads(apps_path, reviews_path):
+    """
+    Benchmark load_playstore and load_reviews, which also fill the database for the
+    endpoint scenarios, then an incremental reload of the same (unchanged) files.
+    """
+    out = io.StringIO()
+    return {
+        'load_playstore': measure_load(lambda: call_command('load_playstore', path=apps_path, stdout=out, stderr=out)),
+        'load_reviews': measure_load(lambda: call_command('load_reviews', path=reviews_path, stdout=out, stderr=out)),
+        'load_playstore --incremental (no change)': measure_load(
+            lambda: call_command('load_playstore', path=apps_path, incremental=True, stdout=out, stderr=out)
+        ),
+        'load_reviews --incremental (no change)': measure_load(
+            lambda: call_command('load_reviews', path=reviews_path, incremental=True, stdout=out, stderr=out)
+        ),
+    }
+
+
+def endpoint_scenarios():
+    """
+    (scenario name, URL name, method, path, payload) for every URL in urls.py,
+    with ids and words picked from the catalogue in the database.
+    """
+    busiest = App.objects.order_by('-review_count').values_list('id', flat=True).first() or 1
+    ids = list(App.objects.order_by('name').values_list('id', flat=True)[:100])
+    word = (App.objects.values_list('name', flat=True).first() or 'app').split()[0]
+    new_apps = [{'name': f'Bulk benchmark {i}', 'category': 'GAME', 'rating': 4.0, 'installs': '1,000+'} for i in range(100)]
+    new_reviews = [{'app': busiest, 'translated_review': f'Bulk benchmark {i}', 'sentiment': 'Positive'} for i in range(100)]
+    ids_param = ','.join(str(pk) for pk in ids)
+    return [
+        ('apps', 'api-app-list', 'get', reverse('api-app-list'), None),
+        ('apps?ordering=-rating', 'api-app-list', 'get', reverse('api-app-list') + '?ordering=-rating', None),
+        ('apps?ordering=-review_count', 'api-app-list', 'get', reverse('api-app-list') + '?ordering=-review_count', None),
+        ('apps?include=reviews', 'api-app-list', 'get', reverse('api-app-list') + '?include=reviews', None),
+        ('apps?genre&installs', 'api-app-list', 'get', reverse('api-app-list') + '?genre=Arcade&installs_min__gte=100000', None),
+        ('apps?count=true', 'api-app-list', 'get', reverse('api-app-list') + '?count=true', None),
+        ('app detail (most reviews)', 'api-app-detail', 'get', reverse('api-app-detail', args=[busiest]), None),
+        ('avg_rating_by_genre', 'api-app-avg-rating-by-genre', 'get', reverse('api-app-avg-rating-by-genre'), None),
+        ('leaderboard?category', 'api-app-leaderboard', 'get', reverse('api-app-leaderboard') + '?category=GAME&k=50', None),
+        ('suggest', 'api-app-suggest', 'get', reverse('api-app-suggest') + f'?q={word[:3]}', None),
+        ('bulk apps (dry run)', 'api-app-bulk', 'post', reverse('api-app-bulk') + '?dry_run=true', new_apps),
+        ('batch_get 100', 'api-app-batch-get', 'get', reverse('api-app-batch-get') + f'?ids={ids_param}', None),
+        ('export apps', 'api-app-export', 'get', reverse('api-app-export'), None),
+        ('search_by_name', 'api-app-search-by-name', 'get', reverse('api-app-search-by-name') + f'?q={word}', None),
+        ('category_stats', 'api-app-category-stats', 'get', reverse('api-app-category-stats'), None),
+        ('category_stats?type&min_installs', 'api-app-category-stats', 'get', reverse('api-app-category-stats') + '?type=Free&min_installs=10000', None),
+        ('genres', 'api-genre-list', 'get', reverse('api-genre-list'), None),
+        ('reviews', 'api-review-list', 'get', reverse('api-review-list'), None),
+        ('reviews?app', 'api-review-list', 'get', reverse('api-review-list') + f'?app={busiest}', None),
+        ('reviews?sentiment', 'api-review-list', 'get', reverse('api-review-list') + '?sentiment=negative', None),
+        ('bulk reviews (dry run)', 'api-review-bulk', 'post', reverse('api-review-bulk') + '?dry_run=true', new_reviews),
+        ('export reviews', 'api-review-export', 'get', reverse('api-review-export'), None),
+        ('reviews stats', 'api-review-stats', 'get', reverse('api-review-stats'), None),
+        ('reviews stats?genre', 'api-review-stats', 'get', reverse('api-review-stats') + '?genre=Arcade', None),
+        ('reviews stats histogram', 'api-review-stats-histogram', 'get', reverse('api-review-stats-histogram') + '?bin=0.05', None),
+        ('reviews stats histogram?category', 'api-review-stats-histogram', 'get', reverse('api-review-stats-histogram') + '?category=GAME', None),
+        ('reviews stats categories', 'api-review-stats-categories', 'get', reverse('api-review-stats-categories'), None),
+        ('reviews by_sentiment', 'api-review-by-sentiment', 'get', reverse('api-review-by-sentiment') + '?sentiment=positive', None),
+        ('top-rated', 'top-rated', 'get', reverse('top-rated'), None),
+        # the async read path (async_api.py), named after the synchronous scenario it mirrors
+        ('async app detail (most reviews)', 'api-async-app-detail', 'get', reverse('api-async-app-detail', args=[busiest]), None),
+        ('async search_by_name', 'api-async-app-search-by-name', 'get', reverse('api-async-app-search-by-name') + f'?q={word}', None),
+        ('async category_stats?type&min_installs', 'api-async-app-category-stats', 'get', reverse('api-async-app-category-stats') + '?type=Free&min_installs=10000', None),
+        ('async reviews by_sentiment', 'api-async-review-by-sentiment', 'get', reverse('api-async-review-by-sentiment') + '?sentiment=positive', None),
+        ('async top-rated', 'api-async-top-rated', 'get', reverse('api-async-top-rated'), None),
+        ('metrics', 'metrics', 'get', reverse('metrics'), None),
+        ('main page', 'main_page', 'get', reverse('main_page'), None),
+    ]
+
+
+def url_names():
+    """Names of the URLs routed by the project, admin excluded."""
+    names = set()
+    for pattern in get_resolver().url_patterns:
+        for sub in getattr(pattern, 'url_patterns', [pattern]):
+            if getattr(sub, 'name', None) and getattr(pattern, 'app_name', None) != 'admin':
+                names.add(sub.name)
+    return names
+
+
+def bench_endpoints(repeat=5, only=None):
+    """Benchmark every endpoint scenario (or the ones of the URL names in only), response cache disabled."""
+    client = APIClient()
+
+    def request(method, path, payload):
+        response = getattr(client, method)(path, payload, format='json') if payload is not None else getattr(client, method)(path)
+        if response.streaming:
+            # exports are only done once the whole body went out
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    results = {}
+    # every run computes the response, instead of reading it back from the cache
+    with override_settings(API_CACHE_TIMEOUT=0):
+        for name, url_name, method, path, payload in endpoint_scenarios():
+            if only is not None and url_name not in only:
+                continue
+            request(method, path, payload)  # warm-up (suggestion index, connection)
+            results[name] = measure(lambda: request(method, path, payload), repeat)
+    return results
+
+
+def server_timing_queries(response):
+    """Query count reported in the Server-Timing header (see instrumentation.py)."""
+    match = re.search(r'desc="(\d+) queries"', response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else 0
+
+
+def throughput_figures(latencies, queries, seconds):
+    latencies = sorted(latencies)
+    return {
+        'queries': max(queries),
+        'median_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(latencies[max(0, round(0.95 * len(latencies)) - 1)] * 1000, 3),
+        'min_ms': round(latencies[0] * 1000, 3),
+        'requests_per_s': round(len(latencies) / seconds, 1),
+    }
+
+
+def run_threaded(path, concurrency, requests):
+    """requests GETs of path from concurrency threads, like as many sync WSGI workers."""
+    def worker(count):
+        client = Client()
+        samples = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(path)
+                samples.append((time.perf_counter() - started, server_timing_queries(response)))
+        finally:
+            connection.close()
+        return samples
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        samples = [sample for result in executor.map(worker, shares) for sample in result]
+    seconds = time.perf_counter() - started
+    return throughput_figures([latency for latency, _ in samples], [queries for _, queries in samples], seconds)
+
+
+async def run_concurrent(path, concurrency, requests):
+    """requests GETs of path, concurrency of them in flight at once on one event loop, like one ASGI worker."""
+    client = AsyncClient()
+    gate = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def fetch():
+        # like Django's ASGIHandler: each request gets its own thread (and connection) for sync code
+        async with gate, ThreadSensitiveContext():
+            started = time.perf_counter()
+            response = await client.get(path)
+            samples.append((time.perf_counter() - started, server_timing_queries(response)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch() for _ in range(requests)))
+    seconds = time.perf_counter() - started
+    return throughput_figures([latency for latency, _ in samples], [queries for _, queries in samples], seconds)
+
+
+def bench_throughput(concurrency=16, requests=200):
+    """
+    Throughput of the synchronous endpoints served by concurrency threads (the
+    WSGI path) against their async versions with concurrency requests in flight
+    on one event loop (the ASGI path), response cache disabled.
+    """
+    paths = {name: path for name, _, _, path, _ in endpoint_scenarios()}
+    results = {}
+    with override_settings(API_CACHE_TIMEOUT=0):
+        for name, path in paths.items():
+            if not name.startswith('async '):
+                continue
+            sync_name = name[len('async '):]
+            results[f'wsgi {sync_name}'] = run_threaded(paths[sync_name], concurrency, requests)
+            results[f'asgi {sync_name}'] = asyncio.run(run_concurrent(path, concurrency, requests))
+    return results
+
+
+# scenarios run by the benchmark command on each catalogue, in order
+SUITES = {
+    'endpoints': bench_endpoints,
+}
+
+
+def compare(results, baseline, threshold=1.5, min_delta_ms=1.0):
+    """
+    Regressions of results against baseline (both {size: {scenario: figures}}):
+    more queries, or a median time or peak memory above threshold times the
+    baseline (time differences under min_delta_ms are ignored as noise).
+    """
+    regressions = []
+    for size, scenarios in results.items():
+        for scenario, current in scenarios.items():
+            before = baseline.get(size, {}).get(scenario)
+            if before is None:
+                continue
+            if current['queries'] > before['queries']:
+                regressions.append(f"{size} {scenario}: {before['queries']} -> {current['queries']} queries")
+            if current['median_ms'] > before['median_ms'] * threshold and current['median_ms'] - before['median_ms'] >= min_delta_ms:
+                regressions.append(f"{size} {scenario}: {before['median_ms']} -> {current['median_ms']} ms median")
+            if before.get('peak_kb') and current.get('peak_kb', 0) > before['peak_kb'] * threshold:
+                regressions.append(f"{size} {scenario}: {before['peak_kb']} -> {current['peak_kb']} KB peak")
+    return regressions
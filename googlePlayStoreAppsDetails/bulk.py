@@ -0,0 +1,183 @@
+# Bulk writes behind the /api/apps/bulk/ and /api/reviews/bulk/ endpoints.
+#
+# Each call takes already validated records, writes them with bulk_create /
+# bulk_update / one DELETE inside a single transaction and then sends
+# apps_bulk_loaded / reviews_bulk_loaded naming the apps written, so the
+# derived rows of those apps are refreshed once per request instead of once
+# per row, and the cost does not grow with the size of the catalogue.
+# With dry_run=True the lookups run but nothing is written.
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .genres import link_genres
+from .ingest import review_content_hash
+from .models import TYPED_FIELDS, App, Review
+from .signals import SNAPSHOT_FIELDS, apps_bulk_loaded, bulk_writes, reviews_bulk_loaded, snapshot
+
+
+def bump_app_versions(app_ids):
+    """Move the row version of apps whose reviews were written in bulk."""
+    if app_ids:
+        App.objects.filter(id__in=app_ids).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def upsert_apps(records, dry_run=False):
+    """
+    Create or update apps from validated field dicts, matching existing apps by name.
+    Returns one (status, app id) pair per record, status being 'created' or 'updated'.
+    The names must not repeat: callers report the repeated ones per item (see
+    AppBulkAPIView), ValueError is raised otherwise.
+    """
+    names = [fields['name'] for fields in records]
+    if len(set(names)) != len(names):
+        raise ValueError('upsert_apps() got repeated app names')
+    with transaction.atomic():
+        existing = dict(App.objects.filter(name__in={fields['name'] for fields in records}).values_list('name', 'id'))
+        outcome = [('updated', existing[fields['name']]) if fields['name'] in existing else ('created', None) for fields in records]
+        if dry_run:
+            return outcome
+
+        new_apps = [App(**fields) for fields in records if fields['name'] not in existing]
+        for app in new_apps:
+            app.populate_typed_fields()
+        App.objects.bulk_create(new_apps)
+        link_genres({app.id: app.genres for app in new_apps})
+        # the derived rows of the written apps are refreshed from these values
+        previous = {app.id: None for app in new_apps}
+
+        # only the fields sent for an app are changed, the others keep their stored values
+        changed = {existing[fields['name']]: fields for fields in records if fields['name'] in existing}
+        if changed:
+            apps = App.objects.in_bulk(list(changed))
+            update_fields = set()
+            for app_id, fields in changed.items():
+                app = apps[app_id]
+                previous[app_id] = snapshot(app)
+                for name, value in fields.items():
+                    setattr(app, name, value)
+                app.populate_typed_fields()
+                # bulk_update skips save(): move the row version on here
+                app.version = F('version') + 1
+                app.updated_at = timezone.now()
+                update_fields.update(fields)
+            App.objects.bulk_update(list(apps.values()), [*update_fields, *TYPED_FIELDS, 'version', 'updated_at'])
+            link_genres({app_id: apps[app_id].genres for app_id, fields in changed.items() if 'genres' in fields}, replace=True)
+
+    apps_bulk_loaded.send(sender=upsert_apps, previous=previous)
+    created = iter(new_apps)
+    return [(status, app_id if status == 'updated' else next(created).id) for status, app_id in outcome]
+
+
+def delete_apps(ids, dry_run=False):
+    """Delete the apps with the given ids (and their reviews). Returns the set of ids that existed."""
+    with transaction.atomic():
+        previous = {row.pop('id'): row for row in App.objects.filter(id__in=ids).values('id', *SNAPSHOT_FIELDS)}
+        found = set(previous)
+        if dry_run or not found:
+            return found
+        with bulk_writes():
+            App.objects.filter(id__in=found).delete()
+    apps_bulk_loaded.send(sender=delete_apps, previous=previous)
+    # the apps' reviews went with them: no summary is left to recompute
+    reviews_bulk_loaded.send(sender=delete_apps, app_ids=())
+    return found
+
+
+def write_reviews(new_records, changed, dry_run=False):
+    """
+    Create reviews from the validated new_records and update the reviews in
+    changed ({review id: validated fields}). Returns the created reviews' ids
+    (None on a dry run) and the set of ids of changed that existed.
+    """
+    with transaction.atomic():
+        reviews = Review.objects.in_bulk(list(changed)) if changed else {}
+        if dry_run:
+            return [None] * len(new_records), set(reviews)
+
+        new_reviews = [Review(**fields) for fields in new_records]
+        for review in new_reviews:
+            # what Review.save() does for single writes
+            if not review.app_name:
+                review.app_name = review.app.name
+            review.populate_sentiment_key()
+            review.populate_content_hash()
+        Review.objects.bulk_create(new_reviews)
+        touched = {review.app_id for review in new_reviews}
+
+        update_fields = set()
+        for review_id, review in reviews.items():
+            # a review moved to another app changes both apps
+            touched.add(review.app_id)
+            for name, value in changed[review_id].items():
+                setattr(review, name, value)
+            review.populate_sentiment_key()
+            review.populate_content_hash()
+            touched.add(review.app_id)
+            update_fields.update(changed[review_id])
+        if reviews and update_fields:
+            Review.objects.bulk_update(list(reviews.values()), [*update_fields, 'sentiment_key', 'content_hash'])
+        bump_app_versions(touched)
+
+    reviews_bulk_loaded.send(sender=write_reviews, app_ids=touched)
+    return [review.id for review in new_reviews], set(reviews)
+
+
+def duplicate_reviews(new_records, changed):
+    """
+    Find the records write_reviews(new_records, changed) must not write because
+    their app already has a review with the same text, stored or written by an
+    earlier record. Returns the positions in new_records and the ids in changed.
+    """
+    # (app id, content hash) the reviews would have. Updates that keep their app
+    # and text keep their key, the others complete it from the stored review.
+    moved = [review_id for review_id, fields in changed.items() if 'app' in fields or 'translated_review' in fields]
+    stored = {}
+    if moved:
+        stored = {
+            review_id: (app_id, content_hash)
+            for review_id, app_id, content_hash in Review.objects.filter(id__in=moved).values_list('id', 'app_id', 'content_hash')
+        }
+    keys = [(('new', position), None, (fields['app'].id, review_content_hash(fields.get('translated_review'))))
+            for position, fields in enumerate(new_records)]
+    for review_id in moved:
+        if review_id not in stored:
+            continue  # reported as not found by write_reviews
+        app_id, content_hash = stored[review_id]
+        fields = changed[review_id]
+        if 'app' in fields:
+            app_id = fields['app'].id
+        if 'translated_review' in fields:
+            content_hash = review_content_hash(fields['translated_review'])
+        keys.append((('changed', review_id), review_id, (app_id, content_hash)))
+    if not keys:
+        return set(), set()
+
+    # one probe of the unique (app, content_hash) index for all the keys
+    existing = {
+        (app_id, content_hash): review_id
+        for review_id, app_id, content_hash in Review.objects.filter(
+            app_id__in={key[0] for _, _, key in keys}, content_hash__in={key[1] for _, _, key in keys},
+        ).values_list('id', 'app_id', 'content_hash')
+    }
+    duplicates = {'new': set(), 'changed': set()}
+    taken = set()
+    for (kind, record), own_id, key in keys:
+        if key in taken or existing.get(key, own_id) != own_id:
+            duplicates[kind].add(record)
+        else:
+            taken.add(key)
+    return duplicates['new'], duplicates['changed']
+
+
+def delete_reviews(ids, dry_run=False):
+    """Delete the reviews with the given ids. Returns the set of ids that existed."""
+    with transaction.atomic():
+        found = dict(Review.objects.filter(id__in=ids).values_list('id', 'app_id'))
+        if dry_run or not found:
+            return set(found)
+        with bulk_writes():
+            Review.objects.filter(id__in=found).delete()
+        bump_app_versions(set(found.values()))
+    reviews_bulk_loaded.send(sender=delete_reviews, app_ids=set(found.values()))
+    return set(found)
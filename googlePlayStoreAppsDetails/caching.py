@@ -0,0 +1,142 @@
+# Response caching for the read-heavy API views.
+#
+# A cached view stores its rendered GET response in Django's cache under a key
+# built from the path, the sorted query parameters, the Accept header and the
+# generation counters of the data it reads (see versioning.py). Writes bump
+# the counters, so stale entries are never looked up again and simply expire.
+# Every cached response carries an ETag and a Last-Modified header, and
+# conditional requests are answered with 304 straight from the cache entry.
+#
+# The app endpoints use row-version ETags instead (app_etag / page_etag),
+# built from App.version, which moves on with every write to the app or its reviews.
+
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from . import versioning
+
+KEY_PREFIX = 'api-response:'
+
+
+def response_cache_key(request, generations):
+    """Cache key for a GET request, given the current values of the generations it depends on."""
+    params = sorted((key, value) for key in request.GET for value in request.GET.getlist(key))
+    parts = [request.path, repr(params), request.META.get('HTTP_ACCEPT', ''), repr(generations)]
+    return KEY_PREFIX + hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def app_etag(app_id, version):
+    """Strong ETag of one app at one row version."""
+    return f'"app-{app_id}-v{version}"'
+
+
+def page_etag(request, apps, metadata=None):
+    """
+    Strong ETag of a page of apps: the request URL, the pagination metadata
+    sent with the page (count, next, previous) and every (id, version) pair.
+    """
+    digest = hashlib.md5(request.get_full_path().encode('utf-8'))
+    digest.update(repr(sorted((metadata or {}).items())).encode('utf-8'))
+    for app in apps:
+        digest.update(f'{app.pk}:{app.version};'.encode('ascii'))
+    return '"%s"' % digest.hexdigest()
+
+
+def etag_matches(header, etag, weak=True):
+    """
+    True when an If-None-Match (weak=True) or If-Match (weak=False) header
+    lists etag or '*'. Weak comparison ignores the W/ prefix.
+    """
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    if weak:
+        etags = [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+    return etag in etags
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+def cache_entry(content, content_type):
+    """What is stored in the cache for one response."""
+    return {
+        'content': content,
+        'content_type': content_type,
+        'etag': '"%s"' % hashlib.md5(content).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+
+
+def cached_response(request, entry, response=None):
+    """
+    The response to send for a cache entry: 304 for a matching conditional
+    request, else response (just computed) or the stored bytes.
+    """
+    not_modified = get_conditional_response(
+        request, etag=entry['etag'], last_modified=entry['last_modified'],
+    )
+    if not_modified is not None:
+        response = not_modified
+    elif response is None:
+        # cache hit: the stored bytes are sent as they are, without re-serializing
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Cache the successful GET responses of an APIView.
+    cache_generations names the generation counters the view's data depends on.
+    """
+    cache_generations = (versioning.APPS,)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        generations = [versioning.get_generation(name) for name in self.cache_generations]
+        key = response_cache_key(request, generations)
+        entry = cache.get(key)
+        response = None
+        if entry is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.render()
+            entry = cache_entry(response.content, response['Content-Type'])
+            cache.set(key, entry, settings.API_CACHE_TIMEOUT)
+        return cached_response(request, entry, response)
+
+
+class AsyncCachedResponseMixin:
+    """CachedResponseMixin for async Django views, using the cache's async API."""
+    cache_generations = (versioning.APPS,)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await super().dispatch(request, *args, **kwargs)
+
+        generations = [await versioning.aget_generation(name) for name in self.cache_generations]
+        key = response_cache_key(request, generations)
+        entry = await cache.aget(key)
+        response = None
+        if entry is None:
+            response = await super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = cache_entry(response.content, response['Content-Type'])
+            await cache.aset(key, entry, settings.API_CACHE_TIMEOUT)
+        return cached_response(request, entry, response)
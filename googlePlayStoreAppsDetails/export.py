@@ -0,0 +1,109 @@
+# Streaming exports of the catalogue and the reviews.
+#
+# Rows are read with values_list().iterator(chunk_size=...), so no model
+# instances are built and only one chunk of rows is held in memory at a time,
+# and written out as NDJSON (one JSON object per line) or CSV through a
+# StreamingHttpResponse. Clients sending Accept-Encoding: gzip get the stream
+# gzip-compressed on the fly.
+
+import csv
+import io
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import BaseRenderer
+
+# rows fetched from the database cursor at a time
+EXPORT_CHUNK_SIZE = 2000
+# approximate size of the pieces handed to the WSGI server
+FLUSH_BYTES = 64 * 1024
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Selected with ?format=ndjson or Accept: application/x-ndjson. Renders error payloads as one JSON line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, cls=DjangoJSONEncoder) + '\n').encode('utf-8')
+
+
+class CSVRenderer(BaseRenderer):
+    """Selected with ?format=csv or Accept: text/csv. Renders error payloads as field,message rows."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['field', 'message'])
+        for field, messages in (data or {}).items():
+            for message in messages if isinstance(messages, list) else [messages]:
+                writer.writerow([field, message])
+        return buffer.getvalue().encode('utf-8')
+
+
+def ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        # hand out what the writer produced and reuse the buffer
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+LINE_WRITERS = {'ndjson': ndjson_lines, 'csv': csv_lines}
+
+
+def encode_chunks(lines, compress=False):
+    """Join lines into pieces of about FLUSH_BYTES bytes, gzip-compressed if asked."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            data = ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+            yield compressor.compress(data) if compressor else data
+    data = ''.join(pending).encode('utf-8')
+    if compressor:
+        yield compressor.compress(data) + compressor.flush()
+    elif data:
+        yield data
+
+
+def accepts_gzip(request):
+    encodings = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    return any(part.split(';')[0].strip() == 'gzip' for part in encodings.split(','))
+
+
+def stream_export(request, queryset, columns, format, filename):
+    """Stream the columns of queryset as a file download in format ('ndjson' or 'csv')."""
+    rows = queryset.values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    compress = accepts_gzip(request)
+    renderer = NDJSONRenderer if format == 'ndjson' else CSVRenderer
+    response = StreamingHttpResponse(
+        encode_chunks(LINE_WRITERS[format](columns, rows), compress),
+        content_type=f'{renderer.media_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{format}"'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
@@ -0,0 +1,119 @@
+# Query-string filters shared by the app listing endpoints.
+# Every filter is translated to a queryset lookup so it runs in the database.
+
+import math
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from .ingest import normalize_sentiment
+from .models import Genre
+
+# integer range filters: query parameter -> queryset lookup
+INT_RANGE_FILTERS = {
+    'installs_min__gte': 'installs_min__gte',
+    'installs_min__lte': 'installs_min__lte',
+    'price_cents__gte': 'price_cents__gte',
+    'price_cents__lte': 'price_cents__lte',
+    'size_bytes__gte': 'size_bytes__gte',
+    'size_bytes__lte': 'size_bytes__lte',
+}
+
+# date filters on the last update: query parameter -> queryset lookup
+DATE_FILTERS = {
+    'updated_after': 'last_updated_date__gte',
+    'updated_before': 'last_updated_date__lte',
+}
+
+# fields accepted by ?ordering= (prefix with '-' for descending order)
+ORDERING_FIELDS = (
+    'id', 'name', 'rating', 'reviews', 'installs_min', 'price_cents', 'size_bytes', 'last_updated_date',
+    'review_count', 'positive_count', 'neutral_count', 'negative_count', 'avg_polarity',
+)
+
+
+def filter_apps(queryset, params):
+    """Apply the app filters found in params (a QueryDict) to queryset."""
+    genre = params.get('genre')
+    if genre:
+        # resolve the genre once, then filter through the indexed join table
+        genre_id = Genre.objects.filter(name__iexact=genre).values_list('id', flat=True).first()
+        if genre_id is None:
+            return queryset.none()
+        queryset = queryset.filter(genre_set=genre_id)
+
+    for name, lookup in INT_RANGE_FILTERS.items():
+        value = parse_int_param(params, name)
+        if value is not None:
+            queryset = queryset.filter(**{lookup: value})
+
+    for name, lookup in DATE_FILTERS.items():
+        value = parse_date_param(params, name)
+        if value is not None:
+            queryset = queryset.filter(**{lookup: value})
+    return queryset
+
+
+def filter_reviews(queryset, params):
+    """Apply the review filters found in params (?app=<id>, ?sentiment=) to queryset."""
+    app_id = parse_int_param(params, 'app')
+    if app_id is not None:
+        queryset = queryset.filter(app_id=app_id)
+    sentiment = normalize_sentiment(params.get('sentiment'))
+    if sentiment:
+        # case-insensitive, through the indexed lower-case column
+        queryset = queryset.filter(sentiment_key=sentiment)
+    return queryset
+
+
+def get_ordering(params, default='id'):
+    """Return the validated ?ordering= field (e.g. '-installs_min'), or default."""
+    ordering = params.get('ordering') or default
+    if ordering.lstrip('-') not in ORDERING_FIELDS:
+        raise ValidationError({'ordering': f"Must be one of {', '.join(ORDERING_FIELDS)}, optionally prefixed with '-'."})
+    return ordering
+
+
+def order_apps(queryset, params):
+    """Order queryset by ?ordering=, with the id as tie-breaker so pages are stable."""
+    ordering = get_ordering(params)
+    if ordering.lstrip('-') == 'id':
+        return queryset.order_by(ordering)
+    return queryset.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+
+
+def parse_int_param(params, name):
+    """Return an integer query parameter, None when absent, or raise a 400 error."""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be an integer.'})
+
+
+def parse_float_param(params, name):
+    """Return a number query parameter, None when absent, or raise a 400 error."""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = float(value)
+    except ValueError:
+        parsed = None
+    if parsed is None or not math.isfinite(parsed):
+        raise ValidationError({name: 'Must be a number.'})
+    return parsed
+
+
+def parse_date_param(params, name):
+    """Return a YYYY-MM-DD query parameter as a date, None when absent, or raise a 400 error."""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Must be a date in YYYY-MM-DD format.'})
+    return parsed
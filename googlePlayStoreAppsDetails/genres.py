@@ -0,0 +1,40 @@
+# Maintenance of the normalised Genre table and the App <-> Genre links.
+# The semicolon-separated App.genres string stays the source of truth; these
+# helpers mirror it into App.genre_set so genre filters and aggregates can
+# use the join table's indexes.
+
+from django.apps import apps as django_apps
+from .stats import APP_LABEL, split_genres
+
+
+def genre_ids(names, registry=django_apps):
+    """Return a {name: id} dict for names, creating the genres that do not exist yet."""
+    Genre = registry.get_model(APP_LABEL, 'Genre')
+    names = set(names)
+    known = dict(Genre.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - known.keys()
+    if missing:
+        Genre.objects.bulk_create([Genre(name=name) for name in missing], ignore_conflicts=True)
+        known.update(Genre.objects.filter(name__in=missing).values_list('name', 'id'))
+    return known
+
+
+def link_genres(app_genres, replace=False, registry=django_apps, batch_size=2000):
+    """Link apps to their genres from a {app_id: genres string} dict.
+
+    With replace=True the existing links of those apps are removed first,
+    which is needed when the genres of existing apps changed.
+    """
+    App = registry.get_model(APP_LABEL, 'App')
+    Link = App.genre_set.through
+    split = {app_id: split_genres(genres) for app_id, genres in app_genres.items()}
+    ids = genre_ids({name for names in split.values() for name in names}, registry)
+    if replace:
+        app_ids = list(split)
+        for start in range(0, len(app_ids), batch_size):
+            Link.objects.filter(app_id__in=app_ids[start:start + batch_size]).delete()
+    Link.objects.bulk_create(
+        [Link(app_id=app_id, genre_id=ids[name]) for app_id, names in split.items() for name in names],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
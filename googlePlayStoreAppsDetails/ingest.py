@@ -0,0 +1,332 @@
+# Helpers shared by the CSV load commands (load_playstore / load_reviews).
+# Rows are parsed into plain dictionaries of model field values so the
+# commands can build model instances in batches and write them with
+# bulk_create / bulk_update instead of one query per row.
+#
+# Parsing can also run in a process pool: the file is split into byte ranges
+# that start and end on record boundaries, each worker parses one range and
+# the parsed rows are handed back, in file order, to the single writer.
+# This module must not import Django models so it stays cheap to load in workers.
+
+import csv
+import hashlib
+import io
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+
+
+# default number of CSV rows handled per transaction by the load commands.
+DEFAULT_BATCH_SIZE = 2000
+
+# target size of the byte ranges handed to parser processes. Files are cut in
+# at least one range per worker and in more when they are larger than this.
+CHUNK_BYTES = 8 * 1024 * 1024
+
+# size of the blocks read while looking for record boundaries
+SCAN_BLOCK_BYTES = 1024 * 1024
+
+# multipliers for the size suffixes used by the Play Store ('19M', '201k')
+SIZE_UNITS = {'k': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+
+# date formats found in the 'Last Updated' column ('7-Jan-18', 'January 7, 2018')
+DATE_FORMATS = ('%d-%b-%y', '%B %d, %Y')
+
+# parsed CSV fields covered by the row fingerprints stored on App and Review
+APP_FINGERPRINT_FIELDS = (
+    'name', 'category', 'rating', 'reviews', 'size', 'installs', 'type', 'price',
+    'content_rating', 'genres', 'last_updated', 'current_version', 'android_version',
+)
+REVIEW_FINGERPRINT_FIELDS = ('app_name', 'translated_review', 'sentiment', 'sentiment_polarity')
+
+
+def parse_float(value):
+    """Return value as a float, or None when it is missing, invalid or NaN."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    # the dataset uses the literal string 'NaN' for missing ratings
+    if math.isnan(number):
+        return None
+    return number
+
+
+def parse_int(value):
+    """Return value as an int, or None when it is missing or invalid (e.g. '3.0M')."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_sentiment(label):
+    """' Positive' -> 'positive', the indexed form of a sentiment label. None when empty."""
+    return (label or '').strip().lower() or None
+
+
+def parse_installs(value):
+    """'10,000+' -> 10000. Returns None for values that are not install counts."""
+    digits = (value or '').strip().rstrip('+').replace(',', '')
+    return int(digits) if digits.isdigit() else None
+
+
+def parse_price(value):
+    """'$4.99' -> 499 and '0' -> 0, in cents. Returns None for values that are not prices."""
+    text = (value or '').strip().lstrip('$')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount < 0:
+        return None
+    return int((amount * 100).to_integral_value())
+
+
+def parse_size(value):
+    """'19M' -> 19922944 bytes. Returns None for 'Varies with device' and other values."""
+    text = (value or '').strip()
+    unit = SIZE_UNITS.get(text[-1:])
+    if unit is None:
+        return None
+    try:
+        return int(float(text[:-1]) * unit)
+    except ValueError:
+        return None
+
+
+def parse_last_updated(value):
+    """'7-Jan-18' -> date(2018, 1, 7). Returns None when the date cannot be read."""
+    text = (value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def typed_app_fields(installs, price, size, last_updated):
+    """Return the typed companion columns of App for its raw string columns."""
+    return {
+        'installs_min': parse_installs(installs),
+        'price_cents': parse_price(price),
+        'size_bytes': parse_size(size),
+        'last_updated_date': parse_last_updated(last_updated),
+    }
+
+
+def parse_app_row(row):
+    """Convert one googleplaystore.csv row into App field values."""
+    fields = {
+        'name': row.get('App')[:999],  # limited to 999 chars
+        'category': row.get('Category'),
+        'rating': parse_float(row.get('Rating')),
+        'reviews': parse_int(row.get('Reviews')),
+        'size': row.get('Size'),
+        'installs': row.get('Installs'),
+        'type': row.get('Type'),
+        'price': row.get('Price'),
+        'content_rating': row.get('Content Rating'),
+        'genres': row.get('Genres'),
+        'last_updated': row.get('Last Updated'),
+        'current_version': row.get('Current Ver'),
+        'android_version': row.get('Android Ver'),
+    }
+    fields.update(typed_app_fields(fields['installs'], fields['price'], fields['size'], fields['last_updated']))
+    fields['fingerprint'] = row_fingerprint(fields, APP_FINGERPRINT_FIELDS)
+    return fields
+
+
+def parse_review_row(row):
+    """Convert one googleplaystore_user_reviews.csv row into Review field values.
+
+    Several column spellings are accepted for flexibility. The app foreign key
+    is resolved by the caller from 'app_name'.
+    """
+    # Try multiple possible column names for sentiment polarity
+    polarity = row.get('Sentiment_Polarity') or row.get('sentiment_polarity') or row.get('Polarity')
+    sentiment = row.get('Sentiment') or row.get('sentiment') or 'neutral'
+    fields = {
+        'app_name': row.get('App') or row.get('app_name'),
+        'translated_review': row.get('Translated_Review') or row.get('translated_review') or '',
+        'sentiment': sentiment,
+        'sentiment_key': normalize_sentiment(sentiment),
+        'sentiment_polarity': parse_float(polarity) if polarity else None,  # ranges -1.0 to 1.0
+    }
+    fields['content_hash'] = review_content_hash(fields['translated_review'])
+    fields['fingerprint'] = row_fingerprint(fields, REVIEW_FINGERPRINT_FIELDS)
+    return fields
+
+
+def row_fingerprint(fields, names):
+    """
+    Digest of the values of the fields names, as parsed from a CSV row (or read back
+    from the database, which gives the same digest for a row loaded unchanged).
+    Incremental loads compare it with the stored one to skip unchanged rows.
+    """
+    payload = '\x1f'.join(repr(fields[name]) for name in names)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def review_content_hash(text):
+    """
+    Fixed-width digest of a review's text (Review.content_hash). A review is
+    unique per app and content hash, so duplicates are found with an index probe.
+    """
+    return hashlib.blake2b((text or '').encode('utf-8'), digest_size=16).hexdigest()
+
+
+def review_key(app_id, text):
+    """Dedup key for a review: the app id plus the digest of its text."""
+    return (app_id, review_content_hash(text))
+
+
+def iter_batches(iterable, size):
+    """Yield lists of at most size items from iterable without reading it all into memory."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def safe_parse(parse_row, row):
+    """Return (fields, None) for a parsed row, or (None, error message) when parsing fails."""
+    try:
+        return parse_row(row), None
+    except Exception as e:
+        return None, str(e)
+
+
+def find_record_boundaries(path, targets):
+    """Return the offsets just after the first record end found at or past each target offset.
+
+    A newline ends a record only when the number of quote characters before it
+    is even, so newlines inside quoted fields are never used as boundaries.
+    Targets that fall inside a record already claimed by an earlier target are
+    dropped, so the result may be shorter than targets.
+    """
+    boundaries = []
+    targets = sorted(targets)
+    index = 0
+    quotes = 0  # quote characters seen before offset + pos
+    offset = 0
+    with open(path, 'rb') as f:
+        while index < len(targets):
+            block = f.read(SCAN_BLOCK_BYTES)
+            if not block:
+                break
+            pos = 0
+            while index < len(targets):
+                start = targets[index] - offset
+                if start >= len(block):
+                    break
+                newline = block.find(b'\n', max(pos, start))
+                while newline != -1:
+                    quotes += block.count(b'"', pos, newline)
+                    pos = newline
+                    if quotes % 2 == 0:
+                        break
+                    newline = block.find(b'\n', newline + 1)
+                if newline == -1:
+                    break
+                boundary = offset + newline + 1
+                boundaries.append(boundary)
+                while index < len(targets) and targets[index] < boundary:
+                    index += 1
+            quotes += block.count(b'"', pos)
+            offset += len(block)
+    return boundaries
+
+
+def partition_csv(path, parts):
+    """Split a CSV file into byte ranges aligned to record boundaries.
+
+    Returns (header, ranges) where header is the list of column names and
+    ranges is a list of (start, end) offsets covering every data record once.
+    """
+    size = os.path.getsize(path)
+    parts = max(1, parts, math.ceil(size / CHUNK_BYTES))
+    # the first target finds the end of the header record
+    targets = [0] + [size * i // parts for i in range(1, parts)]
+    boundaries = find_record_boundaries(path, targets)
+    if not boundaries:
+        return [], []
+
+    with open(path, 'rb') as f:
+        header_text = f.read(boundaries[0]).decode('utf-8')
+    header = next(csv.reader(io.StringIO(header_text, newline='')), [])
+
+    edges = boundaries + [size]
+    ranges = [(start, end) for start, end in zip(edges, edges[1:]) if end > start]
+    return header, ranges
+
+
+def parse_csv_range(path, header, start, end, parse_row):
+    """Parse the records in one byte range of a CSV file. Runs in a worker process."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        # ranges end right after a newline, so multi-byte characters are never cut
+        text = f.read(end - start).decode('utf-8')
+    reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=header)
+    return [safe_parse(parse_row, row) for row in reader]
+
+
+def iter_parsed_batches(path, parse_row, batch_size, workers=1):
+    """Yield batches of (fields, error) tuples parsed from a CSV file, in file order.
+
+    With workers > 1 the file is partitioned and parsed in a process pool. At
+    most two ranges per worker are in flight so memory stays bounded however
+    large the file is.
+    """
+    if workers <= 1:
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            # DictReader maps each row to a dictionary using CSV header names
+            reader = csv.DictReader(csvfile)
+            for batch in iter_batches(reader, batch_size):
+                yield [safe_parse(parse_row, row) for row in batch]
+        return
+
+    header, ranges = partition_csv(path, workers)
+    yield from iter_batches(chain.from_iterable(_parse_ranges(path, header, ranges, parse_row, workers)), batch_size)
+
+
+def _parse_ranges(path, header, ranges, parse_row, workers):
+    """Yield the parsed rows of each range in order while keeping the pool busy."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        remaining = iter(ranges)
+        for start, end in islice(remaining, workers * 2):
+            pending.append(pool.submit(parse_csv_range, path, header, start, end, parse_row))
+        while pending:
+            rows = pending.popleft().result()
+            for start, end in islice(remaining, 1):
+                pending.append(pool.submit(parse_csv_range, path, header, start, end, parse_row))
+            yield rows
+
+
+class Throughput:
+    """Small stopwatch used by the load commands to report rows per second."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        elapsed = self.elapsed
+        rate = self.rows / elapsed if elapsed > 0 else 0
+        return f'{self.rows} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)'
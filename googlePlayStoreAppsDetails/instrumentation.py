@@ -0,0 +1,222 @@
+# Per-request performance figures: SQL query count and time, rendering time,
+# total time and response size, recorded per view.
+#
+# InstrumentationMiddleware wraps every request in connection.execute_wrapper()
+# to time the queries, and InstrumentedJSONRenderer (the DRF hook, set in
+# REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']) adds the time spent rendering.
+# Each response carries the figures in a Server-Timing header, and rolling
+# summaries of the last INSTRUMENTATION_WINDOW requests per view are served in
+# Prometheus text format at /metrics. Queries slower than SLOW_QUERY_MS and
+# requests running more than QUERY_COUNT_WARNING queries (e.g. an N+1 on nested
+# reviews) are logged to the 'googlePlayStoreAppsDetails.performance' logger.
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+logger = logging.getLogger('googlePlayStoreAppsDetails.performance')
+
+# metric name -> help text
+METRICS = {
+    'api_request_duration_seconds': 'Time spent handling the request.',
+    'api_db_queries': 'Number of SQL queries run by the request.',
+    'api_db_duration_seconds': 'Time spent in SQL queries.',
+    'api_render_duration_seconds': 'Time spent rendering the response body.',
+    'api_response_bytes': 'Size of the response body (streamed responses are not counted).',
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RequestProfile:
+    """Figures of one request, collected while it runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.rendering = False
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook: time every query of the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+                self.slow_queries.append((elapsed, sql))
+
+
+class Registry:
+    """Rolling samples per (metric, view), bounded to the last INSTRUMENTATION_WINDOW requests."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=settings.INSTRUMENTATION_WINDOW))
+        # running totals since start-up, as Prometheus expects for _sum / _count
+        self.totals = defaultdict(lambda: [0.0, 0])
+
+    def observe(self, view, values):
+        with self.lock:
+            for metric, value in values.items():
+                self.samples[metric, view].append(value)
+                total = self.totals[metric, view]
+                total[0] += value
+                total[1] += 1
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.totals.clear()
+
+    def render(self):
+        """The samples as Prometheus summaries."""
+        with self.lock:
+            snapshot = {key: sorted(values) for key, values in self.samples.items()}
+            totals = {key: tuple(total) for key, total in self.totals.items()}
+        lines = []
+        for metric, help_text in METRICS.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} summary')
+            for (name, view), values in sorted(snapshot.items()):
+                if name != metric:
+                    continue
+                label = view.replace('\\', '\\\\').replace('"', '\\"')
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{view="{label}",quantile="{q}"}} {quantile(values, q):.6g}')
+                total, count = totals[name, view]
+                lines.append(f'{metric}_sum{{view="{label}"}} {total:.6g}')
+                lines.append(f'{metric}_count{{view="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def quantile(values, q):
+    """Nearest-rank quantile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.func.__name__
+
+
+def server_timing(profile, total_seconds):
+    app_seconds = max(total_seconds - profile.db_seconds - profile.render_seconds, 0.0)
+    return ', '.join([
+        f'db;dur={profile.db_seconds * 1000:.2f};desc="{profile.queries} queries"',
+        f'render;dur={profile.render_seconds * 1000:.2f}',
+        f'app;dur={app_seconds * 1000:.2f}',
+        f'total;dur={total_seconds * 1000:.2f}',
+    ])
+
+
+def add_wrapper(profile):
+    connection.execute_wrappers.append(profile)
+
+
+def remove_wrapper(profile):
+    connection.execute_wrappers.remove(profile)
+
+
+class InstrumentationMiddleware:
+    """Times each request and its SQL queries. Put it first in MIDDLEWARE. Runs sync (WSGI) or async (ASGI)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = request._perf_profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            response = self.get_response(request)
+        return self.record(request, response, profile)
+
+    async def __acall__(self, request):
+        # the async ORM (and sync views) run the queries on the request's thread-sensitive
+        # thread, with that thread's connection: install the wrapper there
+        profile = request._perf_profile = RequestProfile()
+        await sync_to_async(add_wrapper)(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(remove_wrapper)(profile)
+        return self.record(request, response, profile)
+
+    def record(self, request, response, profile):
+        total_seconds = time.perf_counter() - profile.started
+        response['Server-Timing'] = server_timing(profile, total_seconds)
+
+        view = view_name(request)
+        if view is None:
+            return response
+        values = {
+            'api_request_duration_seconds': total_seconds,
+            'api_db_queries': profile.queries,
+            'api_db_duration_seconds': profile.db_seconds,
+            'api_render_duration_seconds': profile.render_seconds,
+        }
+        if not response.streaming:
+            values['api_response_bytes'] = len(response.content)
+        registry.observe(view, values)
+        self.log(request, view, profile)
+        return response
+
+    def log(self, request, view, profile):
+        for elapsed, sql in profile.slow_queries:
+            logger.warning('Slow query (%.1f ms) in %s %s: %s', elapsed * 1000, view, request.path, sql)
+        if profile.queries > settings.QUERY_COUNT_WARNING:
+            logger.warning('%s %s ran %d queries', view, request.get_full_path(), profile.queries)
+
+
+class RenderTimingMixin:
+    """DRF renderer hook adding the rendering time to the request's profile."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        request = (renderer_context or {}).get('request')
+        profile = getattr(getattr(request, '_request', None), '_perf_profile', None)
+        # the browsable API renders the JSON with the JSON renderer: count that time once
+        if profile is None or profile.rendering:
+            return super().render(data, accepted_media_type, renderer_context)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            profile.render_seconds += time.perf_counter() - started
+            profile.rendering = False
+
+
+class InstrumentedJSONRenderer(RenderTimingMixin, JSONRenderer):
+    pass
+
+
+class InstrumentedBrowsableAPIRenderer(RenderTimingMixin, BrowsableAPIRenderer):
+    pass
+
+
+def metrics(request):
+    """The rolling per-view summaries in Prometheus text format."""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
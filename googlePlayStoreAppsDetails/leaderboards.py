@@ -0,0 +1,138 @@
+# Top-K leaderboards of apps, overall and per category and genre.
+#
+# Apps are ranked by a Bayesian weighted rating: the app's rating shrunk
+# towards the mean rating of the catalogue by its number of ratings,
+#
+#     score = (v * R + m * C) / (v + m)
+#
+# with R the app's rating, v its number of ratings (App.reviews), C the mean
+# rating and m = PRIOR_VOTES. A 5.0 with three ratings no longer outranks a
+# 4.8 with a million. Ties are broken by the number of ratings, then the id.
+#
+# The scores are stored in LeaderboardEntry, one row per rated app and board,
+# and the rows are read in index order. Full loads rebuild the table; single
+# app writes and bulk writes naming their apps refresh those apps' rows only,
+# scored with the mean stored with the entries, unless the catalogue mean
+# moved by more than MEAN_TOLERANCE, in which case every score is recomputed.
+
+from django.apps import apps as django_apps
+from django.db import connection, transaction
+from django.db.models import Sum
+from .models import LeaderboardEntry
+from .stats import APP_LABEL, UNKNOWN_CATEGORY, category_key, split_genres
+
+OVERALL = 'all'
+# weight of the mean rating, in number of ratings
+PRIOR_VOTES = 1000
+# drift of the mean rating (in stars) above which single writes rescore every app
+MEAN_TOLERANCE = 0.005
+DEFAULT_K = 50
+MAX_K = 500
+
+ENTRY_FIELDS = ('id', 'category', 'genres', 'rating', 'reviews')
+
+
+def category_board(category):
+    return f'category:{category_key(category)}'
+
+
+def genre_board(genre):
+    return f'genre:{genre}'
+
+
+def boards_for(category, genres):
+    """Boards an app with this category and genres string appears on."""
+    return [OVERALL, category_board(category), *(genre_board(genre) for genre in split_genres(genres))]
+
+
+def weighted_rating(rating, votes, mean, prior=PRIOR_VOTES):
+    votes = votes or 0
+    return (votes * rating + prior * mean) / (votes + prior)
+
+
+def mean_rating(registry=django_apps):
+    """Mean rating of the rated apps, read from the pre-aggregated CategoryStat table."""
+    CategoryStat = registry.get_model(APP_LABEL, 'CategoryStat')
+    totals = CategoryStat.objects.aggregate(rating_sum=Sum('rating_sum'), rated=Sum('rated_count'))
+    return totals['rating_sum'] / totals['rated'] if totals['rated'] else 0.0
+
+
+def entries_for(app, mean):
+    """LeaderboardEntry rows of one app (a dict of ENTRY_FIELDS), none when it has no rating."""
+    if app['rating'] is None:
+        return []
+    score = weighted_rating(app['rating'], app['reviews'], mean)
+    return [
+        LeaderboardEntry(board=board, app_id=app['id'], score=score, votes=app['reviews'] or 0, prior_mean=mean)
+        for board in boards_for(app['category'], app['genres'])
+    ]
+
+
+def rebuild(registry=django_apps, mean=None):
+    """
+    Recompute every leaderboard (after bulk loads and from data migrations)
+    with one INSERT ... SELECT per kind of board, the scores computed in SQL
+    with the same formula as weighted_rating(). mean is the mean_rating()
+    when the caller already read it.
+    """
+    App = registry.get_model(APP_LABEL, 'App')
+    Entry = registry.get_model(APP_LABEL, 'LeaderboardEntry')
+    Genre = registry.get_model(APP_LABEL, 'Genre')
+    Link = App.genre_set.through
+    if mean is None:
+        mean = mean_rating(registry)
+
+    entry, app, genre, link = (model._meta.db_table for model in (Entry, App, Genre, Link))
+    votes = 'COALESCE(a.reviews, 0)'
+    select = (
+        f'SELECT {{board}}, a.id, ({votes} * a.rating + %s * %s) / ({votes} + %s), {votes}, %s '
+        f'FROM "{app}" a {{join}}WHERE a.rating IS NOT NULL'
+    )
+    boards = [
+        ("'" + OVERALL + "'", ''),
+        (f"'category:' || COALESCE(NULLIF(a.category, ''), '{UNKNOWN_CATEGORY}')", ''),
+        ("'genre:' || g.name", f'JOIN "{link}" l ON l.app_id = a.id JOIN "{genre}" g ON g.id = l.genre_id '),
+    ]
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{entry}"')
+        for board, join in boards:
+            cursor.execute(
+                f'INSERT INTO "{entry}" (board, app_id, score, votes, prior_mean) ' + select.format(board=board, join=join),
+                [PRIOR_VOTES, mean, PRIOR_VOTES, mean],
+            )
+
+
+def update_app(app):
+    """Refresh the entries of one saved app."""
+    values = {field: getattr(app, 'pk' if field == 'id' else field) for field in ENTRY_FIELDS}
+    update_apps([app.pk], [values])
+
+
+def update_apps(app_ids, apps):
+    """
+    Refresh the entries of the apps app_ids after a bulk write. apps holds the
+    values (dicts of ENTRY_FIELDS) of the ones still stored, the others lose their entries.
+    """
+    mean = mean_rating()
+    stored = LeaderboardEntry.objects.values_list('prior_mean', flat=True).first()
+    if stored is None or abs(mean - stored) > MEAN_TOLERANCE:
+        rebuild(mean=mean)
+        return
+    # within an open transaction the entries need no savepoint of their own
+    with transaction.atomic(savepoint=False):
+        LeaderboardEntry.objects.filter(app_id__in=app_ids).delete()
+        LeaderboardEntry.objects.bulk_create([entry for app in apps for entry in entries_for(app, stored)])
+
+
+def top_queryset(board, k=DEFAULT_K):
+    """The first k entries of a board, best first, with their apps (read with aiterator() by the async views)."""
+    return (
+        LeaderboardEntry.objects.filter(board=board)
+        .order_by('-score', '-votes', 'app_id')
+        .select_related('app')[:k]
+    )
+
+
+def top(board, k=DEFAULT_K):
+    """The first k entries of a board, best first, with their apps."""
+    return list(top_queryset(board, k))
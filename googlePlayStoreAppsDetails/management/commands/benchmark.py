@@ -0,0 +1,182 @@
+# Django management command to benchmark the API endpoints and the load
+# commands on synthetic catalogues.
+# Every catalogue size is generated in a throwaway test database, so the
+# command never touches the data in the configured database.
+# Results can be written to a JSON file with --output, and compared with the
+# file of an earlier commit with --compare: the command then fails when a
+# scenario runs more queries, or gets slower or hungrier than --threshold allows.
+#
+# With --concurrency N the read-only endpoints are also run under load: the
+# synchronous views from N threads (as N gunicorn sync workers would serve
+# them, the WSGI path) against their async versions under /api/async/ with N
+# requests in flight on a single event loop (one ASGI worker). Compare the
+# requests_per_s of the 'wsgi ...' and 'asgi ...' lines, e.g.
+#
+#     python manage.py benchmark --sizes 100000 --concurrency 32 --requests 500
+#
+# Both paths run in this one process against the same database, so the figures
+# compare the two paths with each other, not with a deployed server. With an
+# in-process SQLite database every request is CPU-bound and the async path
+# mostly pays for its thread hops; it can only pull ahead when requests wait
+# on a database server over the network. On the configured SQLite database
+# (5000 apps, --concurrency 8 --requests 200, requests per second):
+#
+#     endpoint                             wsgi    asgi
+#     app detail (most reviews)            11.5    11.8
+#     search_by_name                      147.5    76.1
+#     category_stats?type&min_installs    104.3    60.8
+#     reviews by_sentiment                170.9    71.4
+#     top-rated                            78.6    57.3
+#
+# so the Procfile keeps gunicorn's sync workers (midtermCoursework.wsgi). The
+# /api/async/ endpoints work under both; serve midtermCoursework.asgi with
+# '-k uvicorn_worker.UvicornWorker' only once a run against the deployed
+# database shows the asgi figures ahead. uvicorn and uvicorn-worker are not in
+# requirements.txt: add them to the requirements in the same change as the Procfile.
+
+import json
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from googlePlayStoreAppsDetails import benchmarks
+
+
+class Command(BaseCommand):
+    """Django management command for running the API benchmarks."""
+
+    help = 'Benchmark the API endpoints and the load commands (queries, time, peak memory) on synthetic catalogues'
+
+    def add_arguments(self, parser):
+        """Define command-line arguments."""
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='Catalogue sizes (number of apps) to benchmark'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per scenario'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=0,
+            help='Also compare the WSGI and ASGI read paths with this many concurrent requests'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Number of requests per endpoint and path in the --concurrency comparison'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results to this JSON file'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON file of an earlier run: fail on regressions against it'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=1.5,
+            help='Allowed ratio of median time and peak memory to the --compare run'
+        )
+        parser.add_argument(
+            '--min-delta-ms',
+            type=float,
+            default=1.0,
+            help='Time differences below this are never reported as regressions'
+        )
+
+    def handle(self, *args, **options):
+        """Main command execution logic."""
+        # read the baseline first, so a wrong path fails before the long run
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())['results']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        results = {}
+        setup_test_environment()
+        try:
+            for size in options['sizes']:
+                # JSON object keys are strings: use the same keys in memory
+                results[str(size)] = self.run_size(size, options)
+        finally:
+            teardown_test_environment()
+
+        if options['output']:
+            report = {'meta': self.meta(options), 'results': results}
+            Path(options['output']).write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmarks.compare(results, baseline, options['threshold'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError('Regressions found:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def run_size(self, size, options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                apps_path = Path(directory) / 'apps.csv'
+                reviews_path = Path(directory) / 'reviews.csv'
+                self.stdout.write(f'Generating {size} apps')
+                with open(apps_path, 'w', newline='') as apps_file, open(reviews_path, 'w', newline='') as reviews_file:
+                    reviews = benchmarks.write_catalogue_csv(apps_file, reviews_file, size)
+                self.stdout.write(f'Generated {reviews} reviews')
+                # the load commands are benchmarked while they fill the database
+                results = benchmarks.bench_loads(str(apps_path), str(reviews_path))
+            for suite in benchmarks.SUITES.values():
+                results.update(suite(options['repeat']))
+            if options['concurrency'] > 0:
+                results.update(benchmarks.bench_throughput(options['concurrency'], options['requests']))
+            for scenario, result in results.items():
+                line = (
+                    f"  {size:>9} {scenario:<42} {result['queries']:>5} queries "
+                    f"{result['median_ms']:>10.2f} ms median {result['min_ms']:>10.2f} ms min"
+                )
+                if 'peak_kb' in result:
+                    line += f" {result['peak_kb']:>10.1f} KB peak"
+                if 'requests_per_s' in result:
+                    line += f" {result['requests_per_s']:>10.1f} req/s"
+                self.stdout.write(line)
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def meta(self, options):
+        """Where the results come from, to tell runs apart when comparing them."""
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'sizes': options['sizes'],
+            'repeat': options['repeat'],
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+        }
@@ -1,97 +1,200 @@
 
 # Django management command to bulk-load Google Play Store app data from CSV file
 # it reads googleplaystore.csv and creates App records in the database.
+# Rows are streamed in batches: each batch is written with bulk_create (and
+# bulk_update when --update is passed) inside a single transaction.
+# With --workers N the CSV is split into chunks parsed by N processes.
+# With --incremental each row's fingerprint (a digest of its parsed fields) is
+# compared with the one stored on the app: unchanged rows are skipped without
+# any write and only the changed apps are updated, so a release changing 1% of
+# the file does about 1% of the writes. The derived tables (stats, leaderboards,
+# search index) are then refreshed for the created, changed and deleted apps
+# only, instead of being rebuilt. --prune also deletes the apps that are no
+# longer in the file.
 
-import csv
-from django.core.management.base import BaseCommand
-from googlePlayStoreAppsDetails.models import App
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from googlePlayStoreAppsDetails.models import TYPED_FIELDS, App
+from googlePlayStoreAppsDetails.genres import link_genres
+from googlePlayStoreAppsDetails.signals import SNAPSHOT_FIELDS, apps_bulk_loaded, bulk_writes, reviews_bulk_loaded
+from googlePlayStoreAppsDetails.ingest import DEFAULT_BATCH_SIZE, Throughput, iter_parsed_batches, parse_app_row
 from pathlib import Path
 
 
+# fields refreshed on existing apps when the command runs with --update
+UPDATE_FIELDS = [
+    'category', 'rating', 'reviews', 'size', 'installs', 'type', 'price',
+    'content_rating', 'genres', 'last_updated', 'current_version', 'android_version',
+    *TYPED_FIELDS, 'version', 'updated_at', 'fingerprint',
+]
+
+# apps deleted per transaction by --prune
+PRUNE_BATCH_SIZE = 1000
+
+# apps whose values before the load are read per query (--incremental)
+SNAPSHOT_BATCH_SIZE = 1000
+
+
 class Command(BaseCommand):
     """Django management command for loading Play Store app data."""
-    
+
     help = 'Load googleplaystore.csv into App model'
 
     def add_arguments(self, parser):
         """Define command-line arguments."""
-        
+
         parser.add_argument(
             '--path',
             help='Path to csv file',
             default=str(Path.cwd() / 'googleplaystore.csv')
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of CSV rows written per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse the CSV file'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Refresh apps that already exist instead of skipping them'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Refresh only the existing apps whose CSV row changed since it was loaded'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='With --incremental, delete the apps that are not in the file any more'
+        )
 
     # overriden handle method that will execute everytime the app is launched.
     def handle(self, *args, **options):
         """Main command execution logic."""
         # Retrieve the CSV file path from command-line arguments
         path = options['path']
+        batch_size = max(1, options['batch_size'])
         self.stdout.write(f'Loading data from {path}')
-        
-        # variable to track how many new apps were created
+
+        if options['prune'] and not options['incremental']:
+            raise CommandError('--prune only works with --incremental')
+        incremental = options['incremental']
+
+        # Preload every known app name (with the fingerprint of its last loaded row) once,
+        # so duplicates and unchanged rows are detected in memory instead of with a query per row.
+        existing = {name: (app_id, fingerprint) for name, app_id, fingerprint in App.objects.values_list('name', 'id', 'fingerprint')}
+        # names already handled in this run. The first row for a name wins, as before.
+        seen = set()
+
+        # variables to track how many apps were created / refreshed / left as they were
         count = 0
-        
-        # Open the CSV file with UTF-8 encoding (handles special characters)
-        # newline='' is required by the CSV module to handle line endings correctly
-        with open(path, newline='', encoding='utf-8') as csvfile:
-            # DictReader maps each row to a dictionary using CSV header names
-            reader = csv.DictReader(csvfile)
-            
-            # Iterate through each row in the CSV file
-            for row in reader:
-                try:
-                    
-                    rating = None
-                    try:
-                        # Attempt to convert the Rating string to a float
-                        rating = float(row.get('Rating'))
-                    except Exception:
-                        # If conversion fails, leave rating as None
-                        rating = None
-                    
-                    
-                    reviews = None
-                    try:
-                        # Attempt to convert the Reviews string to an integer
-                        reviews = int(row.get('Reviews'))
-                    except Exception:
-                        # If conversion fails, leave reviews as None 
-                        reviews = None
-
-                    
-                    # Use get_or_create to avoid duplicates. checks if the app name already exist
-                    # The 'created' flag indicates whether a new record was created
-                    app, created = App.objects.get_or_create(
-                        #  lookup field is app name 
-                        name=row.get('App')[:999], #imited to 999 chars
-                        # Default values for new app records
-                        defaults={
-                            'category': row.get('Category'),                  
-                            'rating': rating,                                
-                            'reviews': reviews,                               
-                            'size': row.get('Size'),                          
-                            'installs': row.get('Installs'),                 
-                            'type': row.get('Type'),                          
-                            'price': row.get('Price'),                       
-                            'content_rating': row.get('Content Rating'),    
-                            'genres': row.get('Genres'),                      
-                            'last_updated': row.get('Last Updated'),          
-                            'current_version': row.get('Current Ver'),       
-                            'android_version': row.get('Android Ver'),       
-                        }
-                    )
-                    
-                    # Increment counter only if a new app was created
-                    if created:
-                        count += 1
-                        
-                except Exception as e:
-                    # print errors to stderr but continue processing. Makes code robust and avoid one bad line to stop code processding
-                    self.stderr.write(f'Error processing row: {e}')
-        
+        updated = 0
+        unchanged = 0
+        errors = 0
+        throughput = Throughput()
+        # incremental loads: the values from before the load of every app written,
+        # None for the created ones, for the receivers of apps_bulk_loaded
+        previous = {}
+
+        # Rows are parsed in this process, or in a pool of --workers processes,
+        # and come back in file order so the first row for a name still wins.
+        batches = iter_parsed_batches(path, parse_app_row, batch_size, options['workers'])
+        for batch in batches:
+            new_apps = []
+            changed_apps = []
+            for fields, error in batch:
+                if error:
+                    # print errors to stderr but continue processing. one bad line does not stop the load
+                    self.stderr.write(f'Error processing row: {error}')
+                    errors += 1
+                    continue
+
+                name = fields['name']
+                if name in seen:
+                    continue
+                seen.add(name)
+
+                if name in existing:
+                    app_id, fingerprint = existing[name]
+                    if incremental and fingerprint == fields['fingerprint']:
+                        unchanged += 1
+                    elif options['update'] or incremental:
+                        # bulk_update skips save(): move the row version on here
+                        changed_apps.append(App(
+                            id=app_id, version=F('version') + 1, updated_at=timezone.now(), **fields
+                        ))
+                    continue
+                new_apps.append(App(**fields))
+
+            # one transaction per batch keeps the number of commits small.
+            # Batches with nothing to write (unchanged rows) cost no query at all.
+            if new_apps or changed_apps:
+                with transaction.atomic():
+                    if incremental and changed_apps:
+                        previous.update(self.snapshots([app.id for app in changed_apps]))
+                    App.objects.bulk_create(new_apps, batch_size=batch_size)
+                    link_genres({app.id: app.genres for app in new_apps})
+                    if changed_apps:
+                        App.objects.bulk_update(changed_apps, UPDATE_FIELDS, batch_size=batch_size)
+                        link_genres({app.id: app.genres for app in changed_apps}, replace=True)
+
+            if incremental:
+                previous.update((app.id, None) for app in new_apps)
+            count += len(new_apps)
+            updated += len(changed_apps)
+            throughput.add(len(batch))
+
+        deleted = 0
+        if options['prune']:
+            if errors:
+                # the apps of the rows that failed to parse would be deleted too
+                self.stderr.write(f'Not pruning: {errors} rows could not be parsed')
+            else:
+                gone = [app_id for name, (app_id, _) in existing.items() if name not in seen]
+                previous.update(self.snapshots(gone))
+                deleted = self.prune(gone)
+
+        # bulk writes skip the model signals: refresh the derived tables in one pass,
+        # for the apps written by an incremental load, or all of them
+        if incremental and previous:
+            apps_bulk_loaded.send(sender=self.__class__, previous=previous)
+        elif not incremental and (count or updated):
+            apps_bulk_loaded.send(sender=self.__class__)
+        if deleted:
+            # the apps' reviews went with them: no summary is left to recompute
+            reviews_bulk_loaded.send(sender=self.__class__, app_ids=())
+
         # success message with the number of apps loaded
         self.stdout.write(self.style.SUCCESS(f'Loaded {count} apps'))
+        if options['update'] or incremental:
+            self.stdout.write(f'Updated {updated} existing apps')
+        if incremental:
+            self.stdout.write(f'Skipped {unchanged} unchanged apps')
+        if options['prune']:
+            self.stdout.write(f'Deleted {deleted} apps missing from the file')
+        self.stdout.write(f'Processed {throughput.summary()}')
 
-    
+    def snapshots(self, ids):
+        """{app id: signals.snapshot() of the stored app} for the given ids."""
+        result = {}
+        for start in range(0, len(ids), SNAPSHOT_BATCH_SIZE):
+            rows = App.objects.filter(id__in=ids[start:start + SNAPSHOT_BATCH_SIZE]).values('id', *SNAPSHOT_FIELDS)
+            result.update((row.pop('id'), row) for row in rows)
+        return result
 
+    def prune(self, ids):
+        """Delete the apps with the given ids (and their reviews) in batches. Returns how many were deleted."""
+        for start in range(0, len(ids), PRUNE_BATCH_SIZE):
+            with transaction.atomic(), bulk_writes():
+                App.objects.filter(id__in=ids[start:start + PRUNE_BATCH_SIZE]).delete()
+        return len(ids)
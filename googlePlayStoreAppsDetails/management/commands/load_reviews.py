@@ -1,16 +1,41 @@
 
 # Django management command to bulk-load Google Play Store user reviews from CSV.
 # Matches reviews to existing App records and creates Review entries.
+# App foreign keys are resolved from in-memory name indexes and reviews are
+# inserted in batches with bulk_create, one transaction per batch.
+# A review is identified by its app and the hash of its text (unique index on
+# Review.app, Review.content_hash): each batch probes that index once for the
+# reviews already stored, and inserts with ignore_conflicts so a review written
+# meanwhile by another load running in parallel is skipped, not duplicated.
+# With --workers N the CSV is split into chunks parsed by N processes.
+# With --incremental a review already stored (same app and text) is only
+# rewritten when its row's fingerprint changed, in bulk, and --prune deletes
+# the reviews that are no longer in the file (see load_playstore).
 
-import csv
-from django.core.management.base import BaseCommand
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from googlePlayStoreAppsDetails.models import App, Review
+from googlePlayStoreAppsDetails.signals import bulk_writes, reviews_bulk_loaded
+from googlePlayStoreAppsDetails.ingest import DEFAULT_BATCH_SIZE, Throughput, iter_parsed_batches, parse_review_row
 from pathlib import Path
 
 
+# number of unmatched app names listed in the summary at normal verbosity
+UNMATCHED_SHOWN = 10
+
+# fields rewritten on the stored reviews whose row changed (--incremental)
+UPDATE_FIELDS = ['app_name', 'translated_review', 'sentiment', 'sentiment_key', 'sentiment_polarity', 'fingerprint']
+
+# reviews deleted per transaction by --prune
+PRUNE_BATCH_SIZE = 1000
+
+
 class Command(BaseCommand):
     """Django management command for loading Play Store user reviews."""
-    
+
     help = 'Load googleplaystore_user_reviews.csv into Review model'
 
     def add_arguments(self, parser):
@@ -21,80 +46,203 @@ class Command(BaseCommand):
             help='Path to csv file',
             default=str(Path.cwd() / 'googleplaystore_user_reviews.csv')
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of CSV rows written per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse the CSV file'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Rewrite the stored reviews whose CSV row changed since it was loaded'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='With --incremental, delete the reviews that are not in the file any more'
+        )
+
+    def build_app_index(self):
+        """Return (exact, casefolded) dictionaries mapping app names to App ids.
+
+        Apps are read in id order and the first id wins, matching the
+        filter(...).first() lookups this command used to run per row.
+        """
+        exact = {}
+        folded = {}
+        for app_id, name in App.objects.order_by('id').values_list('id', 'name').iterator():
+            exact.setdefault(name, app_id)
+            folded.setdefault(name.casefold(), app_id)
+        return exact, folded
 
     def handle(self, *args, **options):
         """Main command execution logic."""
         # Retrieve the CSV file path from command-line arguments
         path = options['path']
+        batch_size = max(1, options['batch_size'])
         self.stdout.write(f'Loading reviews from {path}')
-        
-        # Counter to track how many new reviews were created
+
+        if options['prune'] and not options['incremental']:
+            raise CommandError('--prune only works with --incremental')
+        incremental = options['incremental']
+
+        exact, folded = self.build_app_index()
+        # (app id, content hash) keys handled in this run: the first row for a review wins
+        seen = set()
+        # app names that could not be matched, with the number of reviews skipped for each
+        unmatched = Counter()
+
+        # Counters to track how many reviews were created / rewritten / left as they were
         count = 0
-        
-        # Open the CSV file 
-        with open(path, newline='', encoding='utf-8') as csvfile:
-            # DictReader maps each row to a dictionary using CSV header names
-            reader = csv.DictReader(csvfile)
-            
-            # Iterate through each row in the CSV file
-            for row in reader:
-                try:
-                    
-                    # Try multiple possible column names for flexibility
-                    app_name = row.get('App') or row.get('app_name')
-                    
-                    # Skip this row if no app name is provided
-                    if not app_name:
-                        continue
-
-                    
-                    #  attempt exact name match (case-sensitive)
-                    app = App.objects.filter(name=app_name).first()
-                    
-                    # other attempt: case-insensitive match if exact match fails
-                    if not app:
-                        app = App.objects.filter(name__iexact=app_name).first()
-
-                    # If still no app found, log the issue and skip this review
-                    if not app:
-                        # This is not a fatal error; simply log and continue processing
-                        self.stderr.write(f'App not found: {app_name}')
-                        continue
-                    # Parse and validate the sentiment polarity score
-                    sentiment_polarity = None
-                    try:
-                        # Try multiple possible column names for sentiment polarity
-                        polarity_str = (
-                            row.get('Sentiment_Polarity') or
-                            row.get('sentiment_polarity') or
-                            row.get('Polarity')
-                        )
-                        # Convert string to float if the value exists
-                        if polarity_str:
-                            sentiment_polarity = float(polarity_str)
-                    except Exception:
-                        # If conversion fails, leave polarity as None 
-                        sentiment_polarity = None
-
-                    
-                    # Use get_or_create to avoid duplicates
-                    # variable created  indicates whether a new record was created
-                    review, created = Review.objects.get_or_create(
-                        # Lookup fields: foreign key to app and the review text
-                        app=app,
-                        translated_review=row.get('Translated_Review') or row.get('translated_review') or '',
-                        # Default values for new review records
-                        defaults={
-                            'app_name': app_name,                             
-                            'sentiment': row.get('Sentiment') or row.get('sentiment') or 'neutral',  
-                            'sentiment_polarity': sentiment_polarity,         # Polarity score ranges -1.0 to 1.0
-                        }
-                    )
-                    
-                    # Increment variable count  once a review was created
-                    if created:
-                        count += 1
-                except Exception as e:
-            
-                    self.stderr.write(f'Error processing row: {e}')
+        updated = 0
+        unchanged = 0
+        errors = 0
+        # apps whose reviews changed, for the review summaries of incremental loads
+        touched_apps = set()
+        throughput = Throughput()
+
+        # Rows are parsed in this process, or in a pool of --workers processes
+        for batch in iter_parsed_batches(path, parse_review_row, batch_size, options['workers']):
+            rows = []
+            for fields, error in batch:
+                if error:
+                    self.stderr.write(f'Error processing row: {error}')
+                    errors += 1
+                    continue
+                app_name = fields['app_name']
+
+                # Skip this row if no app name is provided
+                if not app_name:
+                    continue
+
+                # exact name match first, then a case-insensitive one
+                app_id = exact.get(app_name) or folded.get(app_name.casefold())
+                if app_id is None:
+                    # not fatal: reported once in the summary below
+                    unmatched[app_name] += 1
+                    continue
+
+                key = (app_id, fields['content_hash'])
+                if key in seen:
+                    continue
+                seen.add(key)
+                rows.append((app_id, fields))
+
+            new_reviews = []
+            changed_reviews = []
+            stored = self.stored_reviews(rows)
+            for app_id, fields in rows:
+                key = (app_id, fields['content_hash'])
+                if key not in stored:
+                    new_reviews.append(Review(app_id=app_id, **fields))
+                elif incremental:
+                    review_id, fingerprint = stored[key]
+                    if fingerprint == fields['fingerprint']:
+                        unchanged += 1
+                    else:
+                        changed_reviews.append(Review(id=review_id, app_id=app_id, **fields))
+
+            # new and changed reviews change their apps' representation: move the row versions on
+            touched = {review.app_id for review in changed_reviews}
+            inserted = 0
+            if new_reviews or changed_reviews:
+                with transaction.atomic():
+                    if new_reviews:
+                        # rows inserted meanwhile by a parallel load are skipped by ignore_conflicts:
+                        # only the rows this insert added are counted
+                        before = self.count_stored(new_reviews)
+                        Review.objects.bulk_create(new_reviews, batch_size=batch_size, ignore_conflicts=True)
+                        inserted = self.count_stored(new_reviews) - before
+                        if inserted:
+                            touched.update(review.app_id for review in new_reviews)
+                    if changed_reviews:
+                        Review.objects.bulk_update(changed_reviews, UPDATE_FIELDS, batch_size=batch_size)
+                    if touched:
+                        App.objects.filter(id__in=touched).update(version=F('version') + 1, updated_at=timezone.now())
+            count += inserted
+            updated += len(changed_reviews)
+            touched_apps.update(touched)
+            throughput.add(len(batch))
+
+        deleted = 0
+        if options['prune']:
+            if errors:
+                # the reviews of the rows that failed to parse would be deleted too
+                self.stderr.write(f'Not pruning: {errors} rows could not be parsed')
+            else:
+                gone = {
+                    review_id: app_id
+                    for review_id, app_id, content_hash in Review.objects.values_list('id', 'app_id', 'content_hash').iterator()
+                    if (app_id, content_hash) not in seen
+                }
+                deleted = self.prune(gone)
+                touched_apps.update(gone.values())
+
+        # bulk writes skip the model signals: refresh the derived data (review summaries of the apps) in one pass
+        if incremental and touched_apps:
+            reviews_bulk_loaded.send(sender=self.__class__, app_ids=touched_apps)
+        elif count:
+            reviews_bulk_loaded.send(sender=self.__class__)
+
+        self.report_unmatched(unmatched, options['verbosity'])
         self.stdout.write(self.style.SUCCESS(f'Loaded {count} reviews'))
+        if incremental:
+            self.stdout.write(f'Updated {updated} changed reviews, skipped {unchanged} unchanged reviews')
+        if options['prune']:
+            self.stdout.write(f'Deleted {deleted} reviews missing from the file')
+        self.stdout.write(f'Processed {throughput.summary()}')
+
+    def stored_reviews(self, rows):
+        """
+        Return {(app id, content hash): (review id, fingerprint)} for the reviews of
+        rows ((app id, fields) pairs) already in the database, in one index probe.
+        """
+        if not rows:
+            return {}
+        # the query can match other combinations of the apps and hashes: they are not looked up
+        matches = Review.objects.filter(
+            app_id__in={app_id for app_id, _ in rows},
+            content_hash__in={fields['content_hash'] for _, fields in rows},
+        ).values_list('app_id', 'content_hash', 'id', 'fingerprint')
+        return {(app_id, content_hash): (review_id, fingerprint) for app_id, content_hash, review_id, fingerprint in matches}
+
+    def count_stored(self, reviews):
+        """Number of stored reviews matching the apps and content hashes of reviews, in one query."""
+        return Review.objects.filter(
+            app_id__in={review.app_id for review in reviews},
+            content_hash__in={review.content_hash for review in reviews},
+        ).count()
+
+    def prune(self, reviews):
+        """
+        Delete the reviews in reviews ({review id: app id}) in batches, moving their
+        apps' row versions on. Returns how many were deleted.
+        """
+        ids = list(reviews)
+        for start in range(0, len(ids), PRUNE_BATCH_SIZE):
+            chunk = ids[start:start + PRUNE_BATCH_SIZE]
+            with transaction.atomic(), bulk_writes():
+                Review.objects.filter(id__in=chunk).delete()
+                apps = {reviews[review_id] for review_id in chunk}
+                App.objects.filter(id__in=apps).update(version=F('version') + 1, updated_at=timezone.now())
+        return len(ids)
+
+    def report_unmatched(self, unmatched, verbosity):
+        """Write one summary of the app names that had no matching App."""
+        if not unmatched:
+            return
+        self.stderr.write(
+            f'Skipped {sum(unmatched.values())} reviews for {len(unmatched)} unknown apps'
+        )
+        shown = unmatched.most_common(None if verbosity > 1 else UNMATCHED_SHOWN)
+        for name, skipped in shown:
+            self.stderr.write(f'  App not found: {name} ({skipped} reviews)')
+        if len(shown) < len(unmatched):
+            self.stderr.write(f'  ... and {len(unmatched) - len(shown)} more (use -v 2 to list all)')
@@ -0,0 +1,20 @@
+
+# Django management command to recompute the CategoryStat / GenreStat tables
+# from the App table. Useful after editing apps directly in the database.
+
+from django.core.management.base import BaseCommand
+from googlePlayStoreAppsDetails.models import CategoryStat, GenreStat
+from googlePlayStoreAppsDetails import stats
+
+
+class Command(BaseCommand):
+    """Django management command for rebuilding the pre-aggregated statistics."""
+
+    help = 'Rebuild the category and genre statistics tables from scratch'
+
+    def handle(self, *args, **options):
+        """Main command execution logic."""
+        stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {CategoryStat.objects.count()} categories and {GenreStat.objects.count()} genres'
+        ))
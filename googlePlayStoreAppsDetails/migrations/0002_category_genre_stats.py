@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+def fill_stats(apps, schema_editor):
+    # populate the new tables from the apps already in the database
+    from googlePlayStoreAppsDetails import stats
+    stats.rebuild(registry=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=500, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('rating_sum', models.FloatField(default=0)),
+                ('rated_count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenreStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=500, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('rating_sum', models.FloatField(default=0)),
+                ('rated_count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+def link_existing_apps(apps, schema_editor):
+    # mirror the genres strings of the apps already stored into the join table
+    from googlePlayStoreAppsDetails.genres import link_genres
+    App = apps.get_model('googlePlayStoreAppsDetails', 'App')
+    rows = App.objects.exclude(genres__isnull=True).exclude(genres='').values_list('id', 'genres')
+    link_genres(dict(rows.iterator()), registry=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0002_category_genre_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='genre_set',
+            field=models.ManyToManyField(blank=True, related_name='apps', to='googlePlayStoreAppsDetails.genre'),
+        ),
+        migrations.RunPython(link_existing_apps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+TYPED_FIELDS = ['installs_min', 'price_cents', 'size_bytes', 'last_updated_date']
+
+
+def backfill_typed_columns(apps, schema_editor):
+    # parse the string columns of the apps already stored, in batches
+    from googlePlayStoreAppsDetails.ingest import iter_batches, typed_app_fields
+    App = apps.get_model('googlePlayStoreAppsDetails', 'App')
+    rows = App.objects.only('id', 'installs', 'price', 'size', 'last_updated').iterator(chunk_size=2000)
+    for batch in iter_batches(rows, 2000):
+        for app in batch:
+            for field, value in typed_app_fields(app.installs, app.price, app.size, app.last_updated).items():
+                setattr(app, field, value)
+        App.objects.bulk_update(batch, TYPED_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0003_genre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='app',
+            name='installs_min',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='last_updated_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='price_cents',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='size_bytes',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_typed_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 virtual table for SearchByNameAPIView. Skipped on databases without FTS5,
+    # where search falls back to a substring match.
+    from googlePlayStoreAppsDetails import search
+    search.create_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    from googlePlayStoreAppsDetails import search
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0004_typed_app_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0005_app_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='app',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0006_app_row_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='app',
+            name='avg_polarity',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='negative_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='neutral_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='polarity_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='polarity_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='positive_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='app',
+            name='review_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:57
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Lower, NullIf, Trim
+
+
+def fill_sentiment_key(apps, schema_editor):
+    # same normalisation as ingest.normalize_sentiment, in one UPDATE
+    Review = apps.get_model('googlePlayStoreAppsDetails', 'Review')
+    Review.objects.update(sentiment_key=NullIf(Lower(Trim('sentiment')), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0007_app_review_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='sentiment_key',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.RunPython(fill_sentiment_key, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='app',
+            name='name',
+            field=models.CharField(db_index=True, max_length=1000),
+        ),
+        migrations.AlterField(
+            model_name='app',
+            name='rating',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='app',
+            index=models.Index(fields=['category', 'rating'], name='app_category_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['sentiment_key', '-sentiment_polarity'], name='review_sentiment_polarity_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_leaderboards(apps, schema_editor):
+    # rank the apps already in the database
+    from googlePlayStoreAppsDetails import leaderboards
+    leaderboards.rebuild(registry=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=600)),
+                ('score', models.FloatField()),
+                ('votes', models.BigIntegerField(default=0)),
+                ('prior_mean', models.FloatField(default=0)),
+                ('app', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='googlePlayStoreAppsDetails.app')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', '-score', '-votes', 'app'], name='leaderboard_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('board', 'app'), name='leaderboard_board_app_unique'),
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+# rows fingerprinted per bulk_update
+BATCH_SIZE = 2000
+
+
+def fill_fingerprints(apps, schema_editor):
+    # rows loaded unchanged from the CSV files get the fingerprint the loaders
+    # would compute, so the first incremental load after the upgrade skips them
+    from googlePlayStoreAppsDetails.ingest import APP_FINGERPRINT_FIELDS, REVIEW_FINGERPRINT_FIELDS, row_fingerprint
+    for model_name, names in (('App', APP_FINGERPRINT_FIELDS), ('Review', REVIEW_FINGERPRINT_FIELDS)):
+        model = apps.get_model('googlePlayStoreAppsDetails', model_name)
+        batch = []
+        for row in model.objects.order_by('id').values('id', *names).iterator(chunk_size=BATCH_SIZE):
+            batch.append(model(id=row['id'], fingerprint=row_fingerprint(row, names)))
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ['fingerprint'])
+                batch = []
+        model.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0009_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='app',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+# rows hashed per bulk_update, duplicates deleted per DELETE
+BATCH_SIZE = 2000
+
+
+def fill_content_hashes(apps, schema_editor):
+    # hash the stored reviews. Reviews repeating the text of an earlier review of
+    # the same app (the loaders kept the first one) are deleted before the unique
+    # constraint is added, and their apps' review summaries recomputed.
+    from googlePlayStoreAppsDetails import stats
+    from googlePlayStoreAppsDetails.ingest import review_key
+    Review = apps.get_model('googlePlayStoreAppsDetails', 'Review')
+    seen = set()
+    duplicates = {}
+    batch = []
+    rows = Review.objects.order_by('id').values_list('id', 'app_id', 'translated_review')
+    for review_id, app_id, text in rows.iterator(chunk_size=BATCH_SIZE):
+        key = review_key(app_id, text)
+        if key in seen:
+            duplicates[review_id] = app_id
+            continue
+        seen.add(key)
+        batch.append(Review(id=review_id, content_hash=key[1]))
+        if len(batch) >= BATCH_SIZE:
+            Review.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    Review.objects.bulk_update(batch, ['content_hash'])
+
+    ids = list(duplicates)
+    for start in range(0, len(ids), BATCH_SIZE):
+        Review.objects.filter(id__in=ids[start:start + BATCH_SIZE]).delete()
+    if duplicates:
+        stats.rebuild_review_summary(set(duplicates.values()), registry=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0010_row_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('app', 'content_hash'), name='review_app_content_hash_unique'),
+        ),
+    ]
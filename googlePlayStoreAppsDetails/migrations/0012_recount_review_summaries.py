@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:05
+
+from django.db import migrations
+
+
+def recount_review_summaries(apps, schema_editor):
+    # count the sentiments from the normalised sentiment_key, like the per-review
+    # updates do: labels such as ' Positive' were left out by earlier rebuilds
+    from googlePlayStoreAppsDetails import stats
+    stats.rebuild_review_summary(registry=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('googlePlayStoreAppsDetails', '0011_review_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_review_summaries, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,34 @@
 from django.db import models
+from .ingest import normalize_sentiment, review_content_hash, typed_app_fields
 
 
 # Models for the Google Play sample data.
+
+# App columns derived from the raw strings by App.populate_typed_fields()
+TYPED_FIELDS = ('installs_min', 'price_cents', 'size_bytes', 'last_updated_date')
+
+# App columns summarising its reviews, written only by the F() increments of
+# signals.py and by stats.rebuild_review_summary(), never by App.save()
+REVIEW_SUMMARY_FIELDS = (
+	'review_count', 'positive_count', 'neutral_count', 'negative_count',
+	'polarity_sum', 'polarity_count', 'avg_polarity',
+)
+
+# A single genre such as 'Arcade'. Apps are linked to every genre listed in
+# their semicolon-separated genres string through App.genre_set.
+class Genre(models.Model):
+	name = models.CharField(max_length=500, unique=True)
+
+	def __str__(self):
+		return self.name
+
+
 class App(models.Model):
 	# The display name of the app as provided in the dataset.
-	name = models.CharField(max_length=1000)
+	name = models.CharField(max_length=1000, db_index=True) # looked up by the loaders and the bulk upsert
 	# Category as reported on the Play Store (e.g., GAME, TOOLS, ART_AND_DESIGN).
 	category = models.CharField(max_length=500, blank=True, null=True)
-	rating = models.FloatField(blank=True, null=True) # Average rating (float). Many CSV rows have missing or NaN ratings.
+	rating = models.FloatField(blank=True, null=True, db_index=True) # Average rating (float). Many CSV rows have missing or NaN ratings.
 	reviews = models.BigIntegerField(blank=True, null=True)
 	size = models.CharField(max_length=200, blank=True, null=True)
 	installs = models.CharField(max_length=200, blank=True, null=True)
@@ -18,6 +39,67 @@ class App(models.Model):
 	last_updated = models.CharField(max_length=200, blank=True, null=True)
 	current_version = models.CharField(max_length=200, blank=True, null=True)
 	android_version = models.CharField(max_length=200, blank=True, null=True)
+	# normalised copy of genres, kept in step by the loaders and signals.py
+	genre_set = models.ManyToManyField(Genre, related_name='apps', blank=True)
+
+	# Typed, indexed companions of the string columns above so sorting, range
+	# filters and aggregates run in SQL. Filled by save() and by the loaders.
+	installs_min = models.BigIntegerField(blank=True, null=True, db_index=True) # '10,000+' -> 10000
+	price_cents = models.IntegerField(blank=True, null=True, db_index=True) # '$4.99' -> 499
+	size_bytes = models.BigIntegerField(blank=True, null=True, db_index=True) # '19M' -> 19922944, None when it varies
+	last_updated_date = models.DateField(blank=True, null=True, db_index=True) # '7-Jan-18' -> 2018-01-07
+
+	# Row version: bumped on every write of the app or of one of its reviews.
+	# Used for ETags and optimistic concurrency (If-Match) by the API.
+	version = models.PositiveIntegerField(default=1)
+	updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+	# Summary of the app's Review rows, kept in step with F() increments by
+	# signals.py and recomputed in bulk after loads (stats.rebuild_review_summary).
+	review_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+	positive_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+	neutral_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+	negative_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+	# sum and number of the non-null polarities, avg_polarity = polarity_sum / polarity_count
+	polarity_sum = models.FloatField(default=0, editable=False)
+	polarity_count = models.PositiveIntegerField(default=0, editable=False)
+	avg_polarity = models.FloatField(blank=True, null=True, db_index=True, editable=False)
+
+	# digest of the CSV row the app was last loaded from (ingest.row_fingerprint),
+	# compared by load_playstore --incremental to skip unchanged rows
+	fingerprint = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+	class Meta:
+		indexes = [
+			# apps of one category, best rated first
+			models.Index(fields=['category', 'rating'], name='app_category_rating_idx'),
+		]
+
+	def populate_typed_fields(self):
+		for field, value in typed_app_fields(self.installs, self.price, self.size, self.last_updated).items():
+			setattr(self, field, value)
+
+	# keep the typed columns in step whatever the write path (API, form, admin)
+	def save(self, *args, **kwargs):
+		self.populate_typed_fields()
+		bumped = not self._state.adding
+		if bumped:
+			# incremented in the UPDATE itself: concurrent saves and stale instances
+			# (the version is also moved on by review writes) never reuse a version
+			self.version = models.F('version') + 1
+		update_fields = kwargs.get('update_fields')
+		if update_fields is None and bumped:
+			# the review summary may have moved on since this instance was loaded:
+			# rewriting it would undo the increments of the review writes in between
+			update_fields = [
+				field.name for field in self._meta.concrete_fields
+				if not field.primary_key and field.name not in REVIEW_SUMMARY_FIELDS
+			]
+		if update_fields is not None:
+			kwargs['update_fields'] = (set(update_fields) - set(REVIEW_SUMMARY_FIELDS)) | set(TYPED_FIELDS) | {'version', 'updated_at'}
+		super().save(*args, **kwargs)
+		if bumped:
+			self.refresh_from_db(fields=['version'])
 
 	def __str__(self):
 
@@ -32,6 +114,29 @@ class Review(models.Model):
 	# Simple sentiment label and a numeric polarity score when available.
 	sentiment = models.CharField(max_length=200, blank=True, null=True)
 	sentiment_polarity = models.FloatField(blank=True, null=True)
+	# lower-case copy of sentiment ('positive', ...) so sentiment filters can use an index
+	# instead of a case-insensitive scan. Filled by save() and by the loaders.
+	sentiment_key = models.CharField(max_length=200, blank=True, null=True, editable=False)
+	# digest of translated_review (ingest.review_content_hash): an app has at most one
+	# review per text, enforced by the unique (app, content_hash) index below
+	content_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
+	# digest of the CSV row the review was last loaded from, see load_reviews --incremental
+	fingerprint = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+	class Meta:
+		indexes = [
+			# reviews of one sentiment, most polar first (/api/reviews/by_sentiment/)
+			models.Index(fields=['sentiment_key', '-sentiment_polarity'], name='review_sentiment_polarity_idx'),
+		]
+		constraints = [
+			models.UniqueConstraint(fields=['app', 'content_hash'], name='review_app_content_hash_unique'),
+		]
+
+	def populate_sentiment_key(self):
+		self.sentiment_key = normalize_sentiment(self.sentiment)
+
+	def populate_content_hash(self):
+		self.content_hash = review_content_hash(self.translated_review)
 
 	# custom save method overriden to ensure that if there is a misssing application name 
 	# when writing the review and that the review is linked to an existing application
@@ -39,10 +144,66 @@ class Review(models.Model):
 	def save(self, *args, **kwargs):
 		if not self.app_name and self.app:
 			self.app_name = self.app.name
+		self.populate_sentiment_key()
+		self.populate_content_hash()
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None:
+			kwargs['update_fields'] = set(update_fields) | {'sentiment_key', 'content_hash'}
 		super().save(*args, **kwargs)
 
 	#to_string method
 	def __str__(self):
 		return f"Review for {self.app_name} ({self.sentiment})"
-	
 
+
+# Pre-aggregated statistics. These tables are filled by the load commands and
+# kept up to date by the App signal handlers in signals.py, so the stats
+# endpoints read a handful of rows instead of scanning every App.
+class CategoryStat(models.Model):
+	category = models.CharField(max_length=500, unique=True) # apps without a category are counted under 'Unknown'
+	count = models.BigIntegerField(default=0) # number of apps in the category
+	rating_sum = models.FloatField(default=0) # sum of the ratings of the rated apps
+	rated_count = models.BigIntegerField(default=0) # number of apps with a rating
+
+	@property
+	def avg_rating(self):
+		return self.rating_sum / self.rated_count if self.rated_count > 0 else None
+
+	def __str__(self):
+		return f"{self.category} ({self.count} apps)"
+
+
+class GenreStat(models.Model):
+	genre = models.CharField(max_length=500, unique=True) # single genre, split from App.genres
+	count = models.BigIntegerField(default=0)
+	rating_sum = models.FloatField(default=0)
+	rated_count = models.BigIntegerField(default=0)
+
+	@property
+	def avg_rating(self):
+		return self.rating_sum / self.rated_count if self.rated_count > 0 else None
+
+	def __str__(self):
+		return f"{self.genre} ({self.count} apps)"
+
+
+# Precomputed leaderboards: one row per rated app and board ('all',
+# 'category:GAME', 'genre:Arcade') with the app's weighted rating, so a top-K
+# request reads the first K entries of one index range (see leaderboards.py).
+class LeaderboardEntry(models.Model):
+	board = models.CharField(max_length=600)
+	app = models.ForeignKey(App, related_name='leaderboard_entries', on_delete=models.CASCADE)
+	score = models.FloatField() # Bayesian weighted rating
+	votes = models.BigIntegerField(default=0) # the app's number of ratings, first tie-breaker
+	prior_mean = models.FloatField(default=0) # mean rating the score was computed with, the same on every row
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['board', '-score', '-votes', 'app'], name='leaderboard_rank_idx'),
+		]
+		constraints = [
+			models.UniqueConstraint(fields=['board', 'app'], name='leaderboard_board_app_unique'),
+		]
+
+	def __str__(self):
+		return f"{self.board}: {self.app_id} ({self.score:.3f})"
@@ -0,0 +1,153 @@
+# Keyset (cursor) pagination for the listing endpoints.
+#
+# Each page is fetched with a WHERE clause on the sort key of the last row of
+# the previous page instead of an OFFSET, and no COUNT(*) is run unless the
+# client asks for it with ?count=true, so walking the whole catalogue costs
+# O(n) in total. Offset pagination stays available as an opt-in: requests that
+# pass ?offset= are paginated with DRF's LimitOffsetPagination.
+
+import base64
+import binascii
+import json
+from datetime import date
+from django.core.exceptions import ValidationError as FieldValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates on (field, id), e.g. (rating, id), in the order returned by the
+    view's get_keyset() ('-rating', 'id', ...). Rows with a NULL field come
+    last whichever the direction.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 1000
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    offset_query_param = LimitOffsetPagination.offset_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.offset_paginator = None
+        if self.offset_query_param in request.query_params:
+            self.offset_paginator = LimitOffsetPagination()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        keyset = view.get_keyset() if hasattr(view, 'get_keyset') else 'id'
+        self.descending = keyset.startswith('-')
+        self.field = keyset.lstrip('-')
+        self.keyset = keyset
+        self.limit = self.get_limit(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.get_order_by())
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.after(*cursor))
+
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_page_metadata(self):
+        """Everything get_paginated_response() sends besides the results."""
+        if self.offset_paginator is not None:
+            paginator = self.offset_paginator
+            return {'count': paginator.count, 'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
+        return {'count': self.count, 'next': self.get_next_link()}
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def get_order_by(self):
+        if self.field == 'id':
+            return [F('id').desc() if self.descending else F('id').asc()]
+        if self.descending:
+            return [F(self.field).desc(nulls_last=True), F('id').desc()]
+        return [F(self.field).asc(nulls_last=True), F('id').asc()]
+
+    def after(self, value, last_id):
+        """Filter selecting the rows that sort after (value, last_id)."""
+        beyond = 'lt' if self.descending else 'gt'
+        after_id = Q(**{f'id__{beyond}': last_id})
+        if self.field == 'id':
+            return after_id
+        if value is None:
+            # already in the NULL tail: only the remaining NULL rows are left
+            return Q(**{f'{self.field}__isnull': True}) & after_id
+        return (
+            Q(**{f'{self.field}__{beyond}': value})
+            | (Q(**{self.field: value}) & after_id)
+            | Q(**{f'{self.field}__isnull': True})
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        value = getattr(last, self.field)
+        if isinstance(value, date):
+            value = value.isoformat()
+        cursor = self.encode_cursor({'k': self.keyset, 'v': value, 'id': last.id})
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def clean_position(self, field, value):
+        # to_python() parses the value, the validators check it fits the column (e.g. integer ranges)
+        value = field.to_python(value)
+        field.run_validators(value)
+        return value
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        """
+        The (value, id) position of a ?cursor=, both converted by their model
+        field so a crafted cursor is refused with a 400 rather than reaching SQL.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if position['k'] != self.keyset:
+                raise ValueError('cursor was issued for another ordering')
+            value, last_id = position['v'], int(position['id'])
+            if value is not None:
+                value = self.clean_position(model._meta.get_field(self.field), value)
+            return value, self.clean_position(model._meta.pk, last_id)
+        except (binascii.Error, ValueError, KeyError, TypeError, UnicodeEncodeError, FieldValidationError):
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
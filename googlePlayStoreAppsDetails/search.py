@@ -0,0 +1,127 @@
+# Full-text search over app names, genres and categories.
+#
+# On SQLite builds with FTS5 an index table (created by migration 0005) holds
+# one row per app, keyed by the app id, and is kept in sync by signals.py and
+# the load commands. Queries use prefix matching and are ranked with bm25,
+# name matches weighing the most. On other databases, or when FTS5 is missing,
+# search falls back to the original case-insensitive substring match on names.
+
+import re
+from django.db import DatabaseError, connection
+from .models import App
+
+FTS_TABLE = 'googlePlayStoreAppsDetails_appsearch'
+
+# bm25 weights of the indexed columns (name, genres, category)
+COLUMN_WEIGHTS = (10.0, 2.0, 1.0)
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# databases (by NAME) already known to hold the FTS table, to skip the introspection query
+_indexed_databases = set()
+
+
+def create_index(schema_editor):
+    """Create and fill the FTS5 table. Returns False when the database cannot host it."""
+    conn = schema_editor.connection
+    if conn.vendor != 'sqlite':
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" '
+                "USING fts5(name, genres, category, tokenize='unicode61 remove_diacritics 2')"
+            )
+    except DatabaseError:
+        # SQLite compiled without FTS5
+        return False
+    rebuild(conn)
+    return True
+
+
+def drop_index(schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS "{FTS_TABLE}"')
+        _indexed_databases.discard(conn.settings_dict['NAME'])
+
+
+def is_available(conn=connection):
+    """True when the FTS5 table exists in the database."""
+    if conn.vendor != 'sqlite':
+        return False
+    name = conn.settings_dict['NAME']
+    if name not in _indexed_databases and FTS_TABLE in conn.introspection.table_names():
+        _indexed_databases.add(name)
+    return name in _indexed_databases
+
+
+def rebuild(conn=connection):
+    """Re-index every app with one INSERT ... SELECT (used after bulk loads)."""
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+        cursor.execute(
+            f'INSERT INTO "{FTS_TABLE}" (rowid, name, genres, category) '
+            f'SELECT id, name, COALESCE(genres, \'\'), COALESCE(category, \'\') FROM "{App._meta.db_table}"'
+        )
+
+
+def index_app(app):
+    """Add or refresh one app in the index."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [app.pk])
+        cursor.execute(
+            f'INSERT INTO "{FTS_TABLE}" (rowid, name, genres, category) VALUES (%s, %s, %s, %s)',
+            [app.pk, app.name, app.genres or '', app.category or ''],
+        )
+
+
+def remove_app(app_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [app_id])
+
+
+def reindex_apps(app_ids):
+    """Refresh the index rows of the given apps after a bulk write, dropping the deleted ones."""
+    if not app_ids or not is_available():
+        return
+    app_ids = list(app_ids)
+    placeholders = ', '.join(['%s'] * len(app_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid IN ({placeholders})', app_ids)
+        cursor.execute(
+            f'INSERT INTO "{FTS_TABLE}" (rowid, name, genres, category) '
+            f'SELECT id, name, COALESCE(genres, \'\'), COALESCE(category, \'\') FROM "{App._meta.db_table}" '
+            f'WHERE id IN ({placeholders})',
+            app_ids,
+        )
+
+
+def match_expression(query):
+    """'photo edi' -> '"photo"* "edi"*': every word must match, as a prefix."""
+    words = WORD_RE.findall(query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_app_ids(query, limit, offset=0):
+    """Return the ids of the apps matching query, best match first."""
+    if is_available():
+        expression = match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s '
+                f'ORDER BY bm25("{FTS_TABLE}", {weights}), rowid LIMIT %s OFFSET %s',
+                [expression, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    # no FTS: case-insensitive substring search on the app name
+    matches = App.objects.filter(name__icontains=query).order_by('name', 'id')
+    return list(matches.values_list('id', flat=True)[offset:offset + limit])
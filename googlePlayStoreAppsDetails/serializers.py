@@ -1,21 +1,56 @@
 from rest_framework import serializers
-from .models import App, Review
+from .models import App, Genre, Review
 
 # Serializers convert model instances to JSON and validate incoming payloads.
 # We expose a nested review list on the App serializer for convenience so
 # consumers can fetch an app with its recent reviews in one request.
 
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that looks instances up in context['preloaded'] ({pk: instance})
+    when it is given, so validating many objects does not run one query per object.
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded')
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return preloaded[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     """Serializer for review objects. Used for listing and creating reviews."""
+    app = PreloadedPrimaryKeyRelatedField(queryset=App.objects.all())
 
     class Meta:
         model = Review
         fields = ['id', 'app', 'app_name', 'translated_review', 'sentiment', 'sentiment_polarity']
+        # defaults to the name of the app when left out (see Review.save and bulk.write_reviews)
+        extra_kwargs = {'app_name': {'required': False, 'allow_blank': True}}
+
+
+class DynamicFieldsMixin:
+    """Serialize only the field names passed as fields=[...] (sparse fieldsets)."""
 
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-class AppSerializer(serializers.ModelSerializer):
-    # load  associated reviews.
+
+class AppSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # load  associated reviews. List views only include them on request (?include=reviews)
+    # and prefetch a bounded number per app, see api.py.
     reviews = ReviewSerializer(source='reviews_set', many=True, read_only=True)
 
     class Meta:
@@ -24,5 +59,24 @@ class AppSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'category', 'rating', 'reviews', 'size', 'installs',
             'type', 'price', 'content_rating', 'genres', 'last_updated',
-            'current_version', 'android_version', 'reviews'
-        ]
\ No newline at end of file
+            'current_version', 'android_version', 'reviews',
+            'installs_min', 'price_cents', 'size_bytes', 'last_updated_date',
+            'version', 'updated_at',
+            'review_count', 'positive_count', 'neutral_count', 'negative_count', 'avg_polarity',
+        ]
+        # typed columns are parsed from the string columns when the app is saved,
+        # version and updated_at move on with every write, the review summary with every review write
+        read_only_fields = [
+            'installs_min', 'price_cents', 'size_bytes', 'last_updated_date', 'version', 'updated_at',
+            'review_count', 'positive_count', 'neutral_count', 'negative_count', 'avg_polarity',
+        ]
+
+
+class GenreSerializer(serializers.ModelSerializer):
+    """Serializer for genres annotated with app_count and avg_rating."""
+    app_count = serializers.IntegerField(read_only=True)
+    avg_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Genre
+        fields = ['id', 'name', 'app_count', 'avg_rating']
@@ -0,0 +1,183 @@
+# Signal handlers that keep denormalised data in step with App and Review writes.
+# Connected in GoogleplaystoreappsdetailsConfig.ready().
+#
+# bulk_create / bulk_update / queryset.update() do not send model signals, so
+# code that writes apps or reviews in bulk (the load commands, the bulk API)
+# sends apps_bulk_loaded / reviews_bulk_loaded once it is done. Writers that
+# name the apps they wrote get those apps' derived rows refreshed; the others
+# (full loads) get everything recomputed in one pass. Bulk deletes, which do
+# send a signal per row, run inside bulk_writes() to mute the per-row receivers.
+
+import threading
+from contextlib import contextmanager
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .models import App, Review
+from . import leaderboards, search, stats, versioning
+from .genres import link_genres
+
+# sent by bulk writers after apps were created, updated or deleted without model signals,
+# optionally with previous= mapping the ids of the only apps written to their snapshot()
+# from before the write (None for created apps)
+apps_bulk_loaded = Signal()
+# same for reviews, optionally with app_ids= naming the only apps whose reviews changed
+reviews_bulk_loaded = Signal()
+
+SNAPSHOT_FIELDS = ('name', 'category', 'rating', 'genres', 'reviews')
+
+# apps refreshed per query by refresh_apps()
+REFRESH_BATCH_SIZE = 500
+
+_local = threading.local()
+
+
+@contextmanager
+def bulk_writes():
+    """Mute the per-row receivers in this thread. The caller sends the bulk signals afterwards."""
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+
+def muted():
+    return getattr(_local, 'depth', 0) > 0
+
+
+def snapshot(app):
+    return {field: getattr(app, field) for field in SNAPSHOT_FIELDS}
+
+
+@receiver(pre_save, sender=App)
+def remember_previous_app(sender, instance, raw=False, **kwargs):
+    # keep the stored values so post_save can remove the old contribution
+    instance._previous_snapshot = None
+    if raw or muted() or instance.pk is None:
+        return
+    instance._previous_snapshot = App.objects.filter(pk=instance.pk).values(*SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=App)
+def sync_derived_on_save(sender, instance, raw=False, **kwargs):
+    if raw or muted():
+        return
+    versioning.bump_generation_on_commit(versioning.APPS)
+    previous = getattr(instance, '_previous_snapshot', None)
+    current = snapshot(instance)
+    if previous == current:
+        return
+    search.index_app(instance)
+    if previous is not None:
+        stats.apply_app_delta(previous, -1)
+    stats.apply_app_delta(current, 1)
+    if previous is None or previous['genres'] != current['genres']:
+        link_genres({instance.pk: instance.genres}, replace=previous is not None)
+    leaderboards.update_app(instance)
+
+
+def deleting_apps():
+    """Ids of the apps whose delete is under way in this thread."""
+    if not hasattr(_local, 'deleting_apps'):
+        _local.deleting_apps = set()
+    return _local.deleting_apps
+
+
+@receiver(pre_delete, sender=App)
+def remember_deleting_app(sender, instance, **kwargs):
+    # the delete cascade removes the app's reviews first: their summary
+    # decrements would each update a row that is about to go
+    deleting_apps().add(instance.pk)
+
+
+@receiver(post_delete, sender=App)
+def sync_derived_on_delete(sender, instance, **kwargs):
+    deleting_apps().discard(instance.pk)
+    if muted():
+        return
+    versioning.bump_generation_on_commit(versioning.APPS)
+    versioning.bump_generation_on_commit(versioning.REVIEWS)
+    stats.apply_app_delta(snapshot(instance), -1)
+    search.remove_app(instance.pk)
+
+
+@receiver(apps_bulk_loaded)
+def rebuild_after_bulk_load(sender, previous=None, **kwargs):
+    versioning.bump_generation_on_commit(versioning.APPS)
+    if previous is not None:
+        refresh_apps(previous)
+        return
+    stats.rebuild()
+    leaderboards.rebuild()
+    if search.is_available():
+        search.rebuild()
+
+
+def refresh_apps(previous):
+    """
+    Update the derived rows of the apps written in bulk, previous mapping their
+    ids to their snapshot() from before the write (None for created apps). Apps
+    no longer stored were deleted. Costs a few queries per REFRESH_BATCH_SIZE
+    apps, whatever the size of the catalogue.
+    """
+    app_ids = list(previous)
+    for start in range(0, len(app_ids), REFRESH_BATCH_SIZE):
+        chunk = app_ids[start:start + REFRESH_BATCH_SIZE]
+        current = {row.pop('id'): row for row in App.objects.filter(id__in=chunk).values('id', *SNAPSHOT_FIELDS)}
+        # apps written with the values they already had change nothing
+        changed = [app_id for app_id in chunk if previous[app_id] != current.get(app_id)]
+        if not changed:
+            continue
+        deltas = [(previous[app_id], -1) for app_id in changed if previous[app_id] is not None]
+        deltas += [(current[app_id], 1) for app_id in changed if app_id in current]
+        stats.apply_app_deltas(deltas)
+        leaderboards.update_apps(changed, [{'id': app_id, **current[app_id]} for app_id in changed if app_id in current])
+        search.reindex_apps(changed)
+
+
+REVIEW_SNAPSHOT_FIELDS = ('app_id', 'sentiment', 'sentiment_polarity')
+
+
+def update_review_summary(app_id, review, sign):
+    # one UPDATE applies the summary delta and, as the nested reviews are part
+    # of the app's representation, moves its row version on
+    App.objects.filter(pk=app_id).update(
+        version=F('version') + 1, updated_at=timezone.now(),
+        **stats.review_delta(review['sentiment'], review['sentiment_polarity'], sign),
+    )
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_review(sender, instance, raw=False, **kwargs):
+    instance._previous_snapshot = None
+    if raw or muted() or instance.pk is None:
+        return
+    instance._previous_snapshot = Review.objects.filter(pk=instance.pk).values(*REVIEW_SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=Review)
+def sync_derived_on_review_save(sender, instance, raw=False, **kwargs):
+    if raw or muted():
+        return
+    versioning.bump_generation_on_commit(versioning.REVIEWS)
+    previous = getattr(instance, '_previous_snapshot', None)
+    if previous is not None:
+        update_review_summary(previous['app_id'], previous, -1)
+    update_review_summary(instance.app_id, {field: getattr(instance, field) for field in REVIEW_SNAPSHOT_FIELDS}, 1)
+
+
+@receiver(post_delete, sender=Review)
+def sync_derived_on_review_delete(sender, instance, **kwargs):
+    if muted() or instance.app_id in deleting_apps():
+        return
+    versioning.bump_generation_on_commit(versioning.REVIEWS)
+    update_review_summary(instance.app_id, {field: getattr(instance, field) for field in REVIEW_SNAPSHOT_FIELDS}, -1)
+
+
+@receiver(reviews_bulk_loaded)
+def refresh_after_review_bulk_load(sender, app_ids=None, **kwargs):
+    # app_ids narrows the review summaries to recompute, None meaning every app
+    versioning.bump_generation_on_commit(versioning.REVIEWS)
+    stats.rebuild_review_summary(app_ids)
@@ -0,0 +1,178 @@
+# Maintenance of the pre-aggregated CategoryStat / GenreStat tables, and of
+# the review summary columns of App (review_count, positive_count, ...).
+# Single App and Review writes apply a small delta (see signals.py); bulk
+# loads and the rebuild_stats command recompute them from scratch.
+
+import math
+from collections import defaultdict
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+from .ingest import normalize_sentiment
+
+APP_LABEL = 'googlePlayStoreAppsDetails'
+UNKNOWN_CATEGORY = 'Unknown'
+
+# sentiment label -> App column counting the reviews with that label
+SENTIMENT_COUNT_FIELDS = {
+    'positive': 'positive_count',
+    'neutral': 'neutral_count',
+    'negative': 'negative_count',
+}
+
+# ids per UPDATE when only some apps' review summaries are recomputed
+SUMMARY_BATCH_SIZE = 500
+
+
+def category_key(category):
+    """Name under which an app category is counted."""
+    return category or UNKNOWN_CATEGORY
+
+
+def split_genres(genres):
+    """Split a multigenre string such as 'Art & Design;Pretend Play' into single genres."""
+    if not genres:
+        return []
+    parts = [p.strip() for p in genres.replace(';', ',').split(',')]
+    # keep the order but count an app only once per genre
+    return list(dict.fromkeys(p for p in parts if p))
+
+
+def _apply(model, field, deltas):
+    """Add deltas ({key: [count, rating_sum, rated_count]}) to the rows of model, creating the missing ones."""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    stored = set(model.objects.filter(**{f'{field}__in': list(deltas)}).values_list(field, flat=True))
+    model.objects.bulk_create([model(**{field: key}) for key in deltas if key not in stored], ignore_conflicts=True)
+    for key, (count, rating_sum, rated_count) in deltas.items():
+        model.objects.filter(**{field: key}).update(
+            count=F('count') + count,
+            rating_sum=F('rating_sum') + rating_sum,
+            rated_count=F('rated_count') + rated_count,
+        )
+
+
+def apply_app_delta(snapshot, sign, registry=django_apps):
+    """Add (sign=1) or remove (sign=-1) one app's contribution to the stats tables.
+
+    snapshot is a dict with the app's category, rating and genres.
+    """
+    apply_app_deltas([(snapshot, sign)], registry)
+
+
+def apply_app_deltas(changes, registry=django_apps):
+    """Apply several (snapshot, sign) app contributions, with one update per category and genre touched.
+
+    Bulk writes pass the apps' values from before the write with sign=-1 and
+    the written values with sign=1: contributions that cancel out cost nothing.
+    """
+    CategoryStat = registry.get_model(APP_LABEL, 'CategoryStat')
+    GenreStat = registry.get_model(APP_LABEL, 'GenreStat')
+    categories = defaultdict(lambda: [0, 0.0, 0])
+    genres = defaultdict(lambda: [0, 0.0, 0])
+    for snapshot, sign in changes:
+        rating = snapshot.get('rating')
+        rated = rating is not None
+        stats = [categories[category_key(snapshot.get('category'))]]
+        stats += [genres[genre] for genre in split_genres(snapshot.get('genres'))]
+        for stat in stats:
+            stat[0] += sign
+            stat[1] += sign * rating if rated else 0
+            stat[2] += sign if rated else 0
+    # no savepoint when a caller's transaction is open: an error here aborts it anyway
+    with transaction.atomic(savepoint=False):
+        _apply(CategoryStat, 'category', categories)
+        _apply(GenreStat, 'genre', genres)
+
+
+def rebuild(registry=django_apps):
+    """Recompute both stats tables from the App table.
+
+    registry lets data migrations pass their historical app registry.
+    """
+    App = registry.get_model(APP_LABEL, 'App')
+    CategoryStat = registry.get_model(APP_LABEL, 'CategoryStat')
+    GenreStat = registry.get_model(APP_LABEL, 'GenreStat')
+
+    categories = defaultdict(lambda: [0, 0.0, 0])
+    grouped = App.objects.values('category').annotate(
+        n=Count('id'), rating_sum=Sum('rating'), rated=Count('rating'),
+    ).order_by()
+    for row in grouped:
+        # NULL and '' are both counted as 'Unknown'
+        stat = categories[category_key(row['category'])]
+        stat[0] += row['n']
+        stat[1] += row['rating_sum'] or 0
+        stat[2] += row['rated']
+
+    genres = defaultdict(lambda: [0, 0.0, 0])
+    grouped = App.objects.exclude(genres__isnull=True).exclude(genres='').values('genres').annotate(
+        n=Count('id'), rating_sum=Sum('rating'), rated=Count('rating'),
+    ).order_by()
+    for row in grouped:
+        for genre in split_genres(row['genres']):
+            stat = genres[genre]
+            stat[0] += row['n']
+            stat[1] += row['rating_sum'] or 0
+            stat[2] += row['rated']
+
+    with transaction.atomic():
+        CategoryStat.objects.all().delete()
+        CategoryStat.objects.bulk_create(
+            CategoryStat(category=key, count=n, rating_sum=total, rated_count=rated)
+            for key, (n, total, rated) in categories.items()
+        )
+        GenreStat.objects.all().delete()
+        GenreStat.objects.bulk_create(
+            GenreStat(genre=key, count=n, rating_sum=total, rated_count=rated)
+            for key, (n, total, rated) in genres.items()
+        )
+
+
+def review_delta(sentiment, polarity, sign):
+    """Update kwargs adding (sign=1) or removing (sign=-1) one review from its app's summary columns."""
+    delta = {'review_count': F('review_count') + sign}
+    field = SENTIMENT_COUNT_FIELDS.get(normalize_sentiment(sentiment))
+    if field:
+        delta[field] = F(field) + sign
+    if polarity is not None and not math.isnan(polarity):
+        # the right-hand sides read the values from before the UPDATE
+        delta['polarity_sum'] = F('polarity_sum') + sign * polarity
+        delta['polarity_count'] = F('polarity_count') + sign
+        delta['avg_polarity'] = (F('polarity_sum') + sign * polarity) / NullIf(F('polarity_count') + sign, 0)
+    return delta
+
+
+def review_summary_expressions(registry=django_apps):
+    """Correlated subqueries computing every review summary column of an app from the Review table."""
+    Review = registry.get_model(APP_LABEL, 'Review')
+    reviews = Review.objects.filter(app=OuterRef('pk')).order_by().values('app')
+
+    def aggregate(expression, default):
+        subquery = Subquery(reviews.annotate(value=expression).values('value'))
+        return subquery if default is None else Coalesce(subquery, default)
+
+    summary = {
+        'review_count': aggregate(Count('id'), 0),
+        'polarity_sum': aggregate(Sum('sentiment_polarity'), Value(0.0, output_field=FloatField())),
+        'polarity_count': aggregate(Count('sentiment_polarity'), 0),
+        'avg_polarity': aggregate(Avg('sentiment_polarity'), None),
+    }
+    for label, field in SENTIMENT_COUNT_FIELDS.items():
+        # the normalised label, as review_delta() counts it: ' Positive' is positive too
+        summary[field] = aggregate(Count('id', filter=Q(sentiment_key=label)), 0)
+    return summary
+
+
+def rebuild_review_summary(app_ids=None, registry=django_apps):
+    """Recompute the review summary columns of the given apps (all apps when app_ids is None)."""
+    App = registry.get_model(APP_LABEL, 'App')
+    summary = review_summary_expressions(registry)
+    if app_ids is None:
+        App.objects.update(**summary)
+        return
+    app_ids = list(app_ids)
+    for start in range(0, len(app_ids), SUMMARY_BATCH_SIZE):
+        App.objects.filter(id__in=app_ids[start:start + SUMMARY_BATCH_SIZE]).update(**summary)
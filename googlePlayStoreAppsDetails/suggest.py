@@ -0,0 +1,178 @@
+# In-memory autocomplete index for /api/apps/suggest/.
+#
+# Normalised app names are kept in one sorted list, with the app ids and
+# ranking scores in parallel compact arrays, and a prefix lookup is a bisect.
+# For prefixes shared by many names the best entries are precomputed, so a
+# lookup never scans more than SCAN_LIMIT entries. The index is built lazily on
+# first use in each process. When the apps generation counter (bumped on App
+# writes, see signals.py) has changed, one background thread rebuilds it while
+# requests keep being answered from the previous index, so writes never make a
+# request wait for a rebuild; suggestions lag behind writes by one build.
+
+import heapq
+import logging
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from django.db import connection
+from .models import App
+from . import versioning
+
+# rankings offered by the endpoint: ?rank= value -> index of the score array
+RANKS = ('rating', 'installs')
+
+# prefixes matching more names than this have their best entries precomputed
+SCAN_LIMIT = 256
+# longest prefix with precomputed best entries
+PRECOMPUTED_PREFIX = 12
+# number of precomputed entries per prefix, i.e. the largest ?limit=
+MAX_SUGGESTIONS = 20
+
+
+def normalize(text):
+    """Case- and accent-insensitive form of a name or query."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.split())
+
+
+class SuggestIndex:
+    """Sorted array of normalised names with bisect prefix lookups."""
+
+    def __init__(self, rows):
+        # rows: (id, name, rating, installs_min) tuples
+        entries = sorted((normalize(name), name, app_id, rating, installs) for app_id, name, rating, installs in rows)
+        self.keys = [entry[0] for entry in entries]
+        self.names = [entry[1] for entry in entries]
+        self.ids = array('q', (entry[2] for entry in entries))
+        self.ratings = array('d', (entry[3] if entry[3] is not None else -1.0 for entry in entries))
+        self.installs = array('q', (entry[4] if entry[4] is not None else -1 for entry in entries))
+        self.scores = {'rating': (self.ratings, self.installs), 'installs': (self.installs, self.ratings)}
+        self.best = self.precompute()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def score_key(self, rank):
+        primary, secondary = self.scores[rank]
+        return lambda i: (primary[i], secondary[i])
+
+    def precompute(self):
+        """
+        Best MAX_SUGGESTIONS entries, per rank, of every prefix of up to
+        PRECOMPUTED_PREFIX characters shared by more than SCAN_LIMIT names.
+        Only the large groups of one length are split at the next length.
+        """
+        best = {rank: {} for rank in RANKS}
+        score_keys = {rank: self.score_key(rank) for rank in RANKS}
+        groups = [(0, len(self.keys))]
+        for length in range(1, PRECOMPUTED_PREFIX + 1):
+            large = []
+            for lo, hi in groups:
+                for prefix, group in groupby(range(lo, hi), key=lambda i: self.keys[i][:length]):
+                    group = list(group)
+                    if len(group) <= SCAN_LIMIT:
+                        continue
+                    for rank in RANKS:
+                        best[rank][prefix] = heapq.nlargest(MAX_SUGGESTIONS, group, key=score_keys[rank])
+                    large.append((group[0], group[-1] + 1))
+            groups = large
+        return best
+
+    def suggest(self, query, limit=10, rank='rating'):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        precomputed = self.best[rank].get(prefix)
+        if precomputed is not None:
+            positions = precomputed[:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + '\U0010ffff', lo)
+            # prefixes that are not precomputed match few names; longer ones than
+            # PRECOMPUTED_PREFIX may match more and only their first entries are ranked
+            candidates = range(lo, min(hi, lo + SCAN_LIMIT * 4))
+            positions = heapq.nlargest(limit, candidates, key=self.score_key(rank))
+        return [
+            {
+                'id': self.ids[i],
+                'name': self.names[i],
+                'rating': self.ratings[i] if self.ratings[i] >= 0 else None,
+                'installs_min': self.installs[i] if self.installs[i] >= 0 else None,
+            }
+            for i in positions
+        ]
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# held by the first build of the process, so concurrent first requests build once
+_first_build_lock = threading.Lock()
+_index = None
+_index_generation = None
+# the thread rebuilding the index, None when no rebuild runs
+_rebuilder = None
+
+
+def build():
+    """Build the index from the App table and install it as the index of this process."""
+    global _index, _index_generation
+    # read the generation first: writes during the build trigger the next one
+    generation = versioning.get_generation(versioning.APPS)
+    rows = App.objects.values_list('id', 'name', 'rating', 'installs_min').iterator(chunk_size=10000)
+    index = SuggestIndex(rows)
+    with _lock:
+        _index, _index_generation = index, generation
+    return index
+
+
+def _rebuild():
+    global _rebuilder
+    try:
+        build()
+    except Exception:
+        logger.exception('Rebuilding the suggest index failed')
+    finally:
+        # the thread's own database connection
+        connection.close()
+        with _lock:
+            _rebuilder = None
+
+
+def start_rebuild():
+    """Rebuild the index in a background thread, unless a rebuild already runs. Returns the thread."""
+    global _rebuilder
+    with _lock:
+        if _rebuilder is None:
+            _rebuilder = threading.Thread(target=_rebuild, name='suggest-index-rebuild', daemon=True)
+            _rebuilder.start()
+        return _rebuilder
+
+
+def get_index():
+    """
+    The index of this process. Only the first call builds it on the request
+    thread; after App writes the current index keeps being returned while
+    start_rebuild() replaces it.
+    """
+    index, generation = _index, _index_generation
+    if index is None:
+        with _first_build_lock:
+            return _index if _index is not None else build()
+    if generation != versioning.get_generation(versioning.APPS):
+        start_rebuild()
+    return index
+
+
+def reset():
+    """Forget the index of this process (tests), waiting for a running rebuild."""
+    global _index, _index_generation
+    rebuilder = _rebuilder
+    if rebuilder is not None:
+        rebuilder.join()
+    with _lock:
+        _index, _index_generation = None, None
@@ -1,6 +1,23 @@
-from rest_framework.test import APITestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import tempfile
+from asgiref.sync import async_to_sync
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+from django.test import TestCase
 from django.urls import reverse
-from .models import App, Review
+from .models import App, CategoryStat, Genre, GenreStat, LeaderboardEntry, Review
+from . import benchmarks, bulk, ingest, instrumentation, search, stats, suggest, versioning
+from .management.commands import load_reviews
 
 
 # Tests for the API endpoints. 
@@ -18,7 +35,7 @@ class AppAPITests(APITestCase):
 		url = reverse('api-app-list')
 		resp = self.client.get(url)
 		self.assertEqual(resp.status_code, 200) #v checks if the status code returned is 200 OK
-		self.assertTrue(len(resp.data) >= 3) # checks that we indedd have records for three applications in the test database.
+		self.assertTrue(len(resp.data['results']) >= 3) # checks that we indedd have records for three applications in the test database.
 
 	def test_create_app_via_api(self):
 		"""Test  Create a new app"""
@@ -46,8 +63,8 @@ class AppAPITests(APITestCase):
 		url = reverse('api-app-search-by-name')
 		resp = self.client.get(url + '?q=Photo')
 		self.assertEqual(resp.status_code, 200) #checks that the HTTP status code returned is 200 OK
-		self.assertTrue(len(resp.data) >= 1) # checks that tere is at lest one record that match the search criteria
-		self.assertTrue(any('Photo' in app['name'] for app in resp.data))
+		self.assertTrue(len(resp.data['results']) >= 1) # checks that tere is at lest one record that match the search criteria
+		self.assertTrue(any('Photo' in app['name'] for app in resp.data['results']))
 
 	# def test_price_range(self):
 	# 	"""Test GET /api/apps/price_range/ - Filter by price range"""
@@ -96,3 +113,1120 @@ class ReviewAPITests(APITestCase):
 	# 	self.assertIn('total_reviews', resp.data)
 	# 	self.assertIn('avg_polarity', resp.data)
 	# 	self.assertEqual(resp.data['total_reviews'], 2)
+
+
+PLAYSTORE_HEADER = 'App,Category,Rating,Reviews,Size,Installs,Type,Price,Content Rating,Genres,Last Updated,Current Ver,Android Ver\n'
+
+
+# Tests for the CSV load commands. Each test writes a small CSV to a temp file.
+class LoadCommandTests(TestCase):
+	def write_csv(self, text):
+		handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+		handle.write(text)
+		handle.close()
+		self.addCleanup(os.remove, handle.name)
+		return handle.name
+
+	def test_load_playstore_batches_and_skips_duplicates(self):
+		"""Rows are written in batches, duplicate names keep the first row and existing apps are skipped"""
+		App.objects.create(name='Existing', category='TOOLS')
+		path = self.write_csv(PLAYSTORE_HEADER + (
+			'Existing,GAME,4.0,10,1M,"1+",Free,0,Everyone,Tools,1-Jan-18,1,4.0\n'
+			'Alpha,GAME,4.1,159,19M,"10,000+",Free,0,Everyone,Arcade,7-Jan-18,1.0,4.0\n'
+			'Beta,TOOLS,NaN,3.0M,Varies with device,"500+",Paid,$1.99,Teen,Tools,8-Jan-18,2.0,5.0\n'
+			'Alpha,GAME,1.0,1,1M,"1+",Free,0,Everyone,Arcade,7-Jan-18,1.0,4.0\n'
+		))
+		out = StringIO()
+		call_command('load_playstore', path=path, batch_size=2, stdout=out)
+		self.assertIn('Loaded 2 apps', out.getvalue())
+		self.assertIn('rows/sec', out.getvalue())
+		self.assertEqual(App.objects.get(name='Existing').category, 'TOOLS')
+		self.assertEqual(App.objects.get(name='Alpha').rating, 4.1)
+		beta = App.objects.get(name='Beta')
+		self.assertIsNone(beta.rating)
+		self.assertIsNone(beta.reviews)
+
+	def test_load_playstore_update_refreshes_existing(self):
+		"""--update refreshes apps that already exist with bulk_update"""
+		App.objects.create(name='Existing', category='TOOLS')
+		path = self.write_csv(PLAYSTORE_HEADER + 'Existing,GAME,4.0,10,1M,"1+",Free,0,Everyone,Tools,1-Jan-18,1,4.0\n')
+		call_command('load_playstore', path=path, update=True, stdout=StringIO())
+		self.assertEqual(App.objects.count(), 1)
+		self.assertEqual(App.objects.get(name='Existing').category, 'GAME')
+		self.assertEqual(App.objects.get(name='Existing').version, 2)
+
+	def test_load_reviews_resolves_apps_in_memory(self):
+		"""Reviews match apps exactly or case-insensitively, duplicates are skipped and unknown apps are summarised"""
+		app = App.objects.create(name='Alpha')
+		Review.objects.create(app=app, app_name='Alpha', translated_review='Already here', sentiment='Positive')
+		path = self.write_csv(
+			'App,Translated_Review,Sentiment,Sentiment_Polarity,Sentiment_Subjectivity\n'
+			'Alpha,Already here,Positive,0.5,0.5\n'
+			'Alpha,"Great, really",Positive,1,0.5\n'
+			'ALPHA,Bad,Negative,-0.5,0.5\n'
+			'Alpha,Bad,Negative,-0.5,0.5\n'
+			'Missing,Nope,Neutral,0,0\n'
+			'Missing,Nope again,Neutral,0,0\n'
+		)
+		out, err = StringIO(), StringIO()
+		# the app index, one probe of the stored reviews, one INSERT between two counts of the
+		# inserted rows and one app version UPDATE in a savepoint, then one UPDATE of the
+		# review summaries, whatever the row count
+		with self.assertNumQueries(9):
+			call_command('load_reviews', path=path, stdout=out, stderr=err)
+		self.assertIn('Loaded 2 reviews', out.getvalue())
+		self.assertEqual(app.reviews_set.count(), 3)
+		app.refresh_from_db()
+		self.assertEqual((app.review_count, app.positive_count, app.negative_count), (3, 2, 1))
+		self.assertIn('Skipped 2 reviews for 1 unknown apps', err.getvalue())
+		self.assertEqual(err.getvalue().count('App not found'), 1)
+
+	def test_review_content_hash_is_unique_per_app(self):
+		"""A text is stored once per app: duplicate inserts fail, or are skipped with ignore_conflicts"""
+		alpha, beta = App.objects.create(name='Alpha'), App.objects.create(name='Beta')
+		review = Review.objects.create(app=alpha, translated_review='Same text', sentiment='Positive')
+		self.assertEqual(review.content_hash, ingest.review_content_hash('Same text'))
+		Review.objects.create(app=beta, translated_review='Same text', sentiment='Positive')
+		Review.objects.bulk_create([Review(app=alpha, translated_review='Same text', content_hash=review.content_hash)], ignore_conflicts=True)
+		self.assertEqual(alpha.reviews_set.count(), 1)
+		with self.assertRaises(IntegrityError), transaction.atomic():
+			Review.objects.create(app=alpha, translated_review='Same text', sentiment='Negative')
+		# a second load of the same file finds every review already stored
+		path = self.write_csv('App,Translated_Review,Sentiment,Sentiment_Polarity,Sentiment_Subjectivity\nAlpha,Same text,Positive,1,0\nAlpha,New text,Positive,1,0\n')
+		call_command('load_reviews', path=path, stdout=StringIO())
+		out = StringIO()
+		call_command('load_reviews', path=path, stdout=out)
+		self.assertIn('Loaded 0 reviews', out.getvalue())
+		self.assertEqual(alpha.reviews_set.count(), 2)
+
+	def test_load_reviews_counts_inserted_rows_only(self):
+		"""Rows another load inserted after the probe are neither counted nor summarised again"""
+		app = App.objects.create(name='Alpha')
+		Review.objects.create(app=app, translated_review='Raced', sentiment='Positive')
+		version = App.objects.get(pk=app.id).version
+		path = self.write_csv('App,Translated_Review,Sentiment,Sentiment_Polarity,Sentiment_Subjectivity\nAlpha,Raced,Positive,1,0\n')
+		out = StringIO()
+		# the probe ran before the other load's insert committed
+		with mock.patch.object(load_reviews.Command, 'stored_reviews', return_value={}):
+			call_command('load_reviews', path=path, stdout=out)
+		self.assertIn('Loaded 0 reviews', out.getvalue())
+		self.assertEqual(App.objects.get(pk=app.id).version, version)
+
+	def test_partition_respects_quoted_newlines(self):
+		"""Byte ranges end on record boundaries, never inside a quoted field"""
+		rows = ''.join(f'App {i},"line one\nline two, {i}",Positive,0.5,0.5\n' for i in range(200))
+		path = self.write_csv('App,Translated_Review,Sentiment,Sentiment_Polarity,Sentiment_Subjectivity\n' + rows)
+		header, ranges = ingest.partition_csv(path, 7)
+		self.assertEqual(header[0], 'App')
+		self.assertGreater(len(ranges), 1)
+		parsed = [fields for start, end in ranges for fields, error in ingest.parse_csv_range(path, header, start, end, ingest.parse_review_row)]
+		self.assertEqual([f['app_name'] for f in parsed], [f'App {i}' for i in range(200)])
+		self.assertTrue(all('\n' in f['translated_review'] for f in parsed))
+
+	def test_load_with_workers_matches_sequential_load(self):
+		"""--workers parses in a process pool and produces the same rows in the same order"""
+		rows = ''.join(f'App {i % 150},GAME,4.{i % 10},{i},1M,"1+",Free,0,Everyone,"Arcade;\nAction",1-Jan-18,1,4.0\n' for i in range(300))
+		path = self.write_csv(PLAYSTORE_HEADER + rows)
+		call_command('load_playstore', path=path, workers=3, batch_size=40, stdout=StringIO())
+		self.assertEqual(App.objects.count(), 150)
+		self.assertEqual(App.objects.get(name='App 7').reviews, 7)
+		self.assertEqual(list(App.objects.order_by('id').values_list('name', flat=True)[:3]), ['App 0', 'App 1', 'App 2'])
+
+
+	def test_incremental_playstore_reload(self):
+		"""--incremental skips unchanged rows without writing, updates changed ones and --prune deletes the missing"""
+		rows = {name: f'{name},GAME,4.0,10,1M,"1+",Free,0,Everyone,Arcade,1-Jan-18,1,4.0\n' for name in ('Alpha', 'Beta', 'Gamma')}
+		call_command('load_playstore', path=self.write_csv(PLAYSTORE_HEADER + ''.join(rows.values())), stdout=StringIO())
+		# the app preload, then nothing: no write, no rebuild of the derived tables
+		with self.assertNumQueries(1):
+			call_command('load_playstore', path=self.write_csv(PLAYSTORE_HEADER + ''.join(rows.values())), incremental=True, stdout=StringIO())
+
+		rows['Beta'] = rows['Beta'].replace('4.0,10', '2.5,10')
+		del rows['Gamma']
+		out = StringIO()
+		call_command('load_playstore', path=self.write_csv(PLAYSTORE_HEADER + ''.join(rows.values())), incremental=True, prune=True, stdout=out)
+		self.assertIn('Updated 1 existing apps', out.getvalue())
+		self.assertIn('Skipped 1 unchanged apps', out.getvalue())
+		self.assertIn('Deleted 1 apps missing from the file', out.getvalue())
+		self.assertEqual(sorted(App.objects.values_list('name', flat=True)), ['Alpha', 'Beta'])
+		beta = App.objects.get(name='Beta')
+		self.assertEqual((beta.rating, beta.version), (2.5, 2))
+		self.assertEqual(CategoryStat.objects.get(category='GAME').count, 2)
+
+	def test_incremental_reviews_reload(self):
+		"""Changed reviews are rewritten in bulk and their apps' summaries recomputed, unchanged ones skipped"""
+		app = App.objects.create(name='Alpha')
+		header = 'App,Translated_Review,Sentiment,Sentiment_Polarity,Sentiment_Subjectivity\n'
+		call_command('load_reviews', path=self.write_csv(header + 'Alpha,Good,Positive,0.5,0.5\nAlpha,Meh,Neutral,0,0\nAlpha,Gone,Negative,-1,0\n'), stdout=StringIO())
+		out = StringIO()
+		call_command('load_reviews', path=self.write_csv(header + 'Alpha,Good,Positive,0.5,0.5\nAlpha,Meh,Negative,-0.2,0\n'), incremental=True, prune=True, stdout=out)
+		self.assertIn('Updated 1 changed reviews, skipped 1 unchanged reviews', out.getvalue())
+		self.assertIn('Deleted 1 reviews missing from the file', out.getvalue())
+		self.assertEqual(app.reviews_set.get(translated_review='Meh').sentiment_key, 'negative')
+		app.refresh_from_db()
+		self.assertEqual((app.review_count, app.positive_count, app.neutral_count, app.negative_count), (2, 1, 0, 1))
+
+	def test_incremental_reload_refreshes_changed_apps_only(self):
+		"""One changed row rewrites the derived rows of that app only, not whole tables"""
+		rows = [f'App {i},GAME,4.0,10,1M,"1+",Free,0,Everyone,Arcade,1-Jan-18,1,4.0\n' for i in range(20)]
+		call_command('load_playstore', path=self.write_csv(PLAYSTORE_HEADER + ''.join(rows)), stdout=StringIO())
+		rows[3] = rows[3].replace('GAME,4.0,10,1M,"1+",Free,0,Everyone,Arcade', 'TOOLS,4.0,10,1M,"1+",Free,0,Everyone,Tools')
+		derived = ('categorystat', 'genrestat', 'leaderboardentry', 'appsearch')
+		with CaptureQueriesContext(connection) as queries:
+			call_command('load_playstore', path=self.write_csv(PLAYSTORE_HEADER + ''.join(rows)), incremental=True, stdout=StringIO())
+		writes = [
+			query['sql'] for query in queries
+			if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) and any(table in query['sql'] for table in derived)
+		]
+		# category and genre stats: one UPDATE per stat row, plus the creation of the TOOLS
+		# rows; the app's leaderboard entries and search row: one DELETE and one INSERT each
+		self.assertEqual(len(writes), 10)
+		self.assertTrue(all('WHERE' in sql for sql in writes if sql.startswith('DELETE')))
+		self.assertEqual((CategoryStat.objects.get(category='GAME').count, CategoryStat.objects.get(category='TOOLS').count), (19, 1))
+		self.assertEqual(LeaderboardEntry.objects.filter(board='genre:Tools').count(), 1)
+
+	def test_prune_needs_incremental(self):
+		"""--prune alone is refused"""
+		with self.assertRaises(CommandError):
+			call_command('load_reviews', path=self.write_csv('App\n'), prune=True, stdout=StringIO())
+
+# Tests for the pre-aggregated CategoryStat / GenreStat tables.
+class StatsTests(APITestCase):
+	def setUp(self):
+		self.game = App.objects.create(name='Game', category='GAME', rating=4.0, genres='Arcade;Action')
+		self.other = App.objects.create(name='Other', category='GAME', rating=None, genres='Arcade')
+
+	def test_signals_keep_stats_incremental(self):
+		"""Saving, editing and deleting apps keeps the stats tables in step"""
+		stat = CategoryStat.objects.get(category='GAME')
+		self.assertEqual((stat.count, stat.rated_count, stat.avg_rating), (2, 1, 4.0))
+		self.game.category = 'TOOLS'
+		self.game.rating = 3.0
+		self.game.save()
+		self.assertEqual(CategoryStat.objects.get(category='GAME').count, 1)
+		self.assertEqual(CategoryStat.objects.get(category='TOOLS').avg_rating, 3.0)
+		self.other.delete()
+		self.assertEqual(CategoryStat.objects.get(category='GAME').count, 0)
+		self.assertEqual(GenreStat.objects.get(genre='Arcade').count, 1)
+
+	def test_endpoints_read_stats_tables(self):
+		"""Both stats endpoints are served with a single query"""
+		with self.assertNumQueries(1):
+			resp = self.client.get(reverse('api-app-category-stats'))
+		self.assertEqual(resp.data['GAME'], {'count': 2, 'avg_rating': 4.0})
+		with self.assertNumQueries(1):
+			resp = self.client.get(reverse('api-app-avg-rating-by-genre'))
+		self.assertEqual(resp.data, {'Action': 4.0, 'Arcade': 4.0})
+
+	def test_rebuild_command(self):
+		"""rebuild_stats recomputes the tables from scratch"""
+		CategoryStat.objects.all().delete()
+		App.objects.filter(pk=self.other.pk).update(category=None)
+		call_command('rebuild_stats', stdout=StringIO())
+		self.assertEqual(CategoryStat.objects.get(category='Unknown').count, 1)
+		self.assertEqual(GenreStat.objects.get(genre='Arcade').count, 2)
+
+	def test_category_stats_filters_run_in_sql(self):
+		"""Filtered category stats are computed with a single GROUP BY query"""
+		App.objects.create(name='Paid', category='', type='Paid', rating=2.0, installs='50,000+')
+		App.objects.create(name='Small', category='GAME', type='Free', rating=5.0, installs='10+')
+		url = reverse('api-app-category-stats')
+		with self.assertNumQueries(1):
+			resp = self.client.get(url, {'type': 'paid', 'min_installs': 1000})
+		self.assertEqual(resp.data, {'Unknown': {'count': 1, 'avg_rating': 2.0}})
+		self.assertEqual(self.client.get(url, {'min_installs': 'lots'}).status_code, 400)
+
+	def test_category_stats_benchmark(self):
+		"""The benchmark scenarios run on a small synthetic catalogue"""
+		with tempfile.TemporaryDirectory() as directory:
+			apps_path = os.path.join(directory, 'apps.csv')
+			reviews_path = os.path.join(directory, 'reviews.csv')
+			with open(apps_path, 'w', newline='') as apps_file, open(reviews_path, 'w', newline='') as reviews_file:
+				benchmarks.write_catalogue_csv(apps_file, reviews_file, 200)
+			benchmarks.bench_loads(apps_path, reviews_path)
+		results = benchmarks.bench_endpoints(repeat=1, only={'api-app-category-stats'})
+		self.assertEqual(len(results), 2)
+		self.assertTrue(all(result['queries'] == 1 for result in results.values()))
+
+
+# Tests for the normalised Genre model and the genre filter.
+class GenreTests(APITestCase):
+	def setUp(self):
+		self.puzzle = App.objects.create(name='Puzzle', rating=4.0, genres='Puzzle;Brain Games')
+		self.arcade = App.objects.create(name='Arcade', rating=3.0, genres='Arcade')
+
+	def test_genres_follow_the_genres_string(self):
+		"""Saving an app links it to its genres and relinks it when the string changes"""
+		self.assertEqual(sorted(self.puzzle.genre_set.values_list('name', flat=True)), ['Brain Games', 'Puzzle'])
+		self.puzzle.genres = 'Arcade'
+		self.puzzle.save()
+		self.assertEqual(list(self.puzzle.genre_set.values_list('name', flat=True)), ['Arcade'])
+
+	def test_list_filter_by_genre(self):
+		"""GET /api/apps/?genre= filters through the join table"""
+		resp = self.client.get(reverse('api-app-list'), {'genre': 'brain games'})
+		self.assertEqual([app['name'] for app in resp.data['results']], ['Puzzle'])
+		resp = self.client.get(reverse('api-app-list'), {'genre': 'Unknown genre'})
+		self.assertEqual(resp.data['results'], [])
+
+	def test_genre_aggregates(self):
+		"""GET /api/genres/ returns per-genre counts and average ratings"""
+		App.objects.create(name='Arcade 2', rating=5.0, genres='Arcade')
+		resp = self.client.get(reverse('api-genre-list'))
+		arcade = next(g for g in resp.data if g['name'] == 'Arcade')
+		self.assertEqual((arcade['app_count'], arcade['avg_rating']), (2, 4.0))
+
+	def test_loader_links_genres(self):
+		"""load_playstore links the new apps to their genres in bulk"""
+		handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+		handle.write(PLAYSTORE_HEADER + 'Loaded,GAME,4.0,10,1M,"1+",Free,0,Everyone,Arcade;Action & Adventure,1-Jan-18,1,4.0\n')
+		handle.close()
+		self.addCleanup(os.remove, handle.name)
+		call_command('load_playstore', path=handle.name, stdout=StringIO())
+		self.assertEqual(Genre.objects.get(name='Arcade').apps.count(), 2)
+		self.assertTrue(Genre.objects.filter(name='Action & Adventure', apps__name='Loaded').exists())
+
+
+# Tests for the typed companion columns and the list filters built on them.
+class TypedColumnTests(APITestCase):
+	def setUp(self):
+		self.cheap = App.objects.create(name='Cheap', rating=4.0, installs='10,000+', price='0', size='19M', last_updated='7-Jan-18')
+		self.pricey = App.objects.create(name='Pricey', rating=4.5, installs='500+', price='$4.99 ', size='Varies with device', last_updated='January 20, 2018')
+
+	def test_save_parses_typed_columns(self):
+		"""App.save fills the typed columns from the raw strings"""
+		self.assertEqual((self.cheap.installs_min, self.cheap.price_cents, self.cheap.size_bytes), (10000, 0, 19 * 1024 * 1024))
+		self.assertEqual((self.pricey.installs_min, self.pricey.price_cents, self.pricey.size_bytes), (500, 499, None))
+		self.assertEqual(str(self.pricey.last_updated_date), '2018-01-20')
+		self.assertIsNone(ingest.parse_installs('Free'))
+		self.assertEqual(ingest.parse_size('201k'), 201 * 1024)
+
+	def test_api_write_path_fills_typed_columns(self):
+		"""Apps created through the API get their typed columns"""
+		resp = self.client.post(reverse('api-app-list'), {'name': 'Posted', 'installs': '1,000+', 'price': '$0.99'}, format='json')
+		self.assertEqual((resp.data['installs_min'], resp.data['price_cents']), (1000, 99))
+
+	def test_range_filters_and_ordering(self):
+		"""Range filters and ?ordering= are evaluated by the database"""
+		url = reverse('api-app-list')
+		names = lambda resp: [app['name'] for app in resp.data['results']]
+		self.assertEqual(names(self.client.get(url, {'installs_min__gte': 1000})), ['Cheap'])
+		self.assertEqual(names(self.client.get(url, {'price_cents__lte': 100})), ['Cheap'])
+		self.assertEqual(names(self.client.get(url, {'updated_after': '2018-01-10'})), ['Pricey'])
+		self.assertEqual(names(self.client.get(url, {'ordering': '-price_cents'})), ['Pricey', 'Cheap'])
+		self.assertEqual(self.client.get(url, {'ordering': 'secret'}).status_code, 400)
+		self.assertEqual(self.client.get(url, {'updated_after': 'yesterday'}).status_code, 400)
+
+
+# Tests for nested reviews and sparse fieldsets in list responses.
+class AppRepresentationTests(APITestCase):
+	def setUp(self):
+		for i in range(3):
+			app = App.objects.create(name=f'App {i}', rating=4.0)
+			for j in range(8):
+				Review.objects.create(app=app, translated_review=f'Review {j}', sentiment='Positive', sentiment_polarity=j / 10)
+
+	def test_list_without_reviews_is_a_single_select(self):
+		"""Listing apps without ?include=reviews does not touch the review table"""
+		with self.assertNumQueries(1):
+			resp = self.client.get(reverse('api-app-list'))
+		self.assertNotIn('reviews', resp.data['results'][0])
+
+	def test_include_reviews_is_bounded_and_prefetched(self):
+		"""?include=reviews nests the most polar reviews of every app with one extra query"""
+		with self.assertNumQueries(2):
+			resp = self.client.get(reverse('api-app-list'), {'include': 'reviews', 'reviews_limit': 2})
+		for app in resp.data['results']:
+			self.assertEqual([r['translated_review'] for r in app['reviews']], ['Review 7', 'Review 6'])
+		with self.assertNumQueries(2):
+			resp = self.client.get(reverse('top-rated'), {'include': 'reviews'})
+		self.assertEqual(len(resp.data[0]['reviews']), 5)
+
+	def test_sparse_fieldset(self):
+		"""?fields= returns only the requested fields"""
+		resp = self.client.get(reverse('api-app-search-by-name'), {'q': 'App', 'fields': 'id,name'})
+		self.assertEqual(set(resp.data['results'][0]), {'id', 'name'})
+		resp = self.client.get(reverse('api-app-detail', args=[resp.data['results'][0]['id']]))
+		self.assertEqual(len(resp.data['reviews']), 8)
+
+
+# Tests for keyset (cursor) pagination.
+class PaginationTests(APITestCase):
+	def setUp(self):
+		ratings = [5.0, None, 4.0, 5.0, None, 3.0, 4.0]
+		self.apps = [App.objects.create(name=f'App {i}', rating=rating) for i, rating in enumerate(ratings)]
+
+	def walk(self, url, params):
+		"""Follow the next links and return the ids of every page"""
+		ids = []
+		resp = self.client.get(url, params)
+		while True:
+			self.assertEqual(resp.status_code, 200)
+			ids.extend(row['id'] for row in resp.data['results'])
+			if not resp.data['next']:
+				return ids
+			resp = self.client.get(resp.data['next'])
+
+	def test_walks_catalogue_without_count(self):
+		"""Pages are keyed on id and no COUNT query is run by default"""
+		url = reverse('api-app-list')
+		with self.assertNumQueries(1):
+			resp = self.client.get(url, {'limit': 3})
+		self.assertNotIn('count', resp.data)
+		self.assertEqual(self.walk(url, {'limit': 3}), [app.id for app in self.apps])
+		self.assertEqual(self.client.get(url, {'count': 'true'}).data['count'], 7)
+
+	def test_rating_keyset_with_ties_and_nulls(self):
+		"""(rating, id) pages keep a stable order through ties and NULL ratings"""
+		url = reverse('api-app-list')
+		expected = [app.id for app in sorted(self.apps, key=lambda a: (a.rating is None, -(a.rating or 0), -a.id))]
+		self.assertEqual(self.walk(url, {'limit': 2, 'ordering': '-rating'}), expected)
+		expected = [app.id for app in sorted(self.apps, key=lambda a: (a.rating is None, a.rating or 0, a.id))]
+		self.assertEqual(self.walk(url, {'limit': 2, 'ordering': 'rating'}), expected)
+
+	def test_offset_opt_in_and_bad_cursor(self):
+		"""?offset= switches to limit/offset pages; malformed cursors are rejected"""
+		url = reverse('api-app-list')
+		resp = self.client.get(url, {'offset': 5, 'limit': 5})
+		self.assertEqual((resp.data['count'], len(resp.data['results'])), (7, 2))
+		self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, 400)
+
+	def test_cursor_values_are_checked(self):
+		"""Well-formed cursors holding values of the wrong type are rejected with a 400"""
+		url = reverse('api-app-list')
+		for ordering, value, last_id in [
+			('-rating', 'abc', 1), ('last_updated_date', 'not a date', 1), ('id', 1, 2 ** 70), ('installs_min', 2 ** 70, 1),
+		]:
+			cursor = base64.urlsafe_b64encode(json.dumps({'k': ordering, 'v': value, 'id': last_id}).encode()).decode()
+			resp = self.client.get(url, {'ordering': ordering, 'cursor': cursor})
+			self.assertEqual(resp.status_code, 400, ordering)
+
+	def test_review_listing(self):
+		"""GET /api/reviews/ pages through reviews and filters by app"""
+		for i in range(3):
+			Review.objects.create(app=self.apps[i % 2], translated_review=f'R{i}', sentiment='Positive')
+		resp = self.client.get(reverse('api-review-list'), {'app': self.apps[0].id})
+		self.assertEqual([r['translated_review'] for r in resp.data['results']], ['R0', 'R2'])
+		self.assertEqual(len(self.walk(reverse('api-review-list'), {'limit': 1})), 3)
+
+
+# Tests for the full-text search backend.
+class SearchTests(APITestCase):
+	def setUp(self):
+		self.editor = App.objects.create(name='Photo Editor Pro', category='PHOTOGRAPHY', genres='Photography')
+		self.camera = App.objects.create(name='Candy Camera', category='PHOTOGRAPHY', genres='Photography;Editors')
+		self.game = App.objects.create(name='Photon Racer', category='GAME', genres='Racing')
+
+	def test_prefix_matching_and_ranking(self):
+		"""Prefix matches are ranked with name matches first"""
+		self.assertTrue(search.is_available())
+		resp = self.client.get(reverse('api-app-search-by-name'), {'q': 'edit'})
+		self.assertEqual([app['name'] for app in resp.data['results']], ['Photo Editor Pro', 'Candy Camera'])
+		resp = self.client.get(reverse('api-app-search-by-name'), {'q': 'phot rac'})
+		self.assertEqual([app['name'] for app in resp.data['results']], ['Photon Racer'])
+
+	def test_index_follows_writes(self):
+		"""Saves and deletes keep the index in sync"""
+		self.game.name = 'Speed Racer'
+		self.game.save()
+		self.editor.delete()
+		self.assertEqual(search.search_app_ids('photo', 10), [self.camera.id])
+		self.assertEqual(search.search_app_ids('speed', 10), [self.game.id])
+
+	def test_results_are_paginated(self):
+		"""?limit= bounds the page and a next link is returned when more results exist"""
+		resp = self.client.get(reverse('api-app-search-by-name'), {'q': 'photo', 'limit': 2})
+		self.assertEqual(len(resp.data['results']), 2)
+		resp = self.client.get(resp.data['next'])
+		self.assertEqual(len(resp.data['results']), 1)
+		self.assertIsNone(resp.data['next'])
+
+	def test_fallback_without_fts(self):
+		"""Without the FTS table search degrades to a substring match on names"""
+		with mock.patch.object(search, 'is_available', return_value=False):
+			self.assertEqual(search.search_app_ids('hoto', 10), [self.editor.id, self.game.id])
+
+
+# Tests for the in-memory autocomplete index.
+class SuggestTests(APITestCase):
+	def setUp(self):
+		# the index lives in the process: start every test without one
+		suggest.reset()
+		self.addCleanup(suggest.reset)
+
+	def test_suggestions_ranked_by_rating_or_installs(self):
+		"""Prefix matches are returned best rated first, or by installs"""
+		App.objects.create(name='Chess Free', rating=4.1, installs='1,000,000+')
+		App.objects.create(name='Chess Pro', rating=4.8, installs='1,000+')
+		App.objects.create(name='Checkers', rating=4.9, installs='10+')
+		url = reverse('api-app-suggest')
+		with self.assertNumQueries(1): # building the index; later requests are served from memory
+			resp = self.client.get(url, {'q': 'CHESS'})
+		self.assertEqual([s['name'] for s in resp.data], ['Chess Pro', 'Chess Free'])
+		with self.assertNumQueries(0):
+			resp = self.client.get(url, {'q': 'che', 'rank': 'installs', 'limit': 1})
+		self.assertEqual([s['name'] for s in resp.data], ['Chess Free'])
+
+	def test_precomputed_prefixes_match_a_full_scan(self):
+		"""Popular prefixes use precomputed best entries that agree with a scan"""
+		rows = [(i, f'App {i}', (i * 37 % 50) / 10, i) for i in range(1, suggest.SCAN_LIMIT * 3)]
+		index = suggest.SuggestIndex(rows)
+		self.assertIn('app', index.best['rating'])
+		best = sorted(rows, key=lambda row: (row[2], row[3]), reverse=True)[:5]
+		self.assertEqual([s['id'] for s in index.suggest('app', 5)], [row[0] for row in best])
+
+
+# the background rebuild reads the apps on its own connection: the data must be committed
+class SuggestRebuildTests(APITransactionTestCase):
+	def setUp(self):
+		suggest.reset()
+		self.addCleanup(suggest.reset)
+
+	def test_index_rebuilt_in_the_background_after_writes(self):
+		"""After App writes requests keep the previous index, without a query, while one thread rebuilds it"""
+		App.objects.create(name='Émoji Keyboard', rating=4.0)
+		url = reverse('api-app-suggest')
+		self.assertEqual(len(self.client.get(url, {'q': 'emo'}).data), 1)
+		App.objects.create(name='Emoticons', rating=3.0)
+		with mock.patch.object(suggest, 'build', wraps=suggest.build) as build:
+			with self.assertNumQueries(0):
+				self.assertEqual(len(self.client.get(url, {'q': 'emo'}).data), 1)
+			rebuilder = suggest._rebuilder
+			if rebuilder is not None:
+				rebuilder.join()
+		self.assertEqual(build.call_count, 1)
+		self.assertEqual(len(self.client.get(url, {'q': 'emo'}).data), 2)
+
+
+# Tests for the response cache of the read-heavy endpoints.
+class ResponseCacheTests(APITestCase):
+	def setUp(self):
+		self.app = App.objects.create(name='Cached', category='TOOLS', rating=4.0)
+		Review.objects.create(app=self.app, translated_review='Fine', sentiment='Positive', sentiment_polarity=0.5)
+
+	def test_hits_skip_the_database(self):
+		"""A repeated GET is answered from the cache with the same ETag"""
+		url = reverse('api-app-category-stats')
+		first = self.client.get(url)
+		with self.assertNumQueries(0):
+			second = self.client.get(url)
+		self.assertEqual(second.json(), {'TOOLS': {'count': 1, 'avg_rating': 4.0}})
+		self.assertEqual(first['ETag'], second['ETag'])
+		self.assertIn('Last-Modified', second)
+
+	def test_conditional_get(self):
+		"""If-None-Match with the current ETag gets a 304"""
+		url = reverse('top-rated')
+		etag = self.client.get(url)['ETag']
+		with self.assertNumQueries(0):
+			resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+
+	def test_lost_counters_never_go_back(self):
+		"""Counters are kept apart from the responses, and a lost one restarts at a value never used"""
+		url = reverse('api-app-category-stats')
+		self.client.get(url)
+		before = versioning.get_generation(versioning.APPS)
+		# culling or clearing the response cache leaves the counters alone
+		cache.clear()
+		self.assertEqual(versioning.get_generation(versioning.APPS), before)
+		versioning.counters().delete(versioning.KEY_PREFIX + versioning.APPS)
+		self.assertGreater(versioning.get_generation(versioning.APPS), before)
+		versioning.counters().delete(versioning.KEY_PREFIX + versioning.APPS)
+		self.assertGreater(versioning.bump_generation(versioning.APPS), before + 1)
+
+	def test_writes_invalidate(self):
+		"""App and Review writes move the generation counters and change the response"""
+		stats_url = reverse('api-app-category-stats')
+		sentiment_url = reverse('api-review-by-sentiment') + '?sentiment=positive'
+		etag = self.client.get(stats_url)['ETag']
+		self.assertEqual(len(self.client.get(sentiment_url).json()), 1)
+		App.objects.create(name='Another', category='TOOLS', rating=2.0)
+		Review.objects.create(app=self.app, translated_review='Good', sentiment='Positive', sentiment_polarity=0.6)
+		resp = self.client.get(stats_url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.json()['TOOLS']['count'], 2)
+		self.assertEqual(len(self.client.get(sentiment_url).json()), 2)
+
+
+class ConditionalRequestTests(APITestCase):
+	def setUp(self):
+		self.app = App.objects.create(name='Versioned', category='TOOLS', rating=4.0)
+		self.url = reverse('api-app-detail', args=[self.app.id])
+
+	def test_detail_not_modified(self):
+		"""If-None-Match with the current ETag gets a 304 from a single query"""
+		etag = self.client.get(self.url)['ETag']
+		self.assertEqual(etag, f'"app-{self.app.id}-v1"')
+		with self.assertNumQueries(1):
+			resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+		Review.objects.create(app=self.app, translated_review='New', sentiment='Positive', sentiment_polarity=0.3)
+		resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['version'], 2)
+
+	def test_list_not_modified(self):
+		"""A page's ETag changes when one of its apps is written"""
+		url = reverse('api-app-list') + '?fields=id,name,reviews'
+		etag = self.client.get(url)['ETag']
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		self.app.rating = 3.0
+		self.app.save()
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+	def test_list_etag_covers_pagination(self):
+		"""A page's ETag changes with its count and links, even when its apps do not"""
+		App.objects.create(name='Second', category='TOOLS', rating=3.0)
+		urls = [reverse('api-app-list') + query for query in ('?offset=0&limit=2', '?count=true&limit=2', '?limit=2')]
+		etags = [self.client.get(url)['ETag'] for url in urls]
+		App.objects.create(name='Third', category='TOOLS', rating=2.0)
+		for url, etag in zip(urls, etags):
+			resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(resp.status_code, 200, url)
+		self.assertIsNotNone(resp.data['next'])
+
+	def test_stale_if_match(self):
+		"""Writes sent with an outdated If-Match are refused with 412"""
+		etag = self.client.get(self.url)['ETag']
+		resp = self.client.patch(self.url, {'rating': 4.5}, format='json', HTTP_IF_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp['ETag'], f'"app-{self.app.id}-v2"')
+		resp = self.client.patch(self.url, {'rating': 1.0}, format='json', HTTP_IF_MATCH=etag)
+		self.assertEqual(resp.status_code, 412)
+		self.assertEqual(self.client.delete(self.url, HTTP_IF_MATCH=etag).status_code, 412)
+		self.assertEqual(App.objects.get(pk=self.app.id).rating, 4.5)
+
+	def test_stale_instances_get_a_new_version(self):
+		"""Saves of stale instances move the stored version on instead of reusing one"""
+		first, second = App.objects.get(pk=self.app.id), App.objects.get(pk=self.app.id)
+		first.rating = 3.0
+		first.save()
+		second.rating = 2.0
+		second.save()
+		self.assertEqual((first.version, second.version), (2, 3))
+		# a review write moves the version on behind the instance's back
+		Review.objects.create(app=self.app, translated_review='New', sentiment='Positive')
+		second.save()
+		self.assertEqual(second.version, 5)
+		self.assertEqual(App.objects.get(pk=self.app.id).version, 5)
+
+	def test_stale_instances_keep_the_review_summary(self):
+		"""Saving an instance loaded before a review write leaves the review summary alone"""
+		stale = App.objects.get(pk=self.app.id)
+		Review.objects.create(app=self.app, translated_review='Great', sentiment='Positive', sentiment_polarity=0.5)
+		stale.rating = 3.5
+		stale.save()
+		stored = App.objects.get(pk=self.app.id)
+		self.assertEqual((stored.rating, stored.review_count, stored.positive_count, stored.polarity_count), (3.5, 1, 1, 1))
+		self.assertEqual(stored.avg_polarity, 0.5)
+		# the review decrements of the delete cascade stay within the constraints
+		stale.delete()
+		self.assertFalse(Review.objects.exists())
+
+
+class ExportTests(APITestCase):
+	def setUp(self):
+		self.game = App.objects.create(name='Export Game', category='GAME', rating=4.1, installs='1,000+', genres='Arcade')
+		self.tool = App.objects.create(name='Export Tool, Pro', category='TOOLS', rating=3.2, installs='100+')
+		Review.objects.create(app=self.game, translated_review='Fun', sentiment='Positive', sentiment_polarity=0.8)
+		Review.objects.create(app=self.tool, translated_review='Meh', sentiment='Neutral', sentiment_polarity=0.0)
+
+	def test_ndjson_export(self):
+		"""Apps are streamed one JSON object per line, with the list filters applied"""
+		resp = self.client.get(reverse('api-app-export') + '?installs_min__gte=1000')
+		self.assertEqual(resp.status_code, 200)
+		self.assertTrue(resp.streaming)
+		self.assertTrue(resp['Content-Type'].startswith('application/x-ndjson'))
+		lines = b''.join(resp.streaming_content).decode('utf-8').splitlines()
+		self.assertEqual(len(lines), 1)
+		row = json.loads(lines[0])
+		self.assertEqual(row['name'], 'Export Game')
+		self.assertEqual(row['installs_min'], 1000)
+
+	def test_csv_export(self):
+		"""?format=csv writes a header row and quotes values when needed"""
+		resp = self.client.get(reverse('api-review-export') + '?format=csv&fields=id,app_name,sentiment')
+		rows = list(csv.reader(b''.join(resp.streaming_content).decode('utf-8').splitlines()))
+		self.assertEqual(rows[0], ['id', 'app_name', 'sentiment'])
+		self.assertEqual([row[1:] for row in rows[1:]], [['Export Game', 'Positive'], ['Export Tool, Pro', 'Neutral']])
+		resp = self.client.get(reverse('api-review-export') + '?fields=id,password')
+		self.assertEqual(resp.status_code, 400)
+
+	def test_gzip(self):
+		"""Clients accepting gzip get a compressed stream"""
+		resp = self.client.get(reverse('api-app-export'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+		self.assertEqual(resp['Content-Encoding'], 'gzip')
+		lines = gzip.decompress(b''.join(resp.streaming_content)).decode('utf-8').splitlines()
+		self.assertEqual([json.loads(line)['name'] for line in lines], ['Export Game', 'Export Tool, Pro'])
+
+
+class BatchGetTests(APITestCase):
+	def setUp(self):
+		self.apps = [App.objects.create(name=f'Batch {i}', category='TOOLS', rating=4.0) for i in range(3)]
+		Review.objects.create(app=self.apps[1], translated_review='Nice', sentiment='Positive', sentiment_polarity=0.4)
+		self.url = reverse('api-app-batch-get')
+
+	def test_post_keeps_order(self):
+		"""Apps come back in the requested order, in two queries, with null for unknown ids"""
+		ids = [self.apps[2].id, 999999, self.apps[1].id]
+		with self.assertNumQueries(2):
+			resp = self.client.post(self.url, {'ids': ids}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		results = resp.data['results']
+		self.assertEqual(results[0]['name'], 'Batch 2')
+		self.assertIsNone(results[1])
+		self.assertEqual(len(results[2]['reviews']), 1)
+		self.assertEqual(resp.data['not_found'], [999999])
+
+	def test_get_with_ids(self):
+		"""GET ?ids= works the same, and ?fields= without reviews skips their query"""
+		ids = ','.join(str(app.id) for app in self.apps)
+		with self.assertNumQueries(1):
+			resp = self.client.get(self.url + f'?ids={ids}&fields=id,name')
+		self.assertEqual([app['name'] for app in resp.data['results']], ['Batch 0', 'Batch 1', 'Batch 2'])
+
+	def test_invalid_ids(self):
+		"""Non-integer ids, an empty list and too many ids are rejected"""
+		self.assertEqual(self.client.get(self.url + '?ids=1,x').status_code, 400)
+		self.assertEqual(self.client.post(self.url, {'ids': []}, format='json').status_code, 400)
+		with self.settings(BATCH_GET_MAX_IDS=2):
+			self.assertEqual(self.client.get(self.url + '?ids=1,2,3').status_code, 400)
+
+	def test_out_of_range_ids(self):
+		"""Ids that no primary key can hold are rejected with a 400, not passed to the driver"""
+		self.assertEqual(self.client.get(self.url + '?ids=99999999999999999999999').status_code, 400)
+		self.assertEqual(self.client.post(self.url, {'ids': [0]}, format='json').status_code, 400)
+		resp = self.client.delete(reverse('api-app-bulk'), {'ids': [2 ** 63]}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		resp = self.client.post(reverse('api-review-bulk'), [{'id': 2 ** 63, 'sentiment': 'Positive'}], format='json')
+		self.assertEqual(resp.data['results'][0]['status'], 'invalid')
+
+
+class BulkWriteTests(APITestCase):
+	def setUp(self):
+		self.app = App.objects.create(name='Bulk Existing', category='TOOLS', rating=3.0, installs='100+', genres='Tools')
+		self.review = Review.objects.create(app=self.app, translated_review='Old', sentiment='Neutral', sentiment_polarity=0.0)
+
+	def test_app_upsert(self):
+		"""New names are created, known names updated, invalid items reported, all in one request"""
+		payload = [
+			{'name': 'Bulk New', 'category': 'GAME', 'rating': 4.0, 'installs': '1,000+', 'genres': 'Arcade'},
+			{'name': 'Bulk Existing', 'rating': 4.5},
+			{'category': 'GAME'},
+		]
+		# the new app moves the mean rating, so the leaderboards are rebuilt rather than updated
+		with self.assertNumQueries(27):
+			resp = self.client.post(reverse('api-app-bulk'), payload, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual([item['status'] for item in resp.data['results']], ['created', 'updated', 'invalid'])
+		self.assertIn('name', resp.data['results'][2]['errors'])
+		created = App.objects.get(name='Bulk New')
+		self.assertEqual(created.installs_min, 1000)
+		self.assertEqual(list(created.genre_set.values_list('name', flat=True)), ['Arcade'])
+		self.app.refresh_from_db()
+		self.assertEqual((self.app.rating, self.app.category, self.app.version), (4.5, 'TOOLS', 3))
+		self.assertEqual(CategoryStat.objects.get(category='GAME').count, 1)
+
+	def test_one_item_refreshes_only_that_app(self):
+		"""A one-item bulk call updates the derived rows of its app in a fixed number of queries, no table is rebuilt"""
+		App.objects.create(name='Bulk Other', category='GAME', rating=4.0, genres='Arcade')
+		with CaptureQueriesContext(connection) as queries:
+			resp = self.client.post(reverse('api-app-bulk'), [{'name': 'Bulk Existing', 'category': 'GAME', 'genres': 'Arcade'}], format='json')
+		self.assertEqual(resp.data['counts'], {'updated': 1})
+		self.assertEqual(len(queries), 21)
+		self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('DELETE') and 'WHERE' not in query['sql']])
+		self.assertEqual((CategoryStat.objects.get(category='TOOLS').count, CategoryStat.objects.get(category='GAME').count), (0, 2))
+		self.assertEqual((GenreStat.objects.get(genre='Tools').count, GenreStat.objects.get(genre='Arcade').count), (0, 2))
+		self.assertEqual(LeaderboardEntry.objects.filter(board='genre:Arcade').count(), 2)
+		self.assertEqual(search.search_app_ids('arcade', 10), [self.app.id, self.app.id + 1])
+
+	def test_repeated_names(self):
+		"""A name repeated within one request is reported on the repeat, stored or not, and written once"""
+		payload = [
+			{'name': 'Bulk New', 'rating': 4.0}, {'name': 'Bulk New', 'rating': 1.0},
+			{'name': 'Bulk Existing', 'rating': 4.5}, {'name': 'Bulk Existing', 'rating': 2.0},
+		]
+		resp = self.client.post(reverse('api-app-bulk'), payload, format='json')
+		self.assertEqual([item['status'] for item in resp.data['results']], ['created', 'invalid', 'updated', 'invalid'])
+		self.assertIn('name', resp.data['results'][1]['errors'])
+		self.assertEqual(list(App.objects.filter(name='Bulk New').values_list('rating', flat=True)), [4.0])
+		self.assertEqual(App.objects.get(name='Bulk Existing').rating, 4.5)
+		with self.assertRaises(ValueError):
+			bulk.upsert_apps([{'name': 'Twice'}, {'name': 'Twice'}])
+
+	def test_dry_run(self):
+		"""?dry_run=true returns the statuses without writing"""
+		payload = [{'name': 'Bulk Dry'}, {'name': 'Bulk Existing', 'rating': 1.0}]
+		resp = self.client.post(reverse('api-app-bulk') + '?dry_run=true', payload, format='json')
+		self.assertEqual(resp.data['counts'], {'created': 1, 'updated': 1})
+		self.assertFalse(App.objects.filter(name='Bulk Dry').exists())
+		self.assertEqual(App.objects.get(pk=self.app.pk).rating, 3.0)
+
+	def test_reviews(self):
+		"""Reviews are created and updated in a fixed number of queries, unknown apps are invalid"""
+		payload = [
+			{'app': self.app.id, 'translated_review': f'Review {i}', 'sentiment': 'Positive', 'sentiment_polarity': 0.5}
+			for i in range(20)
+		]
+		payload += [{'id': self.review.id, 'sentiment': 'Negative'}, {'app': 999999, 'app_name': 'x'}]
+		with self.assertNumQueries(9):
+			resp = self.client.post(reverse('api-review-bulk'), payload, format='json')
+		statuses = [item['status'] for item in resp.data['results']]
+		self.assertEqual(statuses, ['created'] * 20 + ['updated', 'invalid'])
+		self.assertEqual(Review.objects.filter(app=self.app, app_name='Bulk Existing').count(), 21)
+		self.assertEqual(Review.objects.get(pk=self.review.id).sentiment, 'Negative')
+
+	def test_duplicate_reviews(self):
+		"""Items repeating the text of a stored review, or of an earlier item, of the same app are invalid"""
+		other = Review.objects.create(app=self.app, translated_review='Other', sentiment='Neutral')
+		payload = [
+			{'app': self.app.id, 'translated_review': 'Old', 'sentiment': 'Positive'},
+			{'app': self.app.id, 'translated_review': 'Fresh', 'sentiment': 'Positive'},
+			{'app': self.app.id, 'translated_review': 'Fresh', 'sentiment': 'Negative'},
+			{'id': other.id, 'translated_review': 'Old'},
+		]
+		resp = self.client.post(reverse('api-review-bulk'), payload, format='json')
+		self.assertEqual([item['status'] for item in resp.data['results']], ['invalid', 'created', 'invalid', 'invalid'])
+		self.assertIn('translated_review', resp.data['results'][0]['errors'])
+		self.assertEqual(sorted(self.app.reviews_set.values_list('translated_review', flat=True)), ['Fresh', 'Old', 'Other'])
+
+	def test_bulk_delete(self):
+		"""DELETE removes the listed rows and marks unknown ids"""
+		other = App.objects.create(name='Bulk Other', category='GAME', rating=2.0)
+		resp = self.client.delete(reverse('api-review-bulk'), {'ids': [self.review.id, 999999]}, format='json')
+		self.assertEqual([item['status'] for item in resp.data['results']], ['deleted', 'not_found'])
+		resp = self.client.delete(reverse('api-app-bulk'), {'ids': [self.app.id, other.id]}, format='json')
+		self.assertEqual(resp.data['counts'], {'deleted': 2})
+		self.assertFalse(App.objects.exists())
+		self.assertFalse(CategoryStat.objects.filter(count__gt=0).exists())
+
+
+class ReviewSummaryTests(APITestCase):
+	def setUp(self):
+		self.app = App.objects.create(name='Summarised', category='TOOLS')
+		self.other = App.objects.create(name='Quiet', category='TOOLS')
+
+	def test_review_writes_update_summary(self):
+		"""Creating, editing and deleting reviews keeps the counts and average polarity in step"""
+		good = Review.objects.create(app=self.app, translated_review='Good', sentiment='Positive', sentiment_polarity=0.8)
+		bad = Review.objects.create(app=self.app, translated_review='Bad', sentiment='Negative', sentiment_polarity=-0.4)
+		Review.objects.create(app=self.app, translated_review='nan', sentiment=None, sentiment_polarity=None)
+		self.app.refresh_from_db()
+		self.assertEqual((self.app.review_count, self.app.positive_count, self.app.negative_count), (3, 1, 1))
+		self.assertAlmostEqual(self.app.avg_polarity, 0.2)
+
+		bad.sentiment, bad.sentiment_polarity = 'Neutral', 0.0
+		bad.save()
+		good.delete()
+		self.app.refresh_from_db()
+		self.assertEqual((self.app.review_count, self.app.positive_count, self.app.neutral_count, self.app.negative_count), (2, 0, 1, 0))
+		self.assertEqual(self.app.avg_polarity, 0.0)
+		bad.delete()
+		self.app.refresh_from_db()
+		self.assertIsNone(self.app.avg_polarity)
+
+	def test_sort_by_review_count(self):
+		"""?ordering=-review_count lists the most discussed apps first"""
+		for text in ('One', 'Two'):
+			Review.objects.create(app=self.other, translated_review=text, sentiment='Positive', sentiment_polarity=0.5)
+		resp = self.client.get(reverse('api-app-list') + '?ordering=-review_count&fields=name,review_count,avg_polarity')
+		self.assertEqual(resp.data['results'][0], {'name': 'Quiet', 'review_count': 2, 'avg_polarity': 0.5})
+
+	def test_rebuild_matches_increments(self):
+		"""The bulk recomputation gives the same columns as the per-review increments"""
+		Review.objects.create(app=self.app, translated_review='Fine', sentiment='positive', sentiment_polarity=0.3)
+		Review.objects.create(app=self.app, translated_review='Meh', sentiment='Neutral', sentiment_polarity=0.1)
+		# counted as negative by both paths, from the normalised label
+		Review.objects.create(app=self.app, translated_review='Awful', sentiment=' Negative ', sentiment_polarity=-0.5)
+		fields = ('review_count', 'positive_count', 'neutral_count', 'negative_count', 'polarity_count', 'avg_polarity')
+		before = list(App.objects.order_by('id').values_list(*fields))
+		App.objects.update(review_count=0, positive_count=0, neutral_count=0, negative_count=0, polarity_count=0, avg_polarity=None)
+		stats.rebuild_review_summary()
+		after = list(App.objects.order_by('id').values_list(*fields))
+		self.assertEqual(after, before)
+
+	def test_app_delete_skips_review_decrements(self):
+		"""Deleting an app runs the same queries whatever the number of its reviews"""
+		def delete_queries(app, reviews):
+			for text in reviews:
+				Review.objects.create(app=app, translated_review=text, sentiment='Positive', sentiment_polarity=0.5)
+			with CaptureQueriesContext(connection) as queries:
+				app.delete()
+			return len(queries)
+
+		self.assertEqual(delete_queries(self.app, ['One']), delete_queries(self.other, ['One', 'Two', 'Three']))
+		self.assertFalse(Review.objects.exists())
+
+
+class LeaderboardTests(APITestCase):
+	def setUp(self):
+		# mean rating 4.0: the 5.0 with three ratings is pulled down to it, the 4.6 with many ratings stays close to 4.6
+		self.few = App.objects.create(name='Few Votes', category='GAME', rating=5.0, reviews=3, genres='Arcade')
+		self.many = App.objects.create(name='Many Votes', category='GAME', rating=4.6, reviews=200000, genres='Arcade;Action')
+		self.tool = App.objects.create(name='Tool', category='TOOLS', rating=2.4, reviews=50000, genres='Tools')
+		App.objects.create(name='Unrated', category='GAME', rating=None)
+
+	def test_weighted_ranking(self):
+		"""Apps are ranked by rating shrunk by their number of ratings"""
+		resp = self.client.get(reverse('api-app-leaderboard') + '?fields=name')
+		self.assertEqual(resp.data['board'], 'all')
+		self.assertEqual([item['name'] for item in resp.data['results']], ['Many Votes', 'Few Votes', 'Tool'])
+		self.assertEqual([item['rank'] for item in resp.data['results']], [1, 2, 3])
+		self.assertLess(resp.data['results'][1]['weighted_rating'], 4.1)
+
+	def test_category_genre_and_k(self):
+		"""?category= and ?genre= pick a board, ?k= bounds it"""
+		resp = self.client.get(reverse('api-app-leaderboard') + '?category=GAME&k=1&fields=name')
+		self.assertEqual([item['name'] for item in resp.data['results']], ['Many Votes'])
+		resp = self.client.get(reverse('api-app-leaderboard') + '?genre=Action&fields=name')
+		self.assertEqual([item['name'] for item in resp.data['results']], ['Many Votes'])
+		self.assertEqual(self.client.get(reverse('api-app-leaderboard') + '?genre=Action&category=GAME').status_code, 400)
+
+	def test_writes_refresh_entries(self):
+		"""Saving or deleting an app refreshes its entries, bulk loads rebuild them all"""
+		self.tool.rating, self.tool.category = 4.9, 'GAME'
+		self.tool.save()
+		self.assertEqual(
+			set(LeaderboardEntry.objects.filter(app=self.tool).values_list('board', flat=True)),
+			{'all', 'category:GAME', 'genre:Tools'},
+		)
+		self.few.delete()
+		self.assertFalse(LeaderboardEntry.objects.filter(app_id=self.few.id).exists())
+		before = set(LeaderboardEntry.objects.values_list('board', 'app_id'))
+		LeaderboardEntry.objects.all().delete()
+		from .signals import apps_bulk_loaded
+		apps_bulk_loaded.send(sender=self.__class__)
+		self.assertEqual(set(LeaderboardEntry.objects.values_list('board', 'app_id')), before)
+
+
+# Query plan audit: every query run by the endpoints below must reach the App,
+# Review and App <-> Genre tables through an index. A plain SCAN is only
+# accepted when it returns rows in the requested order and has a LIMIT, so it
+# stops after one page (e.g. the first page of /api/apps/ in id order).
+class QueryPlanTests(APITestCase):
+	audited_tables = {
+		App._meta.db_table, Review._meta.db_table, App.genre_set.through._meta.db_table, LeaderboardEntry._meta.db_table,
+	}
+
+	def setUp(self):
+		self.app = App.objects.create(name='Planned', category='GAME', rating=4.0, installs='1,000+', genres='Arcade')
+		App.objects.create(name='Other', category='TOOLS', rating=3.0)
+		Review.objects.create(app=self.app, translated_review='Good', sentiment='Positive', sentiment_polarity=0.5)
+
+	def full_scans(self, sql):
+		with connection.cursor() as cursor:
+			cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+			plan = [row[-1] for row in cursor.fetchall()]
+		stops_early = ' LIMIT ' in sql and not any('TEMP B-TREE' in step for step in plan)
+		scans = []
+		for step in plan:
+			words = step.split()
+			if words[:1] == ['SCAN'] and len(words) == 2 and words[1] in self.audited_tables and not stops_early:
+				scans.append(step)
+		return scans
+
+	def test_endpoints_use_indexes(self):
+		"""No endpoint query scans a whole App, Review or genre link table"""
+		urls = [
+			reverse('api-app-list'),
+			reverse('api-app-list') + '?ordering=-rating',
+			reverse('api-app-list') + '?ordering=-review_count&include=reviews',
+			reverse('api-app-list') + '?genre=Arcade',
+			reverse('api-app-list') + '?installs_min__gte=1000&ordering=installs_min',
+			reverse('api-app-detail', args=[self.app.id]),
+			reverse('api-app-batch-get') + f'?ids={self.app.id}',
+			reverse('top-rated'),
+			reverse('api-app-leaderboard') + '?genre=Arcade&k=10',
+			reverse('api-review-by-sentiment') + '?sentiment=POSITIVE',
+			reverse('api-review-list') + f'?app={self.app.id}',
+			reverse('api-review-list') + '?sentiment=positive',
+		]
+		for url in urls:
+			with CaptureQueriesContext(connection) as captured:
+				self.assertEqual(self.client.get(url).status_code, 200, url)
+			for query in captured:
+				if query['sql'].startswith('SELECT'):
+					self.assertEqual(self.full_scans(query['sql']), [], f"{url}: {query['sql']}")
+
+	def test_sentiment_key(self):
+		"""The lower-case sentiment column is filled on save and used by the filters"""
+		review = Review.objects.create(app=self.app, translated_review='Bad', sentiment=' Negative')
+		self.assertEqual(review.sentiment_key, 'negative')
+		resp = self.client.get(reverse('api-review-list') + '?sentiment=NEGATIVE')
+		self.assertEqual([item['id'] for item in resp.data['results']], [review.id])
+
+
+class InstrumentationTests(APITestCase):
+	def setUp(self):
+		instrumentation.registry.clear()
+		self.app = App.objects.create(name='Measured', category='TOOLS', rating=4.0)
+
+	def test_server_timing_header(self):
+		"""Responses report their SQL, render and total time"""
+		resp = self.client.get(reverse('api-app-list'))
+		timing = resp['Server-Timing']
+		self.assertIn('db;dur=', timing)
+		self.assertIn('queries"', timing)
+		self.assertIn('render;dur=', timing)
+		self.assertIn('total;dur=', timing)
+
+	def test_metrics(self):
+		"""/metrics exposes per-view summaries in Prometheus text format"""
+		for _ in range(3):
+			self.client.get(reverse('api-app-list'))
+		text = self.client.get('/metrics').content.decode('utf-8')
+		self.assertIn('# TYPE api_request_duration_seconds summary', text)
+		self.assertIn('api_request_duration_seconds{view="AppListCreateAPIView",quantile="0.99"}', text)
+		self.assertIn('api_db_queries_count{view="AppListCreateAPIView"} 3', text)
+
+	def test_slow_query_and_query_count_log(self):
+		"""Slow queries and requests with many queries are logged"""
+		with self.settings(SLOW_QUERY_MS=0, QUERY_COUNT_WARNING=0):
+			with self.assertLogs('googlePlayStoreAppsDetails.performance', 'WARNING') as logs:
+				self.client.get(reverse('api-app-detail', args=[self.app.id]))
+		self.assertTrue(any('Slow query' in line and 'AppDetailAPIView' in line for line in logs.output))
+		self.assertTrue(any('queries' in line and 'Slow query' not in line for line in logs.output))
+
+
+
+
+# Tests for the review analytics endpoints (/api/reviews/stats/...).
+class ReviewStatsTests(APITestCase):
+	def setUp(self):
+		self.game = App.objects.create(name='Stats Game', category='GAME', rating=4.0, genres='Arcade')
+		self.tool = App.objects.create(name='Stats Tool', category='TOOLS', rating=3.0, genres='Tools')
+		for app, sentiment, polarity in [
+			(self.game, 'Positive', 0.5), (self.game, 'Positive', 1.0), (self.game, 'Negative', -1.0),
+			(self.tool, 'positive', 0.05), (self.tool, 'Neutral', 0.0), (self.tool, None, None),
+		]:
+			Review.objects.create(app=app, translated_review=f'{sentiment} {polarity}', sentiment=sentiment, sentiment_polarity=polarity)
+
+	def test_sentiment_counts(self):
+		"""Counts per sentiment come from the app summaries, overall and per scope"""
+		with self.assertNumQueries(1):
+			resp = self.client.get(reverse('api-review-stats'))
+		self.assertEqual(resp.data['reviews'], 6)
+		self.assertEqual((resp.data['positive'], resp.data['neutral'], resp.data['negative'], resp.data['unlabelled']), (3, 1, 1, 1))
+		self.assertEqual(resp.data['positive_ratio'], 0.6)
+		self.assertAlmostEqual(resp.data['avg_polarity'], 0.11)
+		resp = self.client.get(reverse('api-review-stats'), {'genre': 'arcade'})
+		self.assertEqual((resp.data['reviews'], resp.data['positive']), (3, 2))
+		self.assertEqual(self.client.get(reverse('api-review-stats'), {'app': self.tool.id}).data['reviews'], 3)
+
+	def test_polarity_histogram(self):
+		"""Polarities are binned in one GROUP BY, edges going to the upper bin and 1.0 to the last one"""
+		url = reverse('api-review-stats-histogram')
+		with self.assertNumQueries(1):
+			resp = self.client.get(url, {'bin': '0.5'})
+		self.assertEqual([(b['from'], b['to'], b['count']) for b in resp.data['bins']], [
+			(-1.0, -0.5, 1), (-0.5, 0.0, 0), (0.0, 0.5, 2), (0.5, 1.0, 2),
+		])
+		self.assertEqual(len(self.client.get(url).data['bins']), 20)
+		resp = self.client.get(url, {'bin': '0.5', 'category': 'GAME', 'sentiment': 'POSITIVE'})
+		self.assertEqual([b['count'] for b in resp.data['bins']], [0, 0, 0, 2])
+		self.assertEqual(self.client.get(url, {'bin': '0'}).status_code, 400)
+		self.assertEqual(self.client.get(url, {'bin': 'wide'}).status_code, 400)
+
+	def test_histogram_bins_are_floored(self):
+		"""Bin numbers are floored in SQL, not left to the integer cast, which rounds on PostgreSQL"""
+		with CaptureQueriesContext(connection) as queries:
+			resp = self.client.get(reverse('api-review-stats-histogram'), {'bin': '0.1'})
+		self.assertIn('FLOOR(', queries[0]['sql'].upper())
+		# 0.05 sits in the middle of bin 10 (0.0 to 0.1), where rounding would move it up
+		self.assertEqual(resp.data['bins'][10]['count'], 2)
+
+	def test_category_positive_ratio(self):
+		"""Per-category counts and positive ratio, categories without reviews left out"""
+		App.objects.create(name='Unreviewed', category='SOCIAL')
+		with self.assertNumQueries(1):
+			resp = self.client.get(reverse('api-review-stats-categories'))
+		self.assertEqual(list(resp.data), ['GAME', 'TOOLS'])
+		self.assertEqual(resp.data['GAME']['positive_ratio'], round(2 / 3, 4))
+		self.assertEqual(resp.data['TOOLS'], {
+			'reviews': 3, 'positive': 1, 'neutral': 1, 'negative': 0, 'unlabelled': 1, 'positive_ratio': 0.5,
+		})
+
+
+# Tests for the async read path (async_api.py).
+class AsyncViewTests(TestCase):
+	def setUp(self):
+		self.app = App.objects.create(name='Async Photo', category='PHOTOGRAPHY', rating=4.5, reviews=5000, genres='Photography')
+		App.objects.create(name='Async Tools', category='TOOLS', rating=3.0, type='Free', installs='10,000+')
+		Review.objects.create(app=self.app, translated_review='Lovely', sentiment='Positive', sentiment_polarity=0.9)
+		Review.objects.create(app=self.app, translated_review='Fine', sentiment='Positive', sentiment_polarity=0.2)
+
+	def test_same_json_as_the_sync_views(self):
+		"""Each async endpoint answers like its synchronous counterpart"""
+		pairs = [
+			(reverse('api-app-detail', args=[self.app.id]), reverse('api-async-app-detail', args=[self.app.id])),
+			(reverse('api-app-category-stats'), reverse('api-async-app-category-stats')),
+			(reverse('api-app-category-stats') + '?type=free', reverse('api-async-app-category-stats') + '?type=free'),
+			(reverse('api-review-by-sentiment') + '?sentiment=POSITIVE', reverse('api-async-review-by-sentiment') + '?sentiment=POSITIVE'),
+			(reverse('top-rated') + '?include=reviews', reverse('api-async-top-rated') + '?include=reviews'),
+			(reverse('api-app-search-by-name') + '?q=async&limit=1', reverse('api-async-app-search-by-name') + '?q=async&limit=1'),
+		]
+		for sync_url, async_url in pairs:
+			expected = self.client.get(sync_url, HTTP_ACCEPT='application/json').json()
+			resp = async_to_sync(self.async_client.get)(async_url)
+			self.assertEqual(resp.status_code, 200)
+			data = resp.json()
+			if 'next' in expected:
+				self.assertEqual(data['next'] is None, expected['next'] is None)
+				data.pop('next'), expected.pop('next')
+			self.assertEqual(data, expected, async_url)
+
+	async def test_errors_and_conditional_requests(self):
+		"""404, 400 and If-None-Match behave as on the synchronous endpoints"""
+		url = reverse('api-async-app-detail', args=[self.app.id])
+		etag = (await self.async_client.get(url))['ETag']
+		self.assertEqual(etag, f'"app-{self.app.id}-v3"')
+		self.assertEqual((await self.async_client.get(url, headers={'If-None-Match': etag})).status_code, 304)
+		self.assertEqual((await self.async_client.get(reverse('api-async-app-detail', args=[0]))).status_code, 404)
+		bad = await self.async_client.get(reverse('api-async-app-category-stats') + '?min_installs=lots')
+		self.assertEqual(bad.status_code, 400)
+		self.assertEqual(bad.json(), {'min_installs': 'Must be an integer.'})
+		self.assertEqual((await self.async_client.get(reverse('api-async-review-by-sentiment'))).status_code, 400)
+
+	async def test_server_timing_counts_async_queries(self):
+		"""The instrumentation middleware sees the queries the async ORM runs"""
+		resp = await self.async_client.get(reverse('api-async-app-detail', args=[self.app.id]))
+		self.assertIn('desc="2 queries"', resp['Server-Timing'])
+
+
+# Tests for the benchmark suite (googlePlayStoreAppsDetails/benchmarks.py).
+class BenchmarkTests(TestCase):
+	def test_every_url_has_a_scenario(self):
+		"""A URL added to urls.py must get a benchmark scenario"""
+		App.objects.create(name='Benchmarked App', rating=4.0)
+		covered = {url_name for _, url_name, _, _, _ in benchmarks.endpoint_scenarios()}
+		self.assertEqual(benchmarks.url_names() - covered, set())
+
+	def test_loads_and_endpoints_on_a_small_catalogue(self):
+		"""The generated CSV files load, with Zipf-distributed reviews, and every scenario runs"""
+		with tempfile.TemporaryDirectory() as directory:
+			apps_path = os.path.join(directory, 'apps.csv')
+			reviews_path = os.path.join(directory, 'reviews.csv')
+			with open(apps_path, 'w', newline='') as apps_file, open(reviews_path, 'w', newline='') as reviews_file:
+				written = benchmarks.write_catalogue_csv(apps_file, reviews_file, 100)
+			loads = benchmarks.bench_loads(apps_path, reviews_path)
+		self.assertEqual(App.objects.count(), 100)
+		self.assertEqual(Review.objects.count(), written)
+		counts = sorted(App.objects.values_list('review_count', flat=True), reverse=True)
+		self.assertGreater(counts[0], 10 * counts[len(counts) // 2])
+		self.assertEqual(len(loads), 4)
+		self.assertEqual(loads['load_playstore --incremental (no change)']['queries'], 1)
+
+		results = benchmarks.bench_endpoints(repeat=1)
+		self.assertEqual(len(results), len(benchmarks.endpoint_scenarios()))
+		for result in results.values():
+			self.assertLessEqual(result['queries'], 5)
+			self.assertGreater(result['peak_kb'], 0)
+
+	def test_compare_flags_regressions(self):
+		"""Comparison reports more queries and slowdowns beyond the threshold, not noise"""
+		baseline = {'1000': {'apps': {'queries': 1, 'median_ms': 10.0, 'peak_kb': 100.0}}}
+		same = {'1000': {'apps': {'queries': 1, 'median_ms': 10.4, 'peak_kb': 110.0}}}
+		worse = {'1000': {'apps': {'queries': 2, 'median_ms': 20.0, 'peak_kb': 100.0}}}
+		self.assertEqual(benchmarks.compare(same, baseline), [])
+		self.assertEqual(len(benchmarks.compare(worse, baseline)), 2)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import api
+from . import api, async_api, instrumentation
 from .views import main_page, top_rated_page
 
 # Explicit URL routing for the API. 
@@ -9,9 +9,28 @@ urlpatterns = [
     path('api/apps/', api.AppListCreateAPIView.as_view(), name='api-app-list'), 
     path('api/apps/<int:pk>/', api.AppDetailAPIView.as_view(), name='api-app-detail'), 
     path('api/apps/avg_rating_by_genre/', api.AvgRatingByGenreAPIView.as_view(), name='api-app-avg-rating-by-genre'),
+    path('api/apps/leaderboard/', api.LeaderboardAPIView.as_view(), name='api-app-leaderboard'),
+    path('api/apps/suggest/', api.SuggestAPIView.as_view(), name='api-app-suggest'),
+    path('api/apps/bulk/', api.AppBulkAPIView.as_view(), name='api-app-bulk'),
+    path('api/apps/batch_get/', api.AppBatchGetAPIView.as_view(), name='api-app-batch-get'),
+    path('api/apps/export/', api.AppExportAPIView.as_view(), name='api-app-export'),
     path('api/apps/search_by_name/', api.SearchByNameAPIView.as_view(), name='api-app-search-by-name'),
     path('api/apps/category_stats/', api.CategoryStatsAPIView.as_view(), name='api-app-category-stats'),
+    path('api/genres/', api.GenreListAPIView.as_view(), name='api-genre-list'),
+    path('api/reviews/', api.ReviewListAPIView.as_view(), name='api-review-list'),
+    path('api/reviews/bulk/', api.ReviewBulkAPIView.as_view(), name='api-review-bulk'),
+    path('api/reviews/export/', api.ReviewExportAPIView.as_view(), name='api-review-export'),
+    path('api/reviews/stats/', api.ReviewStatsAPIView.as_view(), name='api-review-stats'),
+    path('api/reviews/stats/histogram/', api.ReviewPolarityHistogramAPIView.as_view(), name='api-review-stats-histogram'),
+    path('api/reviews/stats/categories/', api.ReviewCategoryStatsAPIView.as_view(), name='api-review-stats-categories'),
     path('api/reviews/by_sentiment/', api.ReviewsBySentimentAPIView.as_view(), name='api-review-by-sentiment'),
     path('top-rated/', api.TopRatedAPIView.as_view(), name='top-rated'),
+    # async versions of the read-only endpoints, for ASGI servers (see async_api.py)
+    path('api/async/apps/<int:pk>/', async_api.AppDetailAsyncView.as_view(), name='api-async-app-detail'),
+    path('api/async/apps/search_by_name/', async_api.SearchByNameAsyncView.as_view(), name='api-async-app-search-by-name'),
+    path('api/async/apps/category_stats/', async_api.CategoryStatsAsyncView.as_view(), name='api-async-app-category-stats'),
+    path('api/async/reviews/by_sentiment/', async_api.ReviewsBySentimentAsyncView.as_view(), name='api-async-review-by-sentiment'),
+    path('api/async/top-rated/', async_api.TopRatedAsyncView.as_view(), name='api-async-top-rated'),
+    path('metrics', instrumentation.metrics, name='metrics'),
     path('', main_page, name='main_page'),
 ]
@@ -0,0 +1,83 @@
+# Generation counters used to invalidate per-process and cached data.
+#
+# A generation is an integer stored in Django's cache framework and bumped
+# every time the data it covers changes (App/Review writes, bulk loads).
+# Readers remember the generation they built their data for and rebuild it
+# when the counter has moved on.
+#
+# The counters live in their own cache alias (settings.GENERATION_CACHE_ALIAS),
+# apart from the cached responses, so response entries never push them out.
+# A counter that is lost anyway (restart, eviction) starts again from the
+# current time in nanoseconds, never from a value a reader may remember.
+# Only a shared backend (CACHE_BACKEND=redis) shares the counters between
+# worker processes: with the per-process locmem default a write in one worker
+# does not invalidate the data of the others, so deployments running several
+# workers need the shared backend.
+
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'generation:'
+
+# the generation covering every App row
+APPS = 'apps'
+# the generation covering every Review row
+REVIEWS = 'reviews'
+
+
+def counters():
+    """The cache holding the generation counters."""
+    return caches[settings.GENERATION_CACHE_ALIAS]
+
+
+def initial_value():
+    """Value of a new counter: different from every value an earlier counter of the same name had."""
+    return time.time_ns()
+
+
+def get_generation(name):
+    """Current value of the named generation counter."""
+    cache = counters()
+    key = KEY_PREFIX + name
+    value = cache.get(key)
+    if value is None:
+        value = initial_value()
+        cache.add(key, value, timeout=None)
+        value = cache.get(key, value)
+    return value
+
+
+def bump_generation(name):
+    """Move the named generation counter forward."""
+    cache = counters()
+    key = KEY_PREFIX + name
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the counter is not in the cache yet (or was lost)
+        cache.add(key, initial_value(), timeout=None)
+        return cache.incr(key)
+
+
+def bump_generation_on_commit(name):
+    """
+    Bump the counter now and once more when the current transaction commits,
+    so a reader that rebuilt its data before the commit cannot keep stale data
+    under the new generation.
+    """
+    bump_generation(name)
+    transaction.on_commit(lambda: bump_generation(name))
+
+
+async def aget_generation(name):
+    """get_generation() for async views."""
+    cache = counters()
+    key = KEY_PREFIX + name
+    value = await cache.aget(key)
+    if value is None:
+        value = initial_value()
+        await cache.aadd(key, value, timeout=None)
+        value = await cache.aget(key, value)
+    return value
@@ -6,6 +6,7 @@ from django.db.models import Avg
 from .models import App, Review
 from .serializers import AppSerializer, ReviewSerializer
 from .forms import AppForm
+from . import leaderboards
 from django.shortcuts import redirect
 
 # main page 
@@ -20,5 +21,6 @@ def top_rated_page(request):
     """
 	Render a simple page that shows the top rated apps  
     """
-    apps = App.objects.exclude(rating__isnull=True).order_by('-rating')[:50]
+    # the first 50 apps of the overall leaderboard, ranked by weighted rating
+    apps = [entry.app for entry in leaderboards.top(leaderboards.OVERALL, 50)]
     return render(request, 'top_rated.html', {'apps': apps})
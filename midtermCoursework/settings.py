@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover the other middleware too
+    'googlePlayStoreAppsDetails.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +86,48 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# CACHE_BACKEND selects local memory (default, per process), file or redis
+# (any Redis-compatible server, needs the redis package). Deployments running
+# several worker processes (gunicorn --workers / WEB_CONCURRENCY > 1) need
+# redis: with locmem, and with file caches not shared by every worker, a write
+# handled by one worker never invalidates the cached data of the others.
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'playstore'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1])
+
+# The generation counters that invalidate cached data (googlePlayStoreAppsDetails/versioning.py)
+# get their own alias: a handful of keys that the culling of the response entries never reaches.
+GENERATION_CACHE_ALIAS = 'generations'
+GENERATION_CACHE_LOCATION = os.getenv('GENERATION_CACHE_LOCATION', {
+    'locmem': 'playstore-generations',
+    'file': str(BASE_DIR / 'cache-generations'),
+    'redis': CACHE_LOCATION,  # the same server, the keys are kept apart by KEY_PREFIX
+}[CACHE_BACKEND])
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': CACHE_LOCATION,
+    },
+    GENERATION_CACHE_ALIAS: {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': GENERATION_CACHE_LOCATION,
+        'KEY_PREFIX': 'generations',
+        'TIMEOUT': None,
+    },
+}
+
+# seconds a cached API response is kept. Writes invalidate entries sooner.
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 600))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -127,9 +171,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # decrease the load size. only 50 items will be returned per api call.
+# Lists use keyset (cursor) pagination; pass ?offset= to get limit/offset pages instead.
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'googlePlayStoreAppsDetails.pagination.KeysetPagination',
     'PAGE_SIZE': 50,
+    # the JSON and browsable renderers, timed for the Server-Timing header and /metrics
+    'DEFAULT_RENDERER_CLASSES': [
+        'googlePlayStoreAppsDetails.instrumentation.InstrumentedJSONRenderer',
+        'googlePlayStoreAppsDetails.instrumentation.InstrumentedBrowsableAPIRenderer',
+    ],
 }
+# most app ids accepted by one /api/apps/batch_get/ request
+BATCH_GET_MAX_IDS = int(os.getenv('BATCH_GET_MAX_IDS', 500))
+# most objects (or ids) accepted by one request to the bulk write endpoints
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 1000))
+
+# Performance instrumentation (googlePlayStoreAppsDetails/instrumentation.py):
+# number of recent requests per view the /metrics percentiles are computed over,
+# queries logged as slow (milliseconds) and the query count logged as a likely N+1.
+INSTRUMENTATION_WINDOW = int(os.getenv('INSTRUMENTATION_WINDOW', 1024))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+QUERY_COUNT_WARNING = int(os.getenv('QUERY_COUNT_WARNING', 30))
 #Allow requests from your Render domain:
 CSRF_TRUSTED_ORIGINS = ['https://yourappdomain.onrender.com']